@@ -1,7 +1,8 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Response
 from app.services.rag_service import RagService
-from app.api.utils import get_rag_service
+from app.services.startup import StartupProgress
+from app.api.utils import get_rag_service, get_startup_progress
 
 logger = logging.getLogger(__name__)
 
@@ -9,13 +10,15 @@ health_router = APIRouter(tags=["health"])
 
 # root as health check
 @health_router.get("/", description="Service Health")
-async def service_health(rag_service:RagService = Depends(get_rag_service)):
+async def service_health(
+        rag_service:RagService = Depends(get_rag_service),
+        startup_progress:StartupProgress = Depends(get_startup_progress)):
     if rag_service.is_ready:
         return {"status":"ok"}
-    else:# response with 503 code and retry header 
+    else:# response with 503 code, start-up progress and retry header 
         raise HTTPException(
         status_code=503,
-        detail="Service not ready. Please retry later.",
+        detail={"message": "Service not ready. Please retry later.", "startup": startup_progress.as_dict()},
         headers={
             "Retry-After": "30",         # seconds
             "Cache-Control": "no-store"
@@ -0,0 +1,13 @@
+import logging
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+metrics_router = APIRouter(tags=["metrics"])
+
+# Prometheus text exposition format; not routed by the API gateway (openapi-run.yaml)
+@metrics_router.get("/metrics", description="Prometheus metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,10 +1,14 @@
+import json
 import logging
 from http import HTTPStatus
+from typing import AsyncIterator
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
 from app.infrastructure.clients.llm_client_interface import AsyncLLMClientInterface
-from app.domain.schemas import SearchRequest
+from app.domain.schemas import SearchRequest, BatchSearchRequest
+from app.services.admission import Overloaded
 
-from app.api.utils import get_llm_client, get_rag_service, truncate_user_input
+from app.api.utils import get_llm_client, get_ready_rag_service, truncate_user_input, overloaded_error, ClosingStreamingResponse
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +45,7 @@ async def llm_query(query:str, llm_client:AsyncLLMClientInterface = Depends(get_
             )
 
 @query_router.post('/search', status_code=201)
-async def search_query(request: SearchRequest, rag_service = Depends(get_rag_service)):
+async def search_query(request: SearchRequest, rag_service = Depends(get_ready_rag_service)):
     logger.info(f"Search query: {request.query[:50]}... length={len(request.query)}")
     query = truncate_user_input(request.query)
     try:
@@ -50,6 +54,8 @@ async def search_query(request: SearchRequest, rag_service = Depends(get_rag_ser
         return {
             "search_result": response["search_result"]
         }
+    except Overloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         logger.error(e, exc_info=True)
         raise HTTPException(
@@ -58,8 +64,26 @@ async def search_query(request: SearchRequest, rag_service = Depends(get_rag_ser
             )
 
 
+@query_router.post('/search/batch', status_code=201, description="Search many queries in one request; search_results[i] holds the results of queries[i]")
+async def search_batch_query(request: BatchSearchRequest, rag_service = Depends(get_ready_rag_service)):
+    logger.info(f"Batch search: {len(request.queries)} queries, method={request.method}")
+    queries = [truncate_user_input(query) for query in request.queries]
+    try:
+        response = await rag_service.search_batch(queries, top_k=request.top_k, method=request.method)
+        return {
+            "search_results": response["search_results"]
+        }
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error(e, exc_info=True)
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            detail=str(e)
+            )
+
 @query_router.post('/rag', status_code=201)
-async def rag_query(request: SearchRequest, rag_service = Depends(get_rag_service)):
+async def rag_query(request: SearchRequest, rag_service = Depends(get_ready_rag_service)):
     logger.info(f"RAG query: {request.query[:50]}... length={len(request.query)}")
     query = truncate_user_input(request.query)
     try:
@@ -69,9 +93,52 @@ async def rag_query(request: SearchRequest, rag_service = Depends(get_rag_servic
             "search_result": response["search_result"],
             "answer": response["answer"]
         }
+    except Overloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         logger.error(e, exc_info=True)
         raise HTTPException(
             status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
             detail=str(e)
             )
+
+
+def sse_event(event:dict) -> str:
+    """Format a stream event as a Server-Sent Event; its "type" becomes the SSE event name"""
+    data = json.dumps(jsonable_encoder({k:v for k,v in event.items() if k != "type"}), ensure_ascii=False)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+@query_router.post('/rag/stream', status_code=200, description="RAG query streamed as Server-Sent Events: search_result, delta*, metadata (or error)")
+async def rag_query_stream(request: SearchRequest, rag_service = Depends(get_ready_rag_service)):
+    logger.info(f"RAG stream query: {request.query[:50]}... length={len(request.query)}")
+    query = truncate_user_input(request.query)
+    events = rag_service.answer_stream(query, top_k=request.top_k, method=request.method)
+    try:
+        # retrieval runs before the response starts, so its failures are still plain HTTP errors
+        first = await anext(events)
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error(e, exc_info=True)
+        raise HTTPException(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            detail=str(e)
+            )
+
+    async def stream() -> AsyncIterator[str]:
+        yield sse_event(first)
+        try:
+            async for event in events:
+                if event["type"] == "metadata":
+                    logger.info(f"RAG stream response meta={event['metadata']}")
+                yield sse_event(event)
+        except Exception as e:
+            logger.error(e, exc_info=True)
+            yield sse_event({"type": "error", "detail": str(e)})
+        finally:
+            await events.aclose() # frees the LLM slot now if the client disconnected
+
+    return ClosingStreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,6 +1,9 @@
 import logging 
-from fastapi import Request
+from fastapi import Request, HTTPException
+from fastapi.responses import StreamingResponse
 from app.services.rag_service import RagService
+from app.services.startup import StartupProgress
+from app.services.admission import Overloaded
 from app.core.config import MAX_USER_INPUT
 
 logger = logging.getLogger(__name__)
@@ -16,4 +19,36 @@ def get_llm_client(request:Request) -> RagService:
     return request.app.state.llm_client
 
 def get_rag_service(request:Request) -> RagService:
-    return request.app.state.rag_service
\ No newline at end of file
+    return request.app.state.rag_service
+
+def get_ready_rag_service(request:Request) -> RagService:
+    """RagService for query routes; 503 while it is still starting up (FAST_START)"""
+    rag_service = get_rag_service(request)
+    if not rag_service.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Service not ready. Please retry later.",
+            headers={"Retry-After": "30", "Cache-Control": "no-store"})
+    return rag_service
+
+def overloaded_error(e:Overloaded) -> HTTPException:
+    """503 for a request shed by admission control, like the not-ready response"""
+    return HTTPException(
+        status_code=503,
+        detail=f"{e} Please retry later.",
+        headers={"Retry-After": str(e.retry_after), "Cache-Control": "no-store"})
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its async generator however the response ends.
+    When a client disconnect surfaces as a failed send (ASGI spec 2.4), Starlette stops iterating
+    without closing the generator, so its cleanup (releasing the LLM slot) would wait for garbage collection."""
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+def get_startup_progress(request:Request) -> StartupProgress:
+    return request.app.state.startup_progress
\ No newline at end of file
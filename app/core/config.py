@@ -19,6 +19,12 @@ logger.addHandler(stream_handler)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+def _env_flag(name:str, default:bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
 # Required Secrets
 GEMINI_API_KEY =  os.environ.get("GEMINI_API_KEY","").strip()
 
@@ -28,20 +34,97 @@ if not INDEX_JSON_URL.startswith("http"):
     INDEX_JSON_URL =  str(Path(INDEX_JSON_URL).resolve())
 
 # Optional settings  (can be overridden by corresponding env variable)
+DEFAULT_LLM_CLIENT = "gemini"  # "gemini", or "fake" for a local client without API calls
 DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
+DEFAULT_FAKE_LLM_LATENCY = 0.5  # seconds before the fake client's first token
+DEFAULT_FAKE_LLM_TOKENS_PER_SECOND = 50.0
+DEFAULT_EMBEDDER = "sentence_transformer"  # "sentence_transformer", or "hashing" for a model-free embedder (load tests)
 DEFAULT_SENTENCE_ENCODER_MODEL = "all-MiniLM-L6-v2"
 DEFAULT_MAX_USER_INPUT = 500  # length limit of query (in characters)
 DEFAULT_FILE_CACHE_DIR = "./cache"
 DEFAULT_SEARCH_LIMIT = 10
+DEFAULT_SEARCH_BATCH_MAX_QUERIES = 256  # queries per /query/search/batch request
+DEFAULT_EMBED_BATCH_SIZE = 64  # documents per embed_batch call during index build
+DEFAULT_EMBEDDING_CACHE_ENABLED = True
+DEFAULT_EMBEDDING_CACHE_MAX_MB = 512  # on-disk document embedding cache size limit
+DEFAULT_CHUNKING_ENABLED = True
+DEFAULT_CHUNK_SIZE = 200  # approximate encoder tokens per chunk (all-MiniLM-L6-v2 truncates at 256 word pieces)
+DEFAULT_CHUNK_OVERLAP = 40  # tokens shared by consecutive chunks
+DEFAULT_EMBED_MICRO_BATCHING = True  # coalesce concurrent query embeddings into one forward pass
+DEFAULT_EMBED_MAX_WAIT_MS = 5.0  # how long the first query of a micro-batch waits for others
+DEFAULT_EMBED_MAX_BATCH = 32  # queries per micro-batch
+DEFAULT_VECTOR_STORE = "brute_force"  # "brute_force" (exact) or "ivf" (approximate, IVF-Flat)
+DEFAULT_VECTOR_PRECISION = "float32"  # "float32", or "int8" (4x smaller) / "float16" (2x smaller) search with float32 rescoring
+DEFAULT_IVF_NLIST = 0  # IVF lists; 0 picks sqrt(number of vectors)
+DEFAULT_IVF_NPROBE = 32  # IVF lists scanned per query: higher recall, slower search
+DEFAULT_TOKENIZE_WORKERS = 0  # processes tokenizing documents during keyword index builds; 0 or 1 tokenizes in-process
+DEFAULT_KEYWORD_PROCESS_POOL_SIZE = 0  # worker processes for keyword search; 0 searches in the serving process
+DEFAULT_QUERY_CACHE_SIZE = 1024  # LRU entries for query embeddings and query tokens; 0 disables
+DEFAULT_ANSWER_CACHE_ENABLED = True
+DEFAULT_ANSWER_CACHE_MAX_ENTRIES = 1024
+DEFAULT_ANSWER_CACHE_TTL_SECONDS = 3600
+DEFAULT_ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # cosine similarity for reusing another query's answer; > 1 disables
+DEFAULT_PERSIST_INDEX = True  # save built indexes under FILE_CACHE_DIR and reuse them when documents are unchanged
+DEFAULT_THREAD_POOL_SIZE = 40  # anyio to_thread worker threads (anyio's default)
+DEFAULT_RETRIEVAL_CONCURRENCY = 8  # searches running at once; hybrid search uses two HYBRID_EXECUTOR_WORKERS threads each
+DEFAULT_LLM_CONCURRENCY = 32  # LLM calls in flight at once
+DEFAULT_ADMISSION_QUEUE_SIZE = 64  # requests waiting for a retrieval / LLM slot before new ones are rejected with 503
+DEFAULT_ADMISSION_MAX_WAIT_S = 10.0  # a request still waiting for a slot after this long is rejected with 503
+DEFAULT_FAST_START = False  # serve (liveness) right away and load models / build indexes in the background
 
+LLM_CLIENT = os.environ.get("LLM_CLIENT", DEFAULT_LLM_CLIENT).strip().lower()
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", DEFAULT_GEMINI_MODEL)
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", DEFAULT_FAKE_LLM_LATENCY))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", DEFAULT_FAKE_LLM_TOKENS_PER_SECOND))
+EMBEDDER = os.environ.get("EMBEDDER", DEFAULT_EMBEDDER).strip().lower()
 SENTENCE_ENCODER_MODEL = os.environ.get("SENTENCE_ENCODER_MODEL", DEFAULT_SENTENCE_ENCODER_MODEL)
 MAX_USER_INPUT = int(os.environ.get("MAX_USER_INPUT", DEFAULT_MAX_USER_INPUT))
 FILE_CACHE_DIR = str(Path(os.environ.get("FILE_CACHE_DIR", DEFAULT_FILE_CACHE_DIR)).resolve())
 SEARCH_LIMIT = int(os.environ.get("SEARCH_LIMIT", DEFAULT_SEARCH_LIMIT))
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", DEFAULT_SEARCH_BATCH_MAX_QUERIES))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", DEFAULT_EMBED_BATCH_SIZE))
+EMBEDDING_CACHE_ENABLED = _env_flag("EMBEDDING_CACHE_ENABLED", DEFAULT_EMBEDDING_CACHE_ENABLED)
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get("EMBEDDING_CACHE_MAX_MB", DEFAULT_EMBEDDING_CACHE_MAX_MB))
+PERSIST_INDEX = _env_flag("PERSIST_INDEX", DEFAULT_PERSIST_INDEX)
+THREAD_POOL_SIZE = int(os.environ.get("THREAD_POOL_SIZE", DEFAULT_THREAD_POOL_SIZE))
+RETRIEVAL_CONCURRENCY = int(os.environ.get("RETRIEVAL_CONCURRENCY", DEFAULT_RETRIEVAL_CONCURRENCY))
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", DEFAULT_LLM_CONCURRENCY))
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", DEFAULT_ADMISSION_QUEUE_SIZE))
+ADMISSION_MAX_WAIT_S = float(os.environ.get("ADMISSION_MAX_WAIT_S", DEFAULT_ADMISSION_MAX_WAIT_S))
+FAST_START = _env_flag("FAST_START", DEFAULT_FAST_START)
+EMBED_MICRO_BATCHING = _env_flag("EMBED_MICRO_BATCHING", DEFAULT_EMBED_MICRO_BATCHING)
+EMBED_MAX_WAIT_MS = float(os.environ.get("EMBED_MAX_WAIT_MS", DEFAULT_EMBED_MAX_WAIT_MS))
+EMBED_MAX_BATCH = int(os.environ.get("EMBED_MAX_BATCH", DEFAULT_EMBED_MAX_BATCH))
+VECTOR_STORE = os.environ.get("VECTOR_STORE", DEFAULT_VECTOR_STORE).strip().lower()
+VECTOR_PRECISION = os.environ.get("VECTOR_PRECISION", DEFAULT_VECTOR_PRECISION).strip().lower()
+IVF_NLIST = int(os.environ.get("IVF_NLIST", DEFAULT_IVF_NLIST))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", DEFAULT_IVF_NPROBE))
+TOKENIZE_WORKERS = int(os.environ.get("TOKENIZE_WORKERS", DEFAULT_TOKENIZE_WORKERS))
+KEYWORD_PROCESS_POOL_SIZE = int(os.environ.get("KEYWORD_PROCESS_POOL_SIZE", DEFAULT_KEYWORD_PROCESS_POOL_SIZE))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", DEFAULT_QUERY_CACHE_SIZE))
+ANSWER_CACHE_ENABLED = _env_flag("ANSWER_CACHE_ENABLED", DEFAULT_ANSWER_CACHE_ENABLED)
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", DEFAULT_ANSWER_CACHE_MAX_ENTRIES))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", DEFAULT_ANSWER_CACHE_TTL_SECONDS))
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY_THRESHOLD", DEFAULT_ANSWER_CACHE_SIMILARITY_THRESHOLD))
+CHUNKING_ENABLED = _env_flag("CHUNKING_ENABLED", DEFAULT_CHUNKING_ENABLED)
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", DEFAULT_CHUNK_SIZE))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", DEFAULT_CHUNK_OVERLAP))
 CORS_DOMAIN_NAME = os.environ.get("CORS_DOMAIN_NAME", "*").strip()
 
 # Settings (no associated env variable)
 BM25_K1 = 1.5
 BM25_B = 0.75 
-HYBRID_RRF_K = 60.0
\ No newline at end of file
+BM25_DYNAMIC_PRUNING = True  # MaxScore top-k evaluation for multi-term keyword queries
+BM25_PRUNING_MIN_DOCUMENTS = 20000  # smaller corpora use exhaustive scoring: MaxScore breaks even around here (0.8-1x at 5k-10k docs, 1.4x at 20k)
+HYBRID_RRF_K = 60.0
+VECTOR_RESCORE_FACTOR = 4  # compressed search shortlists rescore_factor * limit rows for exact rescoring
+IVF_MIN_TRAIN_SIZE = 10000  # below this many vectors the IVF store searches exactly
+EMBED_MICRO_BATCH_TIMEOUT_S = 2.0  # a query waiting longer for its micro-batch is embedded on its own
+KEYWORD_PROCESS_POOL_TIMEOUT_S = 5.0  # per query / health-check ping in the keyword process pool
+KEYWORD_PROCESS_POOL_MAX_TIMEOUTS = 3  # consecutive query timeouts after which the keyword process pool is restarted
+KEYWORD_PROCESS_POOL_HEALTH_CHECK_S = 60  # interval between keyword process pool health checks
+HYBRID_LEG_TIMEOUT_MS = 2000  # a hybrid leg slower than this is dropped and the other leg's results are used
+HYBRID_EXECUTOR_WORKERS = max(16, 2 * RETRIEVAL_CONCURRENCY)  # threads running hybrid search legs: two per admitted search, so legs do not queue
+OVERLOAD_RETRY_AFTER_S = 5  # Retry-After of 503 responses from admission control
+EVENT_LOOP_MONITOR_INTERVAL_S = 0.25  # event-loop lag / thread-pool sampling period for /metrics
+CHUNK_FETCH_FACTOR = 3  # over-fetch chunks per requested result before collapsing them to their parent posts
\ No newline at end of file
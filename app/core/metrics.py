@@ -0,0 +1,225 @@
+"""
+Minimal Prometheus-style metrics, rendered in the text exposition format (version 0.0.4) by GET /metrics.
+
+Counters, gauges and histograms are registered on REGISTRY when created. Values owned by other
+objects (cache counters, index size) are read at scrape time by collectors added with
+`REGISTRY.add_collector`, so the request path does not pay for them.
+
+Metrics live in the process that records them: keyword searches run in a KeywordProcessPool
+worker record their query tokenization time in that worker, not here.
+"""
+import math
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, NamedTuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUILD_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+class Sample(NamedTuple):
+    """One value reported by a collector"""
+    name: str
+    kind: str # "counter" or "gauge"
+    help: str
+    labels: dict[str,str]
+    value: float
+
+
+def _format_labels(labels:dict[str,str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+def _format_value(value:float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name:str, help:str, labelnames:Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels:dict[str,str]) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._render_values()]
+
+    def _render_values(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name:str, help:str, labelnames:Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values:dict[tuple, float] = dict()
+
+    def inc(self, amount:float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_values(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(v)}" for key, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name:str, help:str, labelnames:Iterable[str] = (), buckets:Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values:dict[tuple, list] = dict() # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0
+
+    def _render_values(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics:dict[str, _Metric] = dict()
+        self._collectors:list[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric:_Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector:Callable[[], Iterable[Sample]]):
+        """collector() is called on every render and returns the current samples"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        families:dict[str, list[Sample]] = dict()
+        for collector in collectors:
+            for sample in collector():
+                families.setdefault(sample.name, []).append(sample)
+        for name, samples in families.items():
+            lines.append(f"# HELP {name} {samples[0].help}")
+            lines.append(f"# TYPE {name} {samples[0].kind}")
+            lines.extend(f"{name}{_format_labels(s.labels)} {_format_value(s.value)}" for s in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+def counter(name:str, help:str, labelnames:Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+def gauge(name:str, help:str, labelnames:Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))
+
+def histogram(name:str, help:str, labelnames:Iterable[str] = (), buckets:Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+# -- application metrics
+STAGE_SECONDS = histogram(
+    "rag_stage_duration_seconds",
+    "Latency of query pipeline stages: query_tokenize, query_embed, vector_search, keyword_search, rrf_merge, prompt_build, llm, llm_first_token; "
+    "batch_query_embed, batch_vector_search, batch_keyword_search, batch_rrf_merge per /query/search/batch call",
+    ["stage"])
+BUILD_SECONDS = histogram("rag_index_build_duration_seconds", "Duration of index builds and syncs", ["operation"], BUILD_BUCKETS)
+HTTP_REQUEST_SECONDS = histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"])
+LLM_REQUESTS = counter("llm_requests_total", "LLM generate calls by outcome", ["status"])
+LLM_TOKENS = counter("llm_tokens_total", "LLM tokens reported in usage metadata", ["type"])
+ADMISSION_WAIT_SECONDS = histogram("rag_admission_wait_seconds", "Time admitted requests waited for a retrieval / LLM slot", ["limiter"])
+ADMISSION_REJECTED = counter("rag_admission_rejected_total", "Requests shed with 503 by admission control", ["limiter", "reason"])
+EVENT_LOOP_LAG_SECONDS = histogram("event_loop_lag_seconds", "Delay of event-loop wake-ups past their scheduled time")
+THREAD_POOL_THREADS = gauge("thread_pool_threads", "to_thread worker threads: busy and limit", ["state"])
+THREAD_POOL_WAITING = gauge("thread_pool_waiting_tasks", "Tasks waiting for a to_thread worker thread")
+
+def record_llm_usage(metadata:dict):
+    """Count prompt / candidates / total tokens of an LLM response's metadata"""
+    for token_type in ("prompt", "candidates", "total"):
+        count = metadata.get(f"{token_type}_token_count")
+        if count:
+            LLM_TOKENS.inc(count, type=token_type)
+
+async def monitor_event_loop(interval:float):
+    """Sample event-loop lag and use of anyio's to_thread pool every `interval` seconds, until cancelled.
+    Lag is how late a sleep wakes up: time the loop spent running other callbacks without yielding."""
+    from anyio import to_thread
+    limiter = to_thread.current_default_thread_limiter()
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(time.perf_counter() - start - interval, 0.0))
+        stats = limiter.statistics()
+        THREAD_POOL_THREADS.set(stats.borrowed_tokens, state="busy")
+        THREAD_POOL_THREADS.set(stats.total_tokens, state="limit")
+        THREAD_POOL_WAITING.set(stats.tasks_waiting)
@@ -4,7 +4,7 @@ from pydantic import (
     BaseModel,
     Field
 )
-from app.core.config import SEARCH_LIMIT
+from app.core.config import SEARCH_LIMIT, SEARCH_BATCH_MAX_QUERIES
 from typing import Literal
 
 
@@ -13,6 +13,11 @@ class SearchRequest(BaseModel):
     top_k:int = Field(default=SEARCH_LIMIT, description="Number of top relevant sources to retrieve") 
     method: Literal["semantic", "keyword", "hybrid"] = Field(default="hybrid", description="Search method: keyword (bm25), semantic, hybrid")
 
+class BatchSearchRequest(BaseModel):
+    queries:list[str] = Field(..., min_length=1, max_length=SEARCH_BATCH_MAX_QUERIES, description="Queries, searched together")
+    top_k:int = Field(default=SEARCH_LIMIT, description="Number of top relevant sources to retrieve per query")
+    method: Literal["semantic", "keyword", "hybrid"] = Field(default="hybrid", description="Search method: keyword (bm25), semantic, hybrid")
+
 class RagResponse(BaseModel):
     answer: str
     
\ No newline at end of file
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+from app.infrastructure.clients.llm_client_interface import AsyncLLMClientInterface
+from app.core.config import FAKE_LLM_LATENCY, FAKE_LLM_TOKENS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for a hosted LLM: no API key or network, configurable timing.
+# Used for development, streaming checks and load tests (LLM_CLIENT=fake).
+
+class FakeLLMClient(AsyncLLMClientInterface):
+    def __init__(self, latency:float = FAKE_LLM_LATENCY, tokens_per_second:float = FAKE_LLM_TOKENS_PER_SECOND, answer:str|None = None):
+        """latency: seconds before the first token; tokens_per_second: generation speed after that"""
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer = answer
+        self.model = "fake"
+
+    def _answer_tokens(self, prompt:str) -> list[str]:
+        answer = self.answer or f"This is a fake answer generated for a prompt of {len(prompt)} characters. " * 3
+        return [token + " " for token in answer.split()]
+
+    def _metadata(self, prompt:str, tokens:list[str]) -> dict:
+        prompt_tokens = len(prompt.split())
+        return {
+            "model": self.model,
+            "prompt_token_count": prompt_tokens,
+            "candidates_token_count": len(tokens),
+            "total_token_count": prompt_tokens + len(tokens)}
+
+    async def hello(self) -> dict:
+        return await self.generate("hello")
+
+    async def generate(self, prompt:str, history:list|None = None) -> dict:
+        tokens = self._answer_tokens(prompt)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        return {
+            "status": "ok",
+            "answer": "".join(tokens).strip(),
+            "metadata": self._metadata(prompt, tokens)}
+
+    async def generate_stream(self, prompt:str, history:list|None = None) -> AsyncIterator[dict]:
+        tokens = self._answer_tokens(prompt)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            yield {"type": "delta", "text": token}
+            await asyncio.sleep(1 / self.tokens_per_second)
+        yield {"type": "metadata", "metadata": self._metadata(prompt, tokens)}
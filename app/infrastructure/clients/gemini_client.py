@@ -1,5 +1,6 @@
 import logging
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncIterator
 from google import genai
 from app.infrastructure.clients.llm_client_interface import AsyncLLMClientInterface
 
@@ -23,15 +24,38 @@ class AsyncGeminiClient(AsyncLLMClientInterface):
                 contents = prompt
             )
             response_text = response.text or ""
-            metadata:dict = {"model": self.model}
-            if response.usage_metadata:
-                metadata.update({
-                    "prompt_token_count": response.usage_metadata.prompt_token_count,
-                    "candidates_token_count": response.usage_metadata.candidates_token_count,
-                    "total_token_count": response.usage_metadata.total_token_count})
             return {
                 "status": "ok", 
                 "answer": response_text, 
-                "metadata": metadata}
+                "metadata": self._metadata(response.usage_metadata)}
         except Exception as e:
             return {"status": "error", "detail": str(e)}
+
+    async def generate_stream(self, prompt:str, history:list|None = None) -> AsyncIterator[dict]:
+        usage_metadata = None
+        try:
+            stream = await self.client.models.generate_content_stream(
+                model = self.model,
+                contents = prompt
+            )
+            # close the upstream response as soon as this generator is closed (client disconnect), not at GC
+            async with aclosing(stream):
+                async for chunk in stream:
+                    if chunk.text:
+                        yield {"type": "delta", "text": chunk.text}
+                    if chunk.usage_metadata:
+                        usage_metadata = chunk.usage_metadata # cumulative, the last chunk has the totals
+        except Exception as e:
+            logger.error(f"Gemini stream failed: {e}")
+            yield {"type": "error", "detail": str(e)}
+            return
+        yield {"type": "metadata", "metadata": self._metadata(usage_metadata)}
+
+    def _metadata(self, usage_metadata:Any) -> dict:
+        metadata:dict = {"model": self.model}
+        if usage_metadata:
+            metadata.update({
+                "prompt_token_count": usage_metadata.prompt_token_count,
+                "candidates_token_count": usage_metadata.candidates_token_count,
+                "total_token_count": usage_metadata.total_token_count})
+        return metadata
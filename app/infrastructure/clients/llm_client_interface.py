@@ -1,5 +1,5 @@
-
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 
 class LLMClientInterface(ABC):
     @abstractmethod
@@ -16,3 +16,8 @@ class AsyncLLMClientInterface(ABC):
     @abstractmethod
     async def generate(self, prompt:str, history:list|None = None) -> dict:
         pass
+    @abstractmethod
+    def generate_stream(self, prompt:str, history:list|None = None) -> AsyncIterator[dict]:
+        """Async generator of events: {"type": "delta", "text": ...} per chunk of the answer,
+        then one {"type": "metadata", "metadata": {...}}; {"type": "error", "detail": ...} ends a failed stream"""
+        pass
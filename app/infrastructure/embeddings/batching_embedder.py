@@ -0,0 +1,92 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import numpy as np
+from numpy.typing import NDArray
+from app.infrastructure.embeddings.embedder import EmbedderInterface
+from app.core.config import EMBED_MAX_WAIT_MS, EMBED_MAX_BATCH, EMBED_MICRO_BATCH_TIMEOUT_S
+
+logger = logging.getLogger(__name__)
+
+class MicroBatchingEmbedder(EmbedderInterface):
+    """Coalesce concurrent `embed` calls into one `embed_batch` forward pass.
+
+    Callers (search worker threads) enqueue their text and block on a future. A single
+    batching thread takes the first waiting query, collects more for up to max_wait_ms
+    or until max_batch queries, encodes them together and hands each caller its row.
+    `embed_batch` (document builds) goes straight to the wrapped embedder.
+
+    A caller whose batch has not been encoded within `timeout` seconds (batching thread stuck
+    or dead) embeds its text itself; a dead batching thread is restarted by the next call.
+    """
+    def __init__(
+            self, embedder:EmbedderInterface,
+            max_wait_ms:float = EMBED_MAX_WAIT_MS, max_batch:int = EMBED_MAX_BATCH, timeout:float = EMBED_MICRO_BATCH_TIMEOUT_S):
+        self.embedder = embedder
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self.timeout = timeout
+        self._queue:queue.SimpleQueue[tuple[str, Future]] = queue.SimpleQueue()
+        self._worker:threading.Thread|None = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+
+    def embed(self, text:str) -> NDArray:
+        self._ensure_worker()
+        future:Future = Future()
+        self._queue.put((text, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel() # the batching thread skips it if it has not taken it yet
+            logger.warning(f"Micro-batched embedding timed out after {self.timeout:.1f}s, embedding the query on its own")
+            return self.embedder.embed(text)
+
+    def embed_batch(self, texts:list[str]) -> NDArray:
+        return self.embedder.embed_batch(texts)
+
+    @property
+    def model_name(self) -> str:
+        return self.embedder.model_name
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.queries / self.batches if self.batches else 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="embed-micro-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._encode(batch)
+
+    def _encode(self, batch:list[tuple[str, Future]]):
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()] # drop timed-out callers
+        if not batch:
+            return
+        try:
+            vectors = self.embedder.embed_batch([text for text, _ in batch])
+        except Exception as e:
+            logger.error(f"Micro-batch of {len(batch)} queries failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(np.array(vector)) # own copy, so a cached row doesn't pin the whole batch
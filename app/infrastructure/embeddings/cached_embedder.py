@@ -0,0 +1,27 @@
+import numpy as np
+from numpy.typing import NDArray
+from app.infrastructure.embeddings.embedder import EmbedderInterface
+from app.infrastructure.lru_cache import LRUCache
+from app.core.config import QUERY_CACHE_SIZE
+
+class CachedEmbedder(EmbedderInterface):
+    """LRU cache in front of `embed` (query embeddings), keyed on the query text.
+    `embed_batch` is used for document builds and passes straight through."""
+    def __init__(self, embedder:EmbedderInterface, max_size:int = QUERY_CACHE_SIZE):
+        self.embedder = embedder
+        self.cache = LRUCache(max_size)
+
+    @property
+    def model_name(self) -> str:
+        return self.embedder.model_name
+
+    def _embed(self, text:str) -> NDArray:
+        vector = np.asarray(self.embedder.embed(text))
+        vector.setflags(write=False) # shared between callers
+        return vector
+
+    def embed(self, text:str) -> NDArray:
+        return self.cache.get_or_compute(text, lambda: self._embed(text))
+
+    def embed_batch(self, texts:list[str]) -> NDArray:
+        return self.embedder.embed_batch(texts)
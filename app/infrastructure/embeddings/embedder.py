@@ -1,9 +1,14 @@
 # infrastructure/embeddings/embedder.py
+import logging
+import threading
 from abc import ABC, abstractmethod
 from numpy.typing import NDArray
-from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
 
 class EmbedderInterface(ABC):
+    model_name:str # identifies the vectors produced; persisted vectors of another model are not reused
+
     @abstractmethod
     def embed(self, text:str) -> NDArray:
         raise NotImplementedError
@@ -11,14 +16,36 @@ class EmbedderInterface(ABC):
     def embed_batch(self, texts: list[str]) -> NDArray:
         raise NotImplementedError
 
+    def load(self):
+        """Load the model now instead of on the first `embed` (optional)"""
+        pass
+
 
 class SentenceTransformerEmbedder(EmbedderInterface):
-    def __init__(self, model_name: str):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str, lazy:bool = False):
+        """lazy: import sentence_transformers (and torch) and load the model on first use or `load()`"""
+        self.model_name = model_name
+        self._model = None
+        self._load_lock = threading.Lock()
+        if not lazy:
+            self.load()
+
+    def load(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer # heavy: imports torch
+                    self._model = SentenceTransformer(self.model_name)
+                    logger.info(f"Loaded sentence encoder {self.model_name}")
+
+    @property
+    def model(self):
+        self.load()
+        return self._model
     
     def embed(self, text: str) -> NDArray:
         return self.model.encode([text])[0]
     
     def embed_batch(self, texts: list[str]) -> NDArray:
-        return self.model.encode(texts)
-
+        # callers size the batch, so encode it in a single forward pass
+        return self.model.encode(texts, batch_size=max(len(texts), 1))
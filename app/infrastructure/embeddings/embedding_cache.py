@@ -0,0 +1,213 @@
+# infrastructure/embeddings/embedding_cache.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+from numpy.typing import NDArray
+
+from app.core.config import FILE_CACHE_DIR, EMBEDDING_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of document embeddings for one encoder model.
+
+    Entries are keyed by the sha256 of the document content. Files under `<base_path>/embedding_cache/`:
+        meta.json               format version, model name, dim, row count, file names
+        keys-<version>.npy      (n, 32) uint8 raw digests
+        vectors-<version>.npy   (n, dim) float32, opened with mmap_mode='r'
+        last_used-<version>.npy (n,) int64 unix time of last hit, used for eviction
+    Every save writes a new set of data files and replaces meta.json last, so a reader (or another
+    process saving at the same time) always sees keys and vectors of the same save. A save without
+    new entries or evictions only writes a new last_used file, and nothing if there were no hits.
+
+    A cache written by a different model (or format version) is discarded on load. Loading happens
+    in `load()` or on first use, not in the constructor, so creating the cache does no I/O.
+    """
+    VERSION = 2
+    _FILE_PATTERNS = ['keys-*.npy', 'vectors-*.npy', 'last_used-*.npy'] # versioned data files, removed once superseded
+    _STALE_FILE_S = 600 # unreferenced data files older than this are removed by the next save
+
+    def __init__(self, model_name:str, base_path:str = FILE_CACHE_DIR, max_mb:float = EMBEDDING_CACHE_MAX_MB):
+        self.model_name = model_name
+        self.path = Path(base_path).joinpath('embedding_cache')
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._rows:dict[bytes,int] = dict() # digest -> row in self._vectors
+        self._keys = np.empty((0, 32), dtype=np.uint8)
+        self._vectors:NDArray = np.empty((0, 0), dtype=np.float32)
+        self._last_used = np.empty(0, dtype=np.int64)
+        self._last_used_changed = False # hits since the last save
+        self._meta:dict = dict() # meta.json of the version loaded or last saved by this process
+        self._pending:dict[bytes,NDArray] = dict() # new entries not yet saved
+        self._files:set[str] = set() # data files of the version loaded or last saved by this process
+        self.hits = 0
+        self.misses = 0
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @staticmethod
+    def _key(text:str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def load(self):
+        """Read the on-disk cache now rather than on first use"""
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        meta_path = self.path.joinpath('meta.json')
+        if not meta_path.exists():
+            return
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != self.VERSION or meta.get('model') != self.model_name:
+                logger.info(f"Embedding cache at {self.path} was built for model {meta.get('model')!r}; discarding it")
+                return
+            keys = np.load(self.path.joinpath(meta['keys_file']))
+            vectors = np.load(self.path.joinpath(meta['vectors_file']), mmap_mode='r')
+            last_used = np.load(self.path.joinpath(meta['last_used_file']))
+            if not (len(keys) == len(vectors) == len(last_used) == meta.get('rows')):
+                raise ValueError("row counts do not match meta.json")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache at {self.path}: {e}")
+            return
+        self._keys, self._vectors, self._last_used = keys, vectors, last_used.copy()
+        self._meta = meta
+        self._files = {meta['keys_file'], meta['vectors_file'], meta['last_used_file']}
+        self._rows = {key.tobytes():row for row, key in enumerate(keys)}
+        logger.info(f"Embedding cache loaded: {len(self._rows)} entries for model {self.model_name}")
+
+    def get_many(self, texts:list[str]) -> list[NDArray|None]:
+        """Cached embedding per text, None where missing"""
+        self.load()
+        now = int(time.time())
+        result:list[NDArray|None] = []
+        for text in texts:
+            key = self._key(text)
+            if key in self._pending:
+                result.append(self._pending[key])
+            elif key in self._rows:
+                row = self._rows[key]
+                self._last_used[row] = now
+                self._last_used_changed = True
+                result.append(np.asarray(self._vectors[row]))
+            else:
+                result.append(None)
+        found = sum(vector is not None for vector in result)
+        self.hits += found
+        self.misses += len(texts) - found
+        return result
+
+    def put_many(self, texts:list[str], vectors:NDArray):
+        self.load()
+        for text, vector in zip(texts, vectors):
+            self._pending[self._key(text)] = np.asarray(vector, dtype=np.float32)
+
+    def _max_rows(self, dim:int) -> int:
+        row_bytes = dim * 4 + self._keys.shape[1] + self._last_used.itemsize
+        return max(self.max_bytes // row_bytes, 0)
+
+    def save(self):
+        """Merge pending entries into the on-disk cache, evicting least recently used rows over max size"""
+        self.load() # never replace the on-disk cache with only this process's entries
+        if not self._pending and len(self._rows) <= self._max_rows(self._vectors.shape[1]):
+            if self._last_used_changed:
+                self._save_last_used()
+            return
+        now = int(time.time())
+        pending_keys = list(self._pending.keys())
+        new_keys = np.frombuffer(b''.join(pending_keys), dtype=np.uint8).reshape(-1, 32)
+        keys = np.concatenate([self._keys, new_keys])
+        last_used = np.concatenate([self._last_used, np.full(len(pending_keys), now, dtype=np.int64)])
+        dim = self._vectors.shape[1] if len(self._keys) else len(next(iter(self._pending.values())))
+
+        # evict oldest entries beyond the size limit
+        keep = np.argsort(-last_used, kind='stable')[:self._max_rows(dim)]
+        keep.sort()
+        if len(keep) < len(keys):
+            logger.info(f"Embedding cache evicting {len(keys) - len(keep)} entries (limit {self.max_bytes} bytes)")
+
+        # kept rows are sorted, so surviving old rows come before surviving pending ones
+        n_old = len(self._keys)
+        old_keep, new_keep = keep[keep < n_old], keep[keep >= n_old] - n_old
+        vectors = np.empty((len(keep), dim), dtype=np.float32)
+        if len(old_keep):
+            vectors[:len(old_keep)] = self._vectors[old_keep]
+        for i, row in enumerate(new_keep, start=len(old_keep)):
+            vectors[i] = self._pending[pending_keys[row]]
+        keys, last_used = keys[keep], last_used[keep]
+
+        # write a new version of the data files, then point meta.json at them in one atomic replace
+        os.makedirs(self.path, exist_ok=True)
+        tag = uuid.uuid4().hex[:16]
+        meta = {'version': self.VERSION, 'model': self.model_name, 'dim': dim, 'rows': len(keys)}
+        for name, array in (('keys', keys), ('vectors', vectors), ('last_used', last_used)):
+            meta[f'{name}_file'] = f'{name}-{tag}.npy'
+            self._replace_atomically(meta[f'{name}_file'], lambda f: np.save(f, array))
+        vectors = np.load(self.path.joinpath(meta['vectors_file']), mmap_mode='r') # before a concurrent save can remove it
+        self._replace_atomically('meta.json', lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        self._remove_superseded(meta)
+        logger.info(f"Embedding cache saved: {len(keys)} entries ({len(self._pending)} new)")
+
+        self._pending.clear()
+        self._keys, self._vectors, self._last_used = keys, vectors, last_used
+        self._last_used_changed = False
+        self._meta = meta
+        self._rows = {key.tobytes():row for row, key in enumerate(keys)}
+
+    def _save_last_used(self):
+        """Persist hit times only, reusing the keys and vectors files of the current version.
+        Skipped if another process has published a newer version since: its files may not match our rows."""
+        try:
+            with open(self.path.joinpath('meta.json'), 'r') as f:
+                on_disk = json.load(f)
+        except (OSError, ValueError):
+            return
+        if on_disk != self._meta:
+            logger.info("Embedding cache was saved by another process; not updating last-used times")
+            return
+        meta = dict(self._meta, last_used_file=f'last_used-{uuid.uuid4().hex[:16]}.npy')
+        self._replace_atomically(meta['last_used_file'], lambda f: np.save(f, self._last_used))
+        self._replace_atomically('meta.json', lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        self._remove_superseded(meta)
+        self._last_used_changed = False
+        self._meta = meta
+        logger.info(f"Embedding cache saved last-used times of {len(self._rows)} entries")
+
+    def _replace_atomically(self, name:str, write):
+        tmp_path = self.path.joinpath(f'{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, self.path.joinpath(name))
+
+    def _remove_superseded(self, meta:dict):
+        """Drop the data files this process used before, and stale ones nothing refers to (left by crashed saves).
+        Keeps files meta.json points at, in case another process replaced it since; files a concurrent save
+        has written but not yet published are younger than _STALE_FILE_S. Processes that still map an
+        old vectors file keep their open copy."""
+        current = {name for name in meta.values() if isinstance(name, str)}
+        try:
+            with open(self.path.joinpath('meta.json'), 'r') as f:
+                current |= {name for name in json.load(f).values() if isinstance(name, str)}
+        except (OSError, ValueError):
+            pass
+        stale_before = time.time() - self._STALE_FILE_S
+        for pattern in self._FILE_PATTERNS:
+            for path in self.path.glob(pattern):
+                try:
+                    if path.name not in current and (path.name in self._files or path.stat().st_mtime < stale_before):
+                        path.unlink(missing_ok=True)
+                except FileNotFoundError:
+                    pass
+        self._files = {name for name in meta.values() if isinstance(name, str)}
@@ -0,0 +1,40 @@
+import re
+import zlib
+import numpy as np
+from numpy.typing import NDArray
+from app.infrastructure.embeddings.embedder import EmbedderInterface
+
+# Deterministic stand-in for the sentence encoder: no model download, torch or GPU.
+# Texts sharing words (latin words, CJK character bigrams) get similar vectors, so semantic
+# search still returns related documents. Used for benchmarks and load tests, not for serving.
+
+_FEATURE_RE = re.compile(r"[A-Za-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+") # latin words, CJK runs
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+class HashingEmbedder(EmbedderInterface):
+    def __init__(self, dim:int = 384):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+
+    def _features(self, text:str) -> list[str]:
+        features = []
+        for run in _FEATURE_RE.findall(text):
+            if _CJK_RE.match(run):
+                features.extend(run[i:i + 2] for i in range(max(len(run) - 1, 1)))
+            else:
+                features.append(run.lower())
+        return features
+
+    def embed(self, text:str) -> NDArray:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts:list[str]) -> NDArray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in self._features(text)), dtype=np.uint32)
+            if not len(hashes):
+                continue
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32) # feature hashing with a sign bit
+            vectors[row] = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
@@ -0,0 +1,104 @@
+"""
+Split long documents into overlapping chunks that fit the sentence encoder.
+
+Token counts approximate the encoder's wordpiece count without loading its tokenizer:
+every CJK character counts as one token, every run of latin letters/digits as one token,
+and every other non-space character as one token.
+
+Chunks prefer to end at Markdown block boundaries (headings, blank lines, fenced code blocks),
+then at sentence ends, and never split inside a fenced code block unless the block alone is
+longer than a chunk.
+"""
+import re
+import logging
+from app.domain.models import Document
+from app.core.config import CHUNK_SIZE, CHUNK_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]" # CJK: one char per token
+    r"|[A-Za-z0-9_]+" # latin word
+    r"|[^\s]") # punctuation / other symbols
+_CODE_FENCE_RE = re.compile(r"^```.*?^```[^\n]*$", re.MULTILINE | re.DOTALL)
+_SENTENCE_END = set("。！？；.!?;")
+
+# break priorities, higher is a better place to end a chunk
+_BREAK_NONE, _BREAK_SENTENCE, _BREAK_LINE, _BREAK_BLOCK, _BREAK_HEADING = 0, 1, 2, 3, 4
+
+
+def parent_id(document:Document) -> str:
+    """Id of the post a (chunk) document belongs to"""
+    return document.metadata.get("parent_id", document.id)
+
+
+class Chunker:
+    def __init__(self, chunk_size:int = CHUNK_SIZE, overlap:int = CHUNK_OVERLAP):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError(f"Chunk overlap must be in [0, chunk_size): got {overlap} for size {chunk_size}")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def _tokens(self, text:str) -> tuple[list[tuple[int,int]], list[int]]:
+        """Token char spans, and the break priority after each token"""
+        spans = [m.span() for m in _TOKEN_RE.finditer(text)]
+        fences = [m.span() for m in _CODE_FENCE_RE.finditer(text)]
+        breaks = [_BREAK_NONE] * len(spans)
+        fence = 0
+        for i, (start, end) in enumerate(spans):
+            while fence < len(fences) and fences[fence][1] <= start:
+                fence += 1
+            if fence < len(fences) and fences[fence][0] <= start and end < fences[fence][1]:
+                continue # inside a fenced code block (its closing fence may still break)
+            next_start = spans[i + 1][0] if i + 1 < len(spans) else len(text)
+            gap = text[end:next_start]
+            if "\n" in gap and text.startswith("#", next_start):
+                breaks[i] = _BREAK_HEADING # keep a heading with the section it starts
+            elif gap.count("\n") >= 2:
+                breaks[i] = _BREAK_BLOCK # blank line
+            elif "\n" in gap:
+                breaks[i] = _BREAK_LINE
+            elif text[start:end] in _SENTENCE_END:
+                breaks[i] = _BREAK_SENTENCE
+        return spans, breaks
+
+    def split(self, text:str) -> list[tuple[int,int]]:
+        """Char spans (start, end) of the chunks of text"""
+        spans, breaks = self._tokens(text)
+        if len(spans) <= self.chunk_size:
+            return [(0, len(text))] if text.strip() else []
+        chunks = []
+        start = 0
+        while start < len(spans):
+            end = min(start + self.chunk_size, len(spans)) # exclusive token index
+            if end < len(spans):
+                # end after the best break in the second half of the window
+                lower = start + self.chunk_size // 2
+                best = max(range(lower, end), key=lambda i: (breaks[i], i))
+                if breaks[best] > _BREAK_NONE:
+                    end = best + 1
+            chunks.append((spans[start][0], spans[end - 1][1]))
+            if end >= len(spans):
+                break
+            start = max(end - self.overlap, start + 1)
+        return chunks
+
+    def chunk_document(self, document:Document) -> list[Document]:
+        spans = self.split(document.content)
+        if len(spans) <= 1:
+            metadata = {**document.metadata, "parent_id": document.id, "chunk_index": 0, "start": 0, "end": len(document.content)}
+            return [Document(id=document.id, content=document.content, metadata=metadata)]
+        title = document.metadata.get("title", "")
+        chunks = []
+        for i, (start, end) in enumerate(spans):
+            content = document.content[start:end]
+            if i > 0 and title:
+                content = f"{title} - {content}" # keep the post title as context for every chunk
+            metadata = {**document.metadata, "parent_id": document.id, "chunk_index": i, "start": start, "end": end}
+            chunks.append(Document(id=f"{document.id}#chunk-{i}", content=content, metadata=metadata))
+        return chunks
+
+    def chunk_documents(self, documents:list[Document]) -> list[Document]:
+        chunks = [chunk for document in documents for chunk in self.chunk_document(document)]
+        logger.debug(f"Chunked {len(documents)} documents into {len(chunks)} chunks")
+        return chunks
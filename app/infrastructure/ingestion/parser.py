@@ -15,6 +15,7 @@ index.json structure:
 import logging
 import json
 from app.domain.models import Document 
+from app.infrastructure.ingestion.chunker import Chunker
 logger = logging.getLogger(__name__)
 
 
@@ -49,7 +50,10 @@ def format_documents(items) -> list[Document]:
     logger.debug(f"Format {len(items)} items and form {len(documents)} documents")
     return documents
 
-def load_documents(path:str) -> list[Document]:
-    """Load Document either from http(s) url or local json file path """
+def load_documents(path:str, chunker:Chunker|None = None) -> list[Document]:
+    """Load Document either from http(s) url or local json file path, optionally split into chunks"""
     items = fetch_index_json(path)
-    return format_documents(items)
\ No newline at end of file
+    documents = format_documents(items)
+    if chunker is not None:
+        documents = chunker.chunk_documents(documents)
+    return documents
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os
+import json
+import struct
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass
+import numpy as np
+from numpy.typing import NDArray
+
+from app.domain.models import Document
+
+logger = logging.getLogger(__name__)
+
+# On-disk layout (little endian):
+#   MAGIC (8 bytes) | header length (uint64) | JSON header | sections, each aligned to ALIGNMENT bytes
+# The header records format version, source fingerprint, a sha256 of everything after the header,
+# and per-section offset/dtype/shape, so every array can be viewed directly on a read-only mmap.
+MAGIC = b'BM25IDX\0'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+class BM25IndexFormatError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class BM25Index:
+    """Columnar inverted index: sorted vocabulary + CSR postings + doc lengths + document table.
+
+    Postings of term ordinal t are rows indptr[t]:indptr[t+1] of doc_ordinals / term_frequencies,
+    sorted by doc ordinal. Doc ordinal i refers to documents[i] / doc_lengths[i].
+    """
+    vocabulary: list[str] # sorted, term ordinal = position
+    indptr: NDArray[np.int64]
+    doc_ordinals: NDArray[np.int32]
+    term_frequencies: NDArray[np.int32]
+    doc_lengths: NDArray[np.int32]
+    documents: list[Document]
+
+    @property
+    def num_documents(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_term_frequencies(cls, documents:list[Document], term_frequencies:list[Counter[str]]) -> "BM25Index":
+        """Build from one token Counter per document (same order as documents)"""
+        vocabulary = sorted(set().union(*term_frequencies)) if term_frequencies else []
+        term_ordinal = {term:i for i, term in enumerate(vocabulary)}
+        terms, docs, tfs = [], [], []
+        for doc_ordinal, counter in enumerate(term_frequencies):
+            for term, count in counter.items():
+                terms.append(term_ordinal[term])
+                docs.append(doc_ordinal)
+                tfs.append(count)
+        terms_arr = np.asarray(terms, dtype=np.int64)
+        docs_arr = np.asarray(docs, dtype=np.int32)
+        tfs_arr = np.asarray(tfs, dtype=np.int32)
+        order = np.lexsort((docs_arr, terms_arr))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms_arr, minlength=len(vocabulary)), out=indptr[1:])
+        doc_lengths = np.asarray([sum(counter.values()) for counter in term_frequencies], dtype=np.int32)
+        return cls(vocabulary, indptr, docs_arr[order], tfs_arr[order], doc_lengths, list(documents))
+
+    def apply_changes(self, removed_ids:set[str], documents:list[Document], term_frequencies:list[Counter[str]]) -> "BM25Index":
+        """New index without the documents in removed_ids, plus the given (already tokenized) documents.
+        Surviving postings are carried over as arrays, so only the added documents need tokenizing."""
+        keep = np.fromiter((doc.id not in removed_ids for doc in self.documents), dtype=bool, count=self.num_documents)
+        new_ordinal = np.cumsum(keep) - 1 # ordinal of each surviving document in the new index
+        kept_count = int(keep.sum())
+
+        posting_mask = keep[self.doc_ordinals]
+        old_terms = np.repeat(np.arange(len(self.vocabulary)), np.diff(self.indptr))[posting_mask]
+        old_docs = new_ordinal[self.doc_ordinals[posting_mask]]
+        old_tfs = np.asarray(self.term_frequencies)[posting_mask]
+
+        added = BM25Index.from_term_frequencies(documents, term_frequencies)
+        added_terms = np.repeat(np.arange(len(added.vocabulary)), np.diff(added.indptr))
+
+        # merge the two sorted vocabularies, then drop terms left without postings
+        vocabulary = sorted(set(self.vocabulary).union(added.vocabulary))
+        ordinal = {term:i for i, term in enumerate(vocabulary)}
+        old_map = np.fromiter((ordinal[t] for t in self.vocabulary), dtype=np.int64, count=len(self.vocabulary))
+        added_map = np.fromiter((ordinal[t] for t in added.vocabulary), dtype=np.int64, count=len(added.vocabulary))
+        terms = np.concatenate([old_map[old_terms], added_map[added_terms]])
+        docs = np.concatenate([old_docs, added.doc_ordinals.astype(np.int64) + kept_count]).astype(np.int32)
+        tfs = np.concatenate([old_tfs, added.term_frequencies]).astype(np.int32)
+
+        counts = np.bincount(terms, minlength=len(vocabulary))
+        used = counts > 0
+        terms = (np.cumsum(used) - 1)[terms]
+        vocabulary = [term for term, is_used in zip(vocabulary, used.tolist()) if is_used]
+        order = np.lexsort((docs, terms))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(counts[used], out=indptr[1:])
+        doc_lengths = np.concatenate([np.asarray(self.doc_lengths)[keep], added.doc_lengths]).astype(np.int32)
+        kept_documents = [doc for doc, is_kept in zip(self.documents, keep.tolist()) if is_kept]
+        return BM25Index(vocabulary, indptr, docs[order], tfs[order], doc_lengths, kept_documents + list(documents))
+
+    def postings(self, term_ordinal:int) -> tuple[NDArray[np.int32], NDArray[np.int32]]:
+        """(doc ordinals, term frequencies) of a term"""
+        start, end = self.indptr[term_ordinal], self.indptr[term_ordinal + 1]
+        return self.doc_ordinals[start:end], self.term_frequencies[start:end]
+
+    # -- file I/O
+    def save(self, path:str, fingerprint:str|None = None):
+        vocab_encoded = [term.encode('utf-8') for term in self.vocabulary]
+        vocab_offsets = np.zeros(len(vocab_encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in vocab_encoded], out=vocab_offsets[1:])
+        documents_blob = b''.join(doc.model_dump_json().encode('utf-8') + b'\n' for doc in self.documents)
+        arrays = {
+            'vocab_offsets': vocab_offsets,
+            'vocab_bytes': np.frombuffer(b''.join(vocab_encoded), dtype=np.uint8),
+            'indptr': np.asarray(self.indptr, dtype=np.int64),
+            'doc_ordinals': np.asarray(self.doc_ordinals, dtype=np.int32),
+            'term_frequencies': np.asarray(self.term_frequencies, dtype=np.int32),
+            'doc_lengths': np.asarray(self.doc_lengths, dtype=np.int32),
+            'documents': np.frombuffer(documents_blob, dtype=np.uint8),
+        }
+        sections, payload, offset = {}, [], 0
+        for name, array in arrays.items():
+            data = np.ascontiguousarray(array).astype(array.dtype.newbyteorder('<'), copy=False).tobytes()
+            sections[name] = {'offset': offset, 'dtype': array.dtype.newbyteorder('<').str, 'shape': list(array.shape)}
+            padding = -len(data) % ALIGNMENT
+            payload.append(data + b'\0' * padding)
+            offset += len(data) + padding
+        payload_bytes = b''.join(payload)
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'fingerprint': fingerprint,
+            'num_documents': self.num_documents,
+            'num_terms': len(self.vocabulary),
+            'checksum': hashlib.sha256(payload_bytes).hexdigest(),
+            'sections': sections,
+        }).encode('utf-8')
+        header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(payload_bytes)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_header(path:str) -> dict:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise BM25IndexFormatError(f"{path} is not a BM25 index file")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len))
+        if header.get('version') != FORMAT_VERSION:
+            raise BM25IndexFormatError(f"Unsupported BM25 index format version {header.get('version')}")
+        header['payload_offset'] = len(MAGIC) + 8 + header_len
+        return header
+
+    @classmethod
+    def load(cls, path:str, verify:bool = True) -> tuple["BM25Index", dict]:
+        """Memory-map an index file; return (index, header)"""
+        header = cls.read_header(path)
+        payload = np.memmap(path, dtype=np.uint8, mode='r', offset=header['payload_offset'])
+        if verify and hashlib.sha256(payload).hexdigest() != header['checksum']:
+            raise BM25IndexFormatError(f"Checksum mismatch in {path}")
+
+        def section(name:str) -> NDArray:
+            spec = header['sections'][name]
+            dtype = np.dtype(spec['dtype'])
+            count = int(np.prod(spec['shape']))
+            data = payload[spec['offset']:spec['offset'] + count * dtype.itemsize]
+            return data.view(dtype).reshape(spec['shape'])
+
+        vocab_offsets = section('vocab_offsets')
+        vocab_bytes = section('vocab_bytes').tobytes()
+        vocabulary = [vocab_bytes[vocab_offsets[i]:vocab_offsets[i + 1]].decode('utf-8') for i in range(len(vocab_offsets) - 1)]
+        documents = [Document.model_validate_json(line) for line in section('documents').tobytes().splitlines() if line]
+        index = cls(
+            vocabulary,
+            section('indptr'),
+            section('doc_ordinals'),
+            section('term_frequencies'),
+            section('doc_lengths'),
+            documents)
+        if index.num_documents != header['num_documents'] or len(vocabulary) != header['num_terms']:
+            raise BM25IndexFormatError(f"Corrupt BM25 index {path}: header counts do not match sections")
+        return index, header
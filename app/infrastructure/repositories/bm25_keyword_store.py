@@ -1,77 +1,208 @@
 import os
 import math
-import pickle
 import logging
-from collections import Counter, defaultdict
+from copy import copy as shallow_copy
+from collections import Counter
+import numpy as np
+from numpy.typing import NDArray
 
 from app.infrastructure.repositories.keyword_store_interface import KeywordStoreInterface
+from app.infrastructure.repositories.bm25_index import BM25Index
 from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.infrastructure.repositories.file_vector_store import top_k_indices
 from app.domain.models import Document, SearchResult
-from app.core.config import FILE_CACHE_DIR, BM25_B, BM25_K1
+from app.core.config import FILE_CACHE_DIR, BM25_B, BM25_K1, BM25_DYNAMIC_PRUNING, BM25_PRUNING_MIN_DOCUMENTS
+from app.core.metrics import STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 
 class BM25KeywordStore(KeywordStoreInterface):
-    def __init__(self, tokenizer:TokenizerInterface) -> None:
+    """BM25 over a columnar BM25Index.
+
+    Corpus statistics (per-term IDF, average doc length) and the BM25 score of every posting
+    are computed once when an index is built or loaded, so a query only gathers postings
+    of its terms and sums precomputed scores.
+
+    With dynamic_pruning, multi-term queries use MaxScore: per-term score upper bounds let the
+    evaluator stop admitting new documents (and drop candidates) once they can no longer reach
+    the current top-k, and look up only the surviving candidates in the remaining posting lists.
+    The result is exactly the exhaustive top-k. It only pays off on large corpora, so it is used
+    from pruning_min_documents documents on.
+    """
+    def __init__(
+            self, 
+            tokenizer:TokenizerInterface, 
+            base_path:str = FILE_CACHE_DIR, 
+            k1:float = BM25_K1, 
+            b:float = BM25_B,
+            dynamic_pruning:bool = BM25_DYNAMIC_PRUNING,
+            pruning_min_documents:int = BM25_PRUNING_MIN_DOCUMENTS,
+            query_tokenizer:TokenizerInterface|None = None) -> None:
+        """query_tokenizer: tokenizer for search queries (e.g. a CachedTokenizer); defaults to tokenizer"""
         self.tokenizer = tokenizer
-        self.index: dict[str,set] = defaultdict(set) # token -> doc_id set
-        self.docmap: dict[str,Document] = dict() # doc_id -> Document
-        self.term_frequency: dict[str, Counter[str]] = defaultdict(Counter) # {doc_id : {token : cnt}}
-        self.doc_lengths: dict[str,int] = dict() # doc_id -> length
+        self.query_tokenizer = query_tokenizer or tokenizer
+        self.k1 = k1
+        self.b = b
+        self.dynamic_pruning = dynamic_pruning
+        self.pruning_min_documents = pruning_min_documents
+        self.base_path = base_path
+        self.index_path:str = os.path.join(base_path, 'bm25_index.bin')
+        self._set_index(BM25Index.from_term_frequencies([], []))
+
+    def _set_index(self, index:BM25Index):
+        """Install an index and precompute its scoring statistics"""
+        self.index = index
+        self.term_ordinals:dict[str,int] = {term:i for i, term in enumerate(index.vocabulary)}
+        self.doc_ordinals:dict[str,int] = {doc.id:i for i, doc in enumerate(index.documents)}
+        doc_count = index.num_documents
+        doc_freqs = np.diff(index.indptr)
+        self.avg_doc_length:float = int(index.doc_lengths.sum()) / doc_count if doc_count else 0.0
+        # math.log per term (not np.log) keeps scores bit-identical to the scalar formula
+        self.idf = np.array(
+            [math.log((doc_count - df + 0.5) / (df + 0.5) + 1) for df in doc_freqs.tolist()], dtype=np.float64)
+        self.posting_scores = self._score_postings()
+        self.term_upper_bounds = self._term_upper_bounds()
+
+    def _score_postings(self) -> NDArray[np.float64]:
+        """BM25 score of every (term, doc) posting, aligned with index.doc_ordinals"""
+        index = self.index
+        if not len(index.doc_ordinals):
+            return np.empty(0, dtype=np.float64)
+        k1, b = self.k1, self.b
+        length_norm = 1 - b + b * (index.doc_lengths.astype(np.float64) / self.avg_doc_length)
+        tf = index.term_frequencies.astype(np.float64)
+        tf_component = (tf * (k1 + 1)) / (tf + k1 * length_norm[index.doc_ordinals])
+        return tf_component * np.repeat(self.idf, np.diff(index.indptr))
 
-        self.index_path:str  = os.path.join(FILE_CACHE_DIR, 'inverted_index')
-        self.docmap_path:str = os.path.join(FILE_CACHE_DIR, 'docmap.pkl')
-        self.term_frequency_path:str = os.path.join(FILE_CACHE_DIR, 'term_frequencies.pkl')
-        self.doc_lengths_path:str    = os.path.join(FILE_CACHE_DIR, 'doc_lengths.pkl')
+    def _term_upper_bounds(self) -> NDArray[np.float64]:
+        """Max posting score per term (0 for terms without postings)"""
+        upper_bounds = np.zeros(len(self.index.vocabulary), dtype=np.float64)
+        starts = self.index.indptr[:-1]
+        nonempty = np.diff(self.index.indptr) > 0
+        if nonempty.any():
+            upper_bounds[nonempty] = np.maximum.reduceat(self.posting_scores, starts[nonempty])
+        return upper_bounds
 
     @property
     def total_document(self) -> int:
-        return len(self.docmap)
-    
+        return self.index.num_documents
+
+    @property
+    def docmap(self) -> dict[str,Document]:
+        return {doc.id:doc for doc in self.index.documents}
+
     def build_index(self, documents:list[Document]):
-        for document in documents: # .id .content .metadata
-            self.__add_document(document.id, document.content)
-            self.docmap[document.id] = document
+        term_frequencies = [Counter(tokens) for tokens in self.tokenizer.tokenize_many([document.content for document in documents])]
+        self._set_index(BM25Index.from_term_frequencies(documents, term_frequencies))
         logger.info(f"BM25KeywordStore build complete: {self.total_document} documents indexed.")
 
+    def update_index(self, upserts:list[Document], delete_ids:list[str]):
+        """Only upserted documents are tokenized; corpus statistics and posting scores are refreshed from the merged arrays"""
+        removed_ids = set(delete_ids) | {doc.id for doc in upserts if doc.id in self.doc_ordinals}
+        term_frequencies = [Counter(tokens) for tokens in self.tokenizer.tokenize_many([document.content for document in upserts])]
+        self._set_index(self.index.apply_changes(removed_ids, upserts, term_frequencies))
+        logger.info(f"BM25KeywordStore updated: {len(upserts)} upserted, {len(delete_ids)} deleted, {self.total_document} documents indexed.")
+
+    def copy(self) -> "BM25KeywordStore":
+        """Cheap snapshot: index and statistics are never mutated in place (_set_index replaces them), so they are shared"""
+        return shallow_copy(self)
+
     def search(self, query:str, limit:int) -> list[SearchResult]:
-        q_tokens = self.tokenizer.tokenize(query)
-        doc_scores:dict[str,float] = defaultdict(float)
-        for q_token in set(q_tokens):
-            doc_ids = self.get_documents(q_token)
-            for doc_id in doc_ids:
-                doc_scores[doc_id] += self.bm25(doc_id, q_token, BM25_K1, BM25_B)
-        top_doc_scores = sorted([(doc_id, score) for doc_id, score in doc_scores.items()], key=lambda x: x[1], reverse=True)[:limit]
-        result = []
-        for i, (doc_id, score) in enumerate(top_doc_scores):
-            doc = self.docmap[doc_id]
-            rank = i + 1
-            result.append(SearchResult(document=doc, score=score, rank=rank))
-        return result
+        documents = self.index.documents
+        return [
+            SearchResult(document=documents[doc_ordinal], score=score, rank=i + 1)
+            for i, (doc_ordinal, score) in enumerate(self.search_ordinals(query, limit))]
+
+    def search_batch(self, queries:list[str], limit:int) -> list[list[SearchResult]]:
+        documents = self.index.documents
+        return [
+            [SearchResult(document=documents[doc_ordinal], score=score, rank=i + 1) for i, (doc_ordinal, score) in enumerate(hits)]
+            for hits in self.search_ordinals_batch(queries, limit)]
+
+    def search_ordinals(self, query:str, limit:int) -> list[tuple[int, float]]:
+        """Top-k as (doc ordinal, score), best first"""
+        with STAGE_SECONDS.time(stage="query_tokenize"):
+            q_tokens = self.query_tokenizer.tokenize(query)
+        return self._search_tokens(q_tokens, limit)
+
+    def search_ordinals_batch(self, queries:list[str], limit:int) -> list[list[tuple[int, float]]]:
+        """search_ordinals of each query. Queries are tokenized one by one, not with tokenize_many:
+        that is the document path, which a CachedTokenizer does not cache."""
+        with STAGE_SECONDS.time(stage="query_tokenize"):
+            batch_tokens = [self.query_tokenizer.tokenize(query) for query in queries]
+        return [self._search_tokens(q_tokens, limit) for q_tokens in batch_tokens]
+
+    def _search_tokens(self, q_tokens:list[str], limit:int) -> list[tuple[int, float]]:
+        term_ordinals = list({self.term_ordinals[token] for token in q_tokens if token in self.term_ordinals})
+        if not term_ordinals or limit <= 0:
+            return []
+        # highest upper bound first; both evaluators add terms in this order, so scores are bit-identical
+        term_ordinals.sort(key=lambda t: (-self.term_upper_bounds[t], t))
+        if self.dynamic_pruning and len(term_ordinals) > 1 and self.total_document >= self.pruning_min_documents:
+            scores, candidates = self._score_maxscore(term_ordinals, limit)
+        else:
+            scores, candidates = self._score_exhaustive(term_ordinals)
+        return self._top_k(scores, candidates, limit)
+
+    def _score_exhaustive(self, term_ordinals:list[int]) -> tuple[NDArray, NDArray]:
+        """Score every document containing any query term; return (scores, matched doc ordinals)"""
+        scores = np.zeros(self.total_document, dtype=np.float64)
+        for term_ordinal in term_ordinals:
+            start, end = self.index.indptr[term_ordinal], self.index.indptr[term_ordinal + 1]
+            scores[self.index.doc_ordinals[start:end]] += self.posting_scores[start:end]
+        return scores, np.flatnonzero(scores)
+
+    def _score_maxscore(self, term_ordinals:list[int], limit:int) -> tuple[NDArray, NDArray]:
+        """MaxScore evaluation over terms sorted by descending upper bound.
+        Return (scores, candidate doc ordinals); every document of the exact top-k is a candidate with its full score."""
+        indptr, doc_ordinals, posting_scores = self.index.indptr, self.index.doc_ordinals, self.posting_scores
+        bounds = self.term_upper_bounds[term_ordinals]
+        # remaining[i]: best score a document can still gain from terms i, i+1, ...
+        remaining = np.cumsum(bounds[::-1])[::-1] * (1 + 1e-9) # slack for float rounding
+        scores = np.zeros(self.total_document, dtype=np.float64)
+        candidates = None # sorted doc ordinals, set once new documents stop being admitted
+        threshold = 0.0 # lower bound of the final k-th best score
+        for i, term_ordinal in enumerate(term_ordinals):
+            start, end = indptr[term_ordinal], indptr[term_ordinal + 1]
+            docs, term_scores = doc_ordinals[start:end], posting_scores[start:end]
+            if candidates is None and remaining[i] < threshold:
+                # documents not seen so far can gain at most remaining[i]: they can no longer make the top-k
+                candidates = np.flatnonzero(scores)
+            if candidates is None:
+                scores[docs] += term_scores
+                # partial scores of this term's documents already give a valid threshold
+                matched = scores[docs]
+            else:
+                # drop candidates that cannot reach the threshold even with every remaining term
+                candidates = candidates[scores[candidates] + remaining[i] >= threshold]
+                if not len(candidates):
+                    break
+                # look up only the candidates in this posting list instead of scanning it
+                pos = np.searchsorted(docs, candidates)
+                found = pos < len(docs)
+                found[found] = docs[pos[found]] == candidates[found]
+                scores[candidates[found]] += term_scores[pos[found]]
+                matched = scores[candidates]
+            if len(matched) >= limit:
+                threshold = max(threshold, np.partition(matched, len(matched) - limit)[len(matched) - limit])
+        if candidates is None:
+            candidates = np.flatnonzero(scores)
+        return scores, candidates
+
+    def _top_k(self, scores:NDArray, candidates:NDArray, limit:int) -> list[tuple[int, float]]:
+        top = candidates[top_k_indices(scores[candidates], limit)]
+        return [(doc_ordinal, float(scores[doc_ordinal])) for doc_ordinal in top.tolist()]
 
     def retrieve_by_id(self, id:str) -> Document:
-        return self.docmap[id]
+        return self.index.documents[self.doc_ordinals[id]]
 
-    def get_documents(self, term:str) -> list[str]: 
+    def get_documents(self, term:str) -> list[str]:
         """Get doc_id list associated with input term"""
-        doc_ids = list(self.index.get(term.lower(), set()))
-        doc_ids.sort()
-        return doc_ids
-    
-    def __add_document(self, doc_id:str, text:str):
-        tokens = self.tokenizer.tokenize(text)
-        # update inverted index and term frequencies
-        for token in tokens: 
-            self.index[token].add(doc_id)
-            self.term_frequency[doc_id][token] += 1
-        # update doc_lengths
-        self.doc_lengths[doc_id] = len(tokens)
-
-    def __get_avg_doc_length(self) -> float:
-        if self.total_document == 0:
-            return 0.0
-        return sum(self.doc_lengths.values()) / self.total_document
-
+        term_ordinal = self.term_ordinals.get(term.lower())
+        if term_ordinal is None:
+            return []
+        doc_ordinals, _ = self.index.postings(term_ordinal)
+        return sorted(self.index.documents[i].id for i in doc_ordinals.tolist())
 
     def _process_single_token_input(self, term:str) -> str:
         q_tokens = self.tokenizer.tokenize(term)
@@ -79,66 +210,74 @@ class BM25KeywordStore(KeywordStoreInterface):
             raise Exception(f"Expect single token but got {len(q_tokens)}: {q_tokens}")
         q_token = q_tokens[0]
         return q_token
-    
+
+    def _document_frequency(self, term_token:str) -> int:
+        term_ordinal = self.term_ordinals.get(term_token)
+        if term_ordinal is None:
+            return 0
+        return int(self.index.indptr[term_ordinal + 1] - self.index.indptr[term_ordinal])
+
+    def _term_frequency(self, doc_id:str, term_token:str) -> int:
+        term_ordinal = self.term_ordinals.get(term_token)
+        if term_ordinal is None:
+            return 0
+        doc_ordinals, tfs = self.index.postings(term_ordinal)
+        pos = np.searchsorted(doc_ordinals, self.doc_ordinals[doc_id])
+        if pos < len(doc_ordinals) and doc_ordinals[pos] == self.doc_ordinals[doc_id]:
+            return int(tfs[pos])
+        return 0
+
     # -- tf-idf --
     def get_tf(self, doc_id:str, term:str) -> int:
         term_token = self._process_single_token_input(term)
-        return self.term_frequency[doc_id][term_token]
-    
+        return self._term_frequency(doc_id, term_token)
+
     def get_idf(self, term:str) -> float:
         term_token = self._process_single_token_input(term)
         doc_count = self.total_document
-        # print("doc_count",doc_count )
-        term_doc_count = len(self.index[term_token])
-        # print("term_doc_count", len(self.index[term_token]))
+        term_doc_count = self._document_frequency(term_token)
         return math.log( (doc_count+1) / (term_doc_count+1) )
-    
+
     def get_tf_idf(self, doc_id:str, term:str) -> float:
         term_token = self._process_single_token_input(term)
-        tf = self.get_tf(doc_id, term_token) 
+        tf = self.get_tf(doc_id, term_token)
         idf = self.get_idf(term_token)
-        # print(f'-- tf:{tf} / idf:{idf}')
         return tf * idf
-    
+
     # -- bm25 --
     def get_bm25_tf(self, doc_id:str, term:str, k1:float = BM25_K1, b:float = BM25_B) -> float:
         term_token = self._process_single_token_input(term)
-        tf = self.get_tf(doc_id, term_token)
-        length_norm = 1 - b + b * (self.doc_lengths[doc_id] / self.__get_avg_doc_length() )
-        return (tf * (k1 + 1)) / (tf + k1 * length_norm) 
+        tf = self._term_frequency(doc_id, term_token)
+        doc_length = int(self.index.doc_lengths[self.doc_ordinals[doc_id]])
+        length_norm = 1 - b + b * (doc_length / self.avg_doc_length)
+        return (tf * (k1 + 1)) / (tf + k1 * length_norm)
 
     def get_bm25_idf(self, term:str) -> float:
         term_token = self._process_single_token_input(term)
+        term_ordinal = self.term_ordinals.get(term_token)
+        if term_ordinal is not None:
+            return float(self.idf[term_ordinal])
         doc_count = self.total_document
-        term_doc_count = len(self.index[term_token])
-        return math.log( (doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
-    
+        return math.log( (doc_count + 0.5) / 0.5 + 1)
+
     def bm25(self, doc_id:str, term:str, k1:float = BM25_K1, b:float = BM25_B):
         term_token = self._process_single_token_input(term)
         return self.get_bm25_tf(doc_id, term_token, k1, b) * self.get_bm25_idf(term_token)
 
     # -- file I/O
-    def save_index(self):
-        os.makedirs(FILE_CACHE_DIR, exist_ok=True)
-        with open(self.index_path, 'wb') as f:
-            pickle.dump(self.index, f)
-        with open(self.docmap_path, 'wb') as f:
-            pickle.dump(self.docmap, f)
-        with open(self.term_frequency_path, 'wb') as f:
-            pickle.dump(self.term_frequency, f)
-        with open(self.doc_lengths_path, 'wb') as f:
-            pickle.dump(self.doc_lengths, f)
-
-    
-    def load_index(self):
-        with open(self.index_path, 'rb') as f:
-            self.index = pickle.load(f)
-        with open(self.docmap_path, 'rb') as f:
-            self.docmap = pickle.load(f)
-        with open(self.term_frequency_path, 'rb') as f:
-            self.term_frequency = pickle.load(f)
-        with open(self.doc_lengths_path, 'rb') as f:
-            self.doc_lengths = pickle.load(f)
-
-
+    def save_index(self, fingerprint:str|None = None):
+        """Write the columnar index format (see bm25_index.py)"""
+        os.makedirs(self.base_path, exist_ok=True)
+        self.index.save(self.index_path, fingerprint)
+        logger.info(f"BM25KeywordStore saved {self.total_document} documents, {len(self.index.vocabulary)} terms to {self.index_path}")
 
+    def load_index(self, fingerprint:str|None = None) -> bool:
+        """Map a saved index without retokenizing. Return False (store untouched) if missing or stale."""
+        if not os.path.exists(self.index_path):
+            return False
+        if fingerprint is not None and BM25Index.read_header(self.index_path).get('fingerprint') != fingerprint:
+            return False
+        index, _ = BM25Index.load(self.index_path)
+        self._set_index(index)
+        logger.info(f"BM25KeywordStore loaded {self.total_document} documents from {self.index_path}")
+        return True
@@ -1,11 +1,13 @@
 
+import os
+import json
 import logging
 from pathlib import Path
 import numpy as np
 from numpy.typing import NDArray
 
 from app.infrastructure.repositories.vector_store_interface import VectorStoreInterface
-from app.core.config import FILE_CACHE_DIR
+from app.core.config import FILE_CACHE_DIR, VECTOR_PRECISION, VECTOR_RESCORE_FACTOR
 from app.domain.models import Document, SearchResult
 
 logger = logging.getLogger(__name__)
@@ -13,50 +15,353 @@ logger = logging.getLogger(__name__)
 # Expect future extension to use vector DB through VectorStoreInterface
 # Here a simple file-based vector store is enough for current purpose
 
-def cosine_similarity(vec1, vec2):
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+def normalize(vectors:NDArray) -> NDArray:
+    """L2-normalize vectors (1-D or row-wise 2-D) as float32. Zero vectors stay zero."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k_indices(scores:NDArray, k:int) -> NDArray:
+    """Indices of the k largest scores, best first; equal scores keep index order"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k] # k-th largest value
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, ties]))
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def quantize(matrix:NDArray, precision:str) -> tuple[NDArray, NDArray|None]:
+    """Compressed copy of a (n, dim) float32 matrix and, for int8, the per-row scales"""
+    if precision == "float16":
+        return matrix.astype(np.float16), None
+    if precision == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127 if len(matrix) else np.empty(0, dtype=np.float32)
+        scales = scales.astype(np.float32)
+        safe = np.where(scales > 0, scales, 1)
+        return np.rint(matrix / safe[:, None]).astype(np.int8), scales
+    raise ValueError(f"Unsupported vector precision: {precision}")
 
 class FileVectorStore(VectorStoreInterface):
-    """json document + numpy vector"""
-    def __init__(self, base_path:str = FILE_CACHE_DIR):
+    """json document + numpy vector
+
+    Embeddings are kept pre-normalized in one contiguous float32 matrix (row i <-> ids[i]),
+    so cosine similarity against all documents is a single matrix-vector product.
+
+    With precision "float16" or "int8" (per-row scale), searches scan a compressed copy of the
+    matrix and rescore a shortlist of rescore_factor * limit rows with the exact float32 vectors.
+    After a save the float32 matrix is re-mapped from disk, so only the shortlisted rows are paged in.
+
+    Persisted layout under base_path:
+        vector_index.json           format version, fingerprint, dim, ids (row offset = list position), file names
+        vectors-<fingerprint>.npy   (n, dim) float32 matrix, loaded with mmap_mode='r'
+        vector_docs-<fingerprint>.jsonl   one Document per line, in row order
+        vectors_<precision>-<fingerprint>.npz   compressed matrix (+ int8 scales), if precision is not float32
+    vector_index.json is replaced last, so a reader always sees a consistent set of files.
+    """
+    _INITIAL_CAPACITY = 64
+    _FILE_PATTERNS = ['vectors-*.npy', 'vector_docs-*.jsonl', 'vectors_*-*.npz'] # versioned data files, removed once superseded
+    _SCORE_CHUNK = 16384 # rows of a compressed matrix converted to float32 at a time
+    _BATCH_SCORE_CELLS = 1 << 24 # query x row scores held at once by search_batch (64 MB of float32)
+    FORMAT_VERSION = 1
+
+    def __init__(self, base_path:str = FILE_CACHE_DIR, precision:str = VECTOR_PRECISION, rescore_factor:int = VECTOR_RESCORE_FACTOR):
+        """precision: "float32" (exact), "float16" or "int8" (compressed search + float32 rescoring)"""
+        if precision not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector precision: {precision}")
         self.base_path = Path(base_path)
-        self.doc_map = dict() # id->doc
-        self.embedding_map = dict() # id->vector
-    
+        self.precision = precision
+        self.rescore_factor = rescore_factor
+        self.doc_map:dict[str,Document] = dict() # id->doc
+        self.ids:list[str] = [] # row -> id
+        self.id_to_row:dict[str,int] = dict() # id -> row
+        self._matrix:NDArray|None = None # (capacity, dim) float32, first len(ids) rows in use
+        self._quantized:tuple[NDArray, NDArray|None]|None = None # compressed matrix + scales; None when stale
+
+    @property
+    def matrix(self) -> NDArray:
+        """Normalized embeddings of indexed documents, shape (n, dim)"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:len(self.ids)]
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes of vectors kept in memory for search: the float32 matrix, or with a compressed precision
+        the compressed matrix and scales, plus the float32 matrix only while it is not memory-mapped"""
+        if self.precision == "float32":
+            return self.matrix.nbytes
+        quantized_bytes = 0 if self._quantized is None else sum(a.nbytes for a in self._quantized if a is not None)
+        return quantized_bytes + (0 if isinstance(self._matrix, np.memmap) else self.matrix.nbytes)
+
+    def _reserve(self, dim:int, extra:int):
+        """Make room for `extra` more rows, growing the buffer geometrically"""
+        if self._matrix is None:
+            capacity = max(self._INITIAL_CAPACITY, extra)
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+            return
+        if self._matrix.shape[1] != dim:
+            raise ValueError(f"Vector dim mismatch: store has {self._matrix.shape[1]}, got {dim}")
+        required = len(self.ids) + extra
+        if required > self._matrix.shape[0] or not self._matrix.flags.writeable:
+            # also copies a read-only (memory-mapped or shared) matrix out before the first write
+            capacity = max(required, 2 * self._matrix.shape[0])
+            grown = np.zeros((capacity, dim), dtype=np.float32)
+            grown[:len(self.ids)] = self._matrix[:len(self.ids)]
+            self._matrix = grown
+
     def add(self, id:str, vector:NDArray, doc:Document) -> str:
         """return ID"""
+        vector = normalize(vector)
         self.doc_map[id] = doc
-        self.embedding_map[id] = vector
+        self._quantized = None
+        if id in self.id_to_row: # overwrite existing entry
+            self._reserve(vector.shape[0], 0)
+            self._matrix[self.id_to_row[id]] = vector
+            return id
+        self._reserve(vector.shape[0], 1)
+        row = len(self.ids)
+        self._matrix[row] = vector
+        self.ids.append(id)
+        self.id_to_row[id] = row
         return id
 
+    def add_batch(self, ids:list[str], vectors:NDArray, docs:list[Document]) -> list[str]:
+        """Bulk add: normalize and copy the whole block into the matrix at once"""
+        if len(ids) != len(vectors) or len(ids) != len(docs):
+            raise ValueError(f"Length mismatch: {len(ids)} ids, {len(vectors)} vectors, {len(docs)} docs")
+        if len(set(ids)) != len(ids) or any(id in self.id_to_row for id in ids):
+            # rare path: overwrites need per-row handling
+            return super().add_batch(ids, vectors, docs)
+        if not ids:
+            return []
+        vectors = normalize(vectors)
+        self._quantized = None
+        self._reserve(vectors.shape[1], len(ids))
+        start = len(self.ids)
+        self._matrix[start:start + len(ids)] = vectors
+        for offset, (id, doc) in enumerate(zip(ids, docs)):
+            self.doc_map[id] = doc
+            self.id_to_row[id] = start + offset
+        self.ids.extend(ids)
+        return list(ids)
+
+    def update(self, id:str, vector:NDArray, doc:Document) -> str:
+        if id not in self.id_to_row:
+            raise KeyError(id)
+        return self.add(id, vector, doc)
+
+    def delete(self, id:str) -> None:
+        """Swap-remove: the last row moves into the freed row, keeping the matrix contiguous"""
+        row = self.id_to_row.pop(id)
+        del self.doc_map[id]
+        self._quantized = None
+        last = len(self.ids) - 1
+        if row != last:
+            self._reserve(self._matrix.shape[1], 0)
+            moved_id = self.ids[last]
+            self._matrix[row] = self._matrix[last]
+            self.ids[row] = moved_id
+            self.id_to_row[moved_id] = row
+        self.ids.pop()
+
+    def clear(self) -> None:
+        self.doc_map = dict()
+        self.ids = []
+        self.id_to_row = dict()
+        self._matrix = None
+        self._quantized = None
+
+    def _new_empty(self) -> "FileVectorStore":
+        """Empty store with the same settings (used by copy)"""
+        return FileVectorStore(str(self.base_path), self.precision, self.rescore_factor)
+
+    def copy(self) -> "FileVectorStore":
+        """Copy-on-write: both stores share the matrix read-only, and the first write on either side copies it out"""
+        clone = self._new_empty()
+        clone.doc_map = dict(self.doc_map)
+        clone.ids = list(self.ids)
+        clone.id_to_row = dict(self.id_to_row)
+        if self._matrix is not None:
+            self._matrix.flags.writeable = False
+            clone._matrix = self._matrix
+        clone._quantized = self._quantized # replaced, never modified in place
+        return clone
+
+    def refresh(self) -> None:
+        """Compress the matrix now for compressed precisions, instead of on the first search"""
+        if self.precision != "float32" and self.ids:
+            self._ensure_quantized()
+
     def search(self, query_vector:NDArray, limit:int) -> list[SearchResult]:
         logger.debug(f'FileVectorStore search called with query vector dim: {query_vector.shape} and limit: {limit}')
-        score_list = []
-        for id, doc_vector in self.embedding_map.items():
-            score = cosine_similarity(query_vector, doc_vector)
-            score_list.append((id, score))
-        score_list.sort(key=lambda x: x[1], reverse=True)
+        if not self.ids:
+            return []
+        return self._search_rows(None, normalize(query_vector), limit)
+
+    def search_batch(self, query_vectors:NDArray, limit:int) -> list[list[SearchResult]]:
+        """Score groups of queries against the matrix with one matrix-matrix product each,
+        instead of one matrix-vector product (one pass over the matrix) per query"""
+        queries = normalize(query_vectors)
+        if not self.ids:
+            return [[] for _ in range(len(queries))]
+        results = []
+        group_size = max(1, self._BATCH_SCORE_CELLS // len(self.ids))
+        for start in range(0, len(queries), group_size):
+            group = queries[start:start + group_size]
+            if self.precision == "float32":
+                all_rows = np.arange(len(self.ids))
+                results.extend(self._to_results(all_rows, scores, limit) for scores in group @ self.matrix.T)
+                continue
+            approx = self._approximate_scores(None, group.T) # (n, len(group))
+            for query, query_approx in zip(group, approx.T):
+                shortlist = np.sort(top_k_indices(query_approx, limit * self.rescore_factor))
+                results.append(self._to_results(shortlist, self.matrix[shortlist] @ query, limit))
+        return results
+
+    def _search_rows(self, rows:NDArray|None, query:NDArray, limit:int) -> list[SearchResult]:
+        """Top `limit` among `rows` (None: all rows) for a normalized query.
+        Compressed precisions score approximately, then rescore a shortlist with float32."""
+        if self.precision == "float32":
+            if rows is None:
+                return self._to_results(np.arange(len(self.ids)), self.matrix @ query, limit)
+            return self._to_results(rows, self.matrix[rows] @ query, limit)
+        approx = self._approximate_scores(rows, query)
+        shortlist = top_k_indices(approx, limit * self.rescore_factor)
+        if rows is not None:
+            shortlist = rows[shortlist]
+        shortlist = np.sort(shortlist) # sequential reads from the float32 matrix
+        return self._to_results(shortlist, self.matrix[shortlist] @ query, limit)
+
+    def _ensure_quantized(self) -> tuple[NDArray, NDArray|None]:
+        quantized = self._quantized
+        if quantized is None:
+            quantized = quantize(self.matrix, self.precision)
+            self._quantized = quantized
+        return quantized
+
+    def _approximate_scores(self, rows:NDArray|None, query:NDArray) -> NDArray:
+        """Scores of the compressed rows for a (dim,) query, or (rows, q) scores for a (dim, q) block of queries"""
+        compressed, scales = self._ensure_quantized()
+        if rows is not None:
+            compressed = compressed[rows]
+            scales = None if scales is None else scales[rows]
+        scores = np.empty((len(compressed), *query.shape[1:]), dtype=np.float32)
+        for start in range(0, len(compressed), self._SCORE_CHUNK):
+            block = compressed[start:start + self._SCORE_CHUNK]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores if scales is None else (scores.T * scales).T
+
+    def _to_results(self, rows:NDArray, scores:NDArray, limit:int) -> list[SearchResult]:
+        """Top `limit` of candidate rows with their scores (aligned arrays)"""
         res = []
-        for i, (id, score) in enumerate(score_list[:limit]):
+        for i, pos in enumerate(top_k_indices(scores, limit)):
             rank = i + 1
-            doc = self.doc_map[id]
-            res.append(SearchResult(document=doc, score=score, rank=rank))
-        logger.debug(f'FileVectorStore search returning {len(res)} results')
-        return res 
+            doc = self.doc_map[self.ids[rows[pos]]]
+            res.append(SearchResult(document=doc, score=float(scores[pos]), rank=rank))
+        logger.debug(f'{type(self).__name__} search returning {len(res)} results')
+        return res
 
     def __len__(self) -> int:
         return len(self.doc_map)
 
     def retrieve_by_id(self, id) -> Document:
-        raise
+        return self.doc_map[id]
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.base_path.joinpath('vector_index.json')
+
+    def load_index(self, fingerprint:str|None = None) -> bool:
+        """Load the persisted index; the matrix is memory-mapped read-only and shared through the page cache.
+        Return False (store untouched) if nothing is persisted or its fingerprint differs."""
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return False
+        if manifest.get('version') != self.FORMAT_VERSION:
+            logger.info(f"Ignoring vector index with format version {manifest.get('version')}")
+            return False
+        if fingerprint is not None and manifest.get('fingerprint') != fingerprint:
+            return False
+        ids:list[str] = manifest['ids']
+        matrix = np.load(self.base_path.joinpath(manifest['vectors_file']), mmap_mode='r')
+        with open(self.base_path.joinpath(manifest['documents_file']), 'r') as f:
+            docs = [Document.model_validate_json(line) for line in f if line.strip()]
+        if not (len(ids) == len(docs) == matrix.shape[0]):
+            raise ValueError(f"Corrupt vector index at {self.base_path}: {len(ids)} ids, {len(docs)} docs, {matrix.shape[0]} vectors")
+
+        self._matrix = matrix
+        self.ids = ids
+        self.id_to_row = {id:row for row, id in enumerate(ids)}
+        self.doc_map = {id:doc for id, doc in zip(ids, docs)}
+        self._quantized = None # recomputed on first search unless persisted below
+        if self.precision != "float32" and manifest.get('precision') == self.precision:
+            with np.load(self.base_path.joinpath(manifest['quantized_file'])) as data:
+                self._quantized = (data['vectors'], data['scales'] if 'scales' in data else None)
+        self._load_extra(manifest)
+        logger.info(f"{type(self).__name__} loaded {len(ids)} vectors from {self.base_path}")
+        return True
+
+    def save_index(self, fingerprint:str|None = None):
+        """Persist matrix, id table and document sidecar. `fingerprint` identifies the source documents."""
+        os.makedirs(self.base_path, exist_ok=True)
+        tag = (fingerprint or 'none')[:16]
+        vectors_file = f'vectors-{tag}.npy'
+        documents_file = f'vector_docs-{tag}.jsonl'
+        matrix = self.matrix
+        def replace_atomically(name:str, write):
+            tmp_path = self.base_path.joinpath(f'{name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, self.base_path.joinpath(name))
+
+        replace_atomically(vectors_file, lambda f: np.save(f, np.ascontiguousarray(matrix)))
+        replace_atomically(documents_file, lambda f: f.writelines(
+            self.doc_map[id].model_dump_json().encode('utf-8') + b'\n' for id in self.ids))
+        manifest = {
+            'version': self.FORMAT_VERSION,
+            'fingerprint': fingerprint,
+            'dim': int(matrix.shape[1]) if matrix.size else 0,
+            'vectors_file': vectors_file,
+            'documents_file': documents_file,
+            'ids': self.ids,
+            **self._save_quantized(tag, replace_atomically),
+            **self._save_extra(tag, replace_atomically),
+        }
+        replace_atomically(self.manifest_path.name, lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+        # drop files of previous versions; processes that still map them keep their open copy
+        current = {name for name in manifest.values() if isinstance(name, str)}
+        for pattern in self._FILE_PATTERNS:
+            for path in self.base_path.glob(pattern):
+                if path.name not in current:
+                    path.unlink(missing_ok=True)
+        if self.precision != "float32" and len(self.ids):
+            # keep only the compressed matrix resident; float32 rows are paged in for rescoring
+            self._matrix = np.load(self.base_path.joinpath(vectors_file), mmap_mode='r')
+        logger.info(f"{type(self).__name__} saved {len(self.ids)} vectors to {self.base_path}")
+
+    def _save_quantized(self, tag:str, replace_atomically) -> dict:
+        if self.precision == "float32" or not len(self.ids):
+            return {}
+        compressed, scales = self._ensure_quantized()
+        quantized_file = f'vectors_{self.precision}-{tag}.npz'
+        arrays = {'vectors': compressed} if scales is None else {'vectors': compressed, 'scales': scales}
+        replace_atomically(quantized_file, lambda f: np.savez(f, **arrays))
+        return {'quantized_file': quantized_file, 'precision': self.precision}
 
-    def load_index(self):
-        raise
+    # -- extension points for subclasses that persist extra structures next to the matrix
+    def _save_extra(self, tag:str, replace_atomically) -> dict:
+        """Write extra files with replace_atomically(name, write); return manifest entries naming them"""
+        return {}
 
-    def save_index(self):
-        raise
+    def _load_extra(self, manifest:dict):
+        """Restore extra structures after the matrix, ids and documents are loaded"""
+        pass
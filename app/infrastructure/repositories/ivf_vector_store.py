@@ -0,0 +1,211 @@
+import math
+import logging
+import threading
+import numpy as np
+from numpy.typing import NDArray
+
+from app.infrastructure.repositories.file_vector_store import FileVectorStore, normalize, top_k_indices
+from app.domain.models import Document, SearchResult
+from app.core.config import FILE_CACHE_DIR, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE, VECTOR_PRECISION, VECTOR_RESCORE_FACTOR
+
+logger = logging.getLogger(__name__)
+
+class IVFFlatVectorStore(FileVectorStore):
+    """Approximate nearest neighbours with an inverted file (IVF-Flat) over FileVectorStore's matrix.
+
+    Vectors are clustered with spherical k-means into `nlist` lists; a query scores the centroids,
+    then only the rows of the `nprobe` closest lists. Larger nprobe: higher recall, slower search.
+
+    Adds/deletes only keep the row -> list assignment aligned (new rows unassigned). `refresh`,
+    called by the retriever at the end of a build or sync, assigns new rows, rebuilds the lists,
+    and retrains once the store has doubled since training; a search or save does so too if
+    writes came after it. Below min_train_size vectors search stays exact (brute force).
+
+    Persisted next to the matrix as vector_ivf-<fingerprint>.npz (centroids + assignments).
+    """
+    _FILE_PATTERNS = FileVectorStore._FILE_PATTERNS + ['vector_ivf-*.npz']
+    _TRAIN_POINTS_PER_LIST = 40
+    _TRAIN_ITERATIONS = 10
+    _CHUNK = 8192 # rows per block when assigning to centroids
+
+    def __init__(
+            self,
+            base_path:str = FILE_CACHE_DIR,
+            nlist:int = IVF_NLIST,
+            nprobe:int = IVF_NPROBE,
+            min_train_size:int = IVF_MIN_TRAIN_SIZE,
+            seed:int = 0,
+            precision:str = VECTOR_PRECISION,
+            rescore_factor:int = VECTOR_RESCORE_FACTOR):
+        """nlist: number of lists, 0 picks sqrt(n) at training time"""
+        super().__init__(base_path, precision, rescore_factor)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.centroids:NDArray|None = None # (nlist, dim) normalized
+        self.trained_size = 0 # number of vectors at the last training
+        self._assignments = np.empty(0, dtype=np.int32) # row -> list, -1 if not assigned yet
+        self._lists:tuple[NDArray, NDArray]|None = None # CSR (indptr, rows) by list; None when stale
+        self._index_lock = threading.Lock()
+
+    def _new_empty(self) -> "IVFFlatVectorStore":
+        return IVFFlatVectorStore(
+            str(self.base_path), self.nlist, self.nprobe, self.min_train_size, self.seed, self.precision, self.rescore_factor)
+
+    # -- keep assignments aligned with rows
+    def _aligned_assignments(self) -> NDArray:
+        """Row -> list for every row. Rows added since the last call are appended as unassigned (-1)
+        here in one step, instead of growing the array on every add."""
+        missing = len(self.ids) - len(self._assignments)
+        if missing > 0:
+            self._assignments = np.concatenate([self._assignments, np.full(missing, -1, dtype=np.int32)])
+        return self._assignments
+
+    def add(self, id:str, vector:NDArray, doc:Document) -> str:
+        row = self.id_to_row.get(id)
+        super().add(id, vector, doc)
+        if row is not None and row < len(self._assignments):
+            self._assignments[row] = -1 # overwritten: reassigned on the next refresh
+        self._lists = None
+        return id
+
+    def add_batch(self, ids:list[str], vectors:NDArray, docs:list[Document]) -> list[str]:
+        result = super().add_batch(ids, vectors, docs)
+        self._lists = None
+        return result
+
+    def delete(self, id:str) -> None:
+        row = self.id_to_row[id]
+        last = len(self.ids) - 1
+        assignments = self._aligned_assignments().copy()
+        super().delete(id)
+        assignments[row] = assignments[last] # mirrors the swap-remove of the matrix
+        self._assignments = assignments[:last]
+        self._lists = None
+
+    def clear(self) -> None:
+        super().clear()
+        self.centroids = None
+        self.trained_size = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    def copy(self) -> "IVFFlatVectorStore":
+        clone = super().copy()
+        clone.centroids = self.centroids # replaced, never modified in place
+        clone.trained_size = self.trained_size
+        clone._assignments = self._assignments.copy()
+        clone._lists = self._lists
+        return clone
+
+    # -- training and list maintenance
+    def _nearest_centroid(self, vectors:NDArray, centroids:NDArray) -> NDArray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self._CHUNK):
+            block = np.asarray(vectors[start:start + self._CHUNK])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def _train(self):
+        """Spherical k-means on a sample of the matrix, then assign every row"""
+        matrix = self.matrix
+        n = len(matrix)
+        nlist = min(self.nlist or max(1, round(math.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, nlist * self._TRAIN_POINTS_PER_LIST)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, size=sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self._TRAIN_ITERATIONS):
+            assignments = self._nearest_centroid(sample, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            nonempty = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[nonempty] = normalize(sums)
+            # reseed empty lists with random sample points
+            empty = np.flatnonzero(~nonempty)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+        self.centroids = centroids
+        self._assignments = self._nearest_centroid(matrix, centroids)
+        self.trained_size = n
+        logger.info(f"IVFFlatVectorStore trained {nlist} lists on {sample_size} of {n} vectors")
+
+    def _ensure_index(self):
+        """Bring centroids, assignments and lists up to date with the matrix"""
+        if self._lists is not None or len(self.ids) < self.min_train_size:
+            return
+        with self._index_lock:
+            if self._lists is not None:
+                return
+            n = len(self.ids)
+            if self.centroids is None or n >= 2 * self.trained_size or self.centroids.shape[1] != self.matrix.shape[1]:
+                self._train()
+            else:
+                unassigned = np.flatnonzero(self._aligned_assignments() < 0)
+                if len(unassigned):
+                    assignments = self._assignments.copy()
+                    assignments[unassigned] = self._nearest_centroid(self.matrix[unassigned], self.centroids)
+                    self._assignments = assignments
+            nlist = len(self.centroids)
+            indptr = np.zeros(nlist + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self._assignments, minlength=nlist), out=indptr[1:])
+            self._lists = (indptr, np.argsort(self._assignments, kind="stable"))
+
+    def refresh(self) -> None:
+        """Train or update the lists now, so the first search after a build or sync does not"""
+        super().refresh()
+        self._ensure_index()
+
+    def search(self, query_vector:NDArray, limit:int) -> list[SearchResult]:
+        self._ensure_index()
+        lists = self._lists
+        if lists is None or len(self.ids) < self.min_train_size: # too small to need an index
+            return super().search(query_vector, limit)
+        query = normalize(query_vector)
+        return self._search_lists(lists, query, self.centroids @ query, limit)
+
+    def search_batch(self, query_vectors:NDArray, limit:int) -> list[list[SearchResult]]:
+        """Probe lists of all queries from one query x centroid product; each query then scans its own lists"""
+        self._ensure_index()
+        lists = self._lists
+        if lists is None or len(self.ids) < self.min_train_size:
+            return super().search_batch(query_vectors, limit)
+        queries = normalize(query_vectors)
+        return [
+            self._search_lists(lists, query, centroid_scores, limit)
+            for query, centroid_scores in zip(queries, queries @ self.centroids.T)]
+
+    def _search_lists(self, lists:tuple[NDArray, NDArray], query:NDArray, centroid_scores:NDArray, limit:int) -> list[SearchResult]:
+        indptr, rows = lists
+        probes = top_k_indices(centroid_scores, self.nprobe)
+        candidates = np.concatenate([rows[indptr[c]:indptr[c + 1]] for c in probes])
+        if not len(candidates):
+            return []
+        candidates.sort() # sequential reads from the matrix
+        return self._search_rows(candidates, query, limit)
+
+    # -- persistence
+    def _save_extra(self, tag:str, replace_atomically) -> dict:
+        self._ensure_index()
+        if self.centroids is None:
+            return {}
+        ivf_file = f'vector_ivf-{tag}.npz'
+        replace_atomically(ivf_file, lambda f: np.savez(
+            f, centroids=self.centroids, assignments=self._aligned_assignments(), trained_size=np.int64(self.trained_size)))
+        return {'ivf_file': ivf_file}
+
+    def _load_extra(self, manifest:dict):
+        self.centroids, self.trained_size, self._lists = None, 0, None
+        self._assignments = np.full(len(self.ids), -1, dtype=np.int32)
+        if 'ivf_file' not in manifest:
+            return # saved by the brute-force store: trained on first search
+        with np.load(self.base_path.joinpath(manifest['ivf_file'])) as data:
+            if len(data['assignments']) != len(self.ids) or data['centroids'].shape[1] != self.matrix.shape[1]:
+                logger.warning("Ignoring IVF lists that do not match the vector index; retraining")
+                return
+            self.centroids = data['centroids']
+            self._assignments = data['assignments']
+            self.trained_size = int(data['trained_size'])
@@ -0,0 +1,289 @@
+"""
+Run BM25 keyword search in worker processes, so tokenization and scoring of concurrent
+queries are not serialized by the GIL of the serving process.
+
+Every index version is written once to an immutable file under `<base_path>/keyword_pool/<pid>-<id>/`,
+a directory of this serving process only (uvicorn workers may share base_path), removed at shutdown.
+Workers memory-map that file (BM25Index.load), so all processes share the index pages
+through the page cache; a query only sends (file, query, limit) and receives
+(doc ordinal, score) pairs, which the serving process maps back to its own copy of the index.
+Each published version is warmed up with one search per worker, so no query pays for loading it.
+"""
+import os
+import uuid
+import atexit
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from app.infrastructure.repositories.keyword_store_interface import KeywordStoreInterface
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.bm25_index import BM25Index
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.infrastructure.repositories.tokenizers import CachedTokenizer
+from app.domain.models import Document, SearchResult
+from app.core.config import KEYWORD_PROCESS_POOL_TIMEOUT_S, KEYWORD_PROCESS_POOL_MAX_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+# -- worker process state
+_worker_tokenizer:TokenizerInterface|None = None
+_worker_params:dict = dict()
+_worker_stores:dict[str, BM25KeywordStore] = dict() # index file -> store, the two most recent
+_worker_barrier:threading.Barrier|None = None # one slot per worker, for warm-ups
+
+def _init_worker(tokenizer:TokenizerInterface, params:dict, barrier:threading.Barrier):
+    global _worker_tokenizer, _worker_params, _worker_barrier
+    tokenizer.load() # jieba dictionary and NLTK data, before the first query
+    _worker_tokenizer = CachedTokenizer(tokenizer)
+    _worker_params = params
+    _worker_barrier = barrier
+
+def _worker_store(index_path:str) -> BM25KeywordStore:
+    store = _worker_stores.get(index_path)
+    if store is None:
+        store = BM25KeywordStore(_worker_tokenizer, base_path=os.path.dirname(index_path), **_worker_params)
+        index, _ = BM25Index.load(index_path, verify=False) # written and verified by the serving process
+        store._set_index(index)
+        if len(_worker_stores) >= 2:
+            _worker_stores.pop(next(iter(_worker_stores)))
+        _worker_stores[index_path] = store
+    return store
+
+def _worker_search(index_path:str, query:str, limit:int) -> list[tuple[int, float]]:
+    return _worker_store(index_path).search_ordinals(query, limit)
+
+def _worker_search_batch(index_path:str, queries:list[str], limit:int) -> list[list[tuple[int, float]]]:
+    return _worker_store(index_path).search_ordinals_batch(queries, limit)
+
+def _worker_warm_up(index_path:str, query:str) -> int:
+    """Load an index version and search it once, then wait until every worker has started its warm-up,
+    so each worker runs exactly one"""
+    _worker_search(index_path, query, 1)
+    try:
+        _worker_barrier.wait(timeout=KEYWORD_PROCESS_POOL_TIMEOUT_S)
+    except threading.BrokenBarrierError:
+        pass # a worker is busy with a query; it loads the index on its next one
+    return os.getpid()
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+class KeywordProcessPool:
+    """Process pool with restart on crash or on repeated query timeouts; shared by every ProcessPoolKeywordStore snapshot"""
+    KEEP_INDEX_FILES = 3 # current version plus a few older ones still used by in-flight queries
+
+    def __init__(self, store:BM25KeywordStore, size:int):
+        """Workers tokenize and score like `store` (same tokenizer, k1, b, pruning)"""
+        self.tokenizer = store.tokenizer
+        self.size = size
+        self.store_params = {
+            "k1": store.k1, "b": store.b,
+            "dynamic_pruning": store.dynamic_pruning, "pruning_min_documents": store.pruning_min_documents}
+        pool_root = os.path.join(store.base_path, 'keyword_pool')
+        self._remove_orphaned_dirs(pool_root)
+        self.index_dir = os.path.join(pool_root, f'{os.getpid()}-{uuid.uuid4().hex[:8]}')
+        os.makedirs(self.index_dir)
+        atexit.register(self._remove_index_dir) # also when the lifespan shutdown does not run
+        self._index_files:list[str] = []
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self._timeouts = 0 # consecutive query timeouts
+        self._executor = self._start()
+
+    @staticmethod
+    def _remove_orphaned_dirs(pool_root:str):
+        """Remove index directories left by serving processes that no longer exist"""
+        if not os.path.isdir(pool_root):
+            return
+        for name in os.listdir(pool_root):
+            pid = name.partition('-')[0]
+            if not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue # still running (or a reused pid): leave it
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            shutil.rmtree(os.path.join(pool_root, name), ignore_errors=True)
+
+    def _remove_index_dir(self):
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def _start(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs torch and thread pools is unsafe
+        context = multiprocessing.get_context("spawn")
+        self._barrier = context.Barrier(self.size)
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.tokenizer, self.store_params, self._barrier))
+
+    def restart(self, executor:ProcessPoolExecutor|None = None):
+        """Replace the executor (only if it is still `executor`, so concurrent callers restart once)"""
+        with self._lock:
+            if executor is not None and executor is not self._executor:
+                return
+            old, self._executor = self._executor, self._start()
+            self.restarts += 1
+        old.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"Keyword process pool restarted ({self.restarts} restarts)")
+
+    def publish(self, index:BM25Index) -> str:
+        """Write an index version for the workers; return its file"""
+        path = os.path.join(self.index_dir, f'bm25-{uuid.uuid4().hex}.bin')
+        index.save(path)
+        with self._lock:
+            self._index_files.append(path)
+            stale, self._index_files = self._index_files[:-self.KEEP_INDEX_FILES], self._index_files[-self.KEEP_INDEX_FILES:]
+        for old_path in stale:
+            os.remove(old_path) # workers that mapped it keep their mapping
+        return path
+
+    def warm_up(self, index_path:str, query:str) -> int:
+        """Search a newly published index once in every worker, so each maps it and precomputes its scores
+        before serving queries; return the number of workers warmed up. Failures are logged: queries still
+        load the index on demand."""
+        with self._lock:
+            executor, barrier = self._executor, self._barrier
+        try:
+            barrier.reset() # in case an earlier warm-up timed out and broke it
+            futures = [executor.submit(_worker_warm_up, index_path, query) for _ in range(self.size)]
+            pids = {future.result(timeout=KEYWORD_PROCESS_POOL_TIMEOUT_S * 2) for future in futures}
+        except Exception as e:
+            logger.warning(f"Keyword process pool warm-up failed: {e!r}")
+            return 0
+        logger.info(f"Keyword process pool warmed up {len(pids)} of {self.size} workers")
+        return len(pids)
+
+    def _timed_out(self, executor:ProcessPoolExecutor, futures:list[Future]):
+        """Cancel the futures of a timed-out query (if still queued); after KEYWORD_PROCESS_POOL_MAX_TIMEOUTS
+        in a row the workers are presumed stuck and the pool is restarted"""
+        for future in futures:
+            future.cancel()
+        with self._lock:
+            self._timeouts += 1
+            stuck = self._timeouts >= KEYWORD_PROCESS_POOL_MAX_TIMEOUTS
+            if stuck:
+                self._timeouts = 0
+        if stuck:
+            self.restart(executor)
+
+    def search(self, index_path:str, query:str, limit:int) -> list[tuple[int, float]]:
+        executor = self._executor
+        try:
+            future = executor.submit(_worker_search, index_path, query, limit)
+            hits = future.result(timeout=KEYWORD_PROCESS_POOL_TIMEOUT_S)
+        except FutureTimeoutError:
+            self._timed_out(executor, [future])
+            raise
+        except BrokenProcessPool:
+            self.restart(executor)
+            raise
+        self._timeouts = 0
+        return hits
+
+    def search_batch(self, index_path:str, queries:list[str], limit:int) -> list[list[tuple[int, float]]]:
+        """Split the queries into one contiguous chunk per worker and search the chunks in parallel"""
+        executor = self._executor
+        chunk_size = -(-len(queries) // self.size) # ceil
+        chunks = [queries[start:start + chunk_size] for start in range(0, len(queries), chunk_size)]
+        futures = []
+        try:
+            futures = [executor.submit(_worker_search_batch, index_path, chunk, limit) for chunk in chunks]
+            batch_hits = [hits for future, chunk in zip(futures, chunks)
+                          for hits in future.result(timeout=KEYWORD_PROCESS_POOL_TIMEOUT_S * len(chunk))]
+        except FutureTimeoutError:
+            self._timed_out(executor, futures)
+            raise
+        except BrokenProcessPool:
+            self.restart(executor)
+            raise
+        self._timeouts = 0
+        return batch_hits
+
+    def health_check(self) -> bool:
+        """Ping every worker slot; restart the pool if it is broken or unresponsive"""
+        executor = self._executor
+        try:
+            futures = [executor.submit(_worker_ping) for _ in range(self.size)]
+            for future in futures:
+                future.result(timeout=KEYWORD_PROCESS_POOL_TIMEOUT_S)
+            return True
+        except Exception as e:
+            logger.error(f"Keyword process pool health check failed: {e!r}")
+            self.restart(executor)
+            return False
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._remove_index_dir()
+        atexit.unregister(self._remove_index_dir)
+
+
+class ProcessPoolKeywordStore(KeywordStoreInterface):
+    """Keyword store that builds, updates and persists through a BM25KeywordStore in this process,
+    and runs `search` in a KeywordProcessPool. Falls back to searching in-process if the pool fails."""
+    def __init__(self, store:BM25KeywordStore, pool:KeywordProcessPool, index_path:str|None = None):
+        self.store = store
+        self.pool = pool
+        self.index_path = index_path # pool file of the current index, None until published
+
+    def _publish(self):
+        index = self.store.index
+        self.index_path = self.pool.publish(index)
+        self.pool.warm_up(self.index_path, " ".join(index.vocabulary[:2]))
+
+    def search(self, query:str, limit:int) -> list[SearchResult]:
+        if self.index_path is None or limit <= 0:
+            return self.store.search(query, limit)
+        try:
+            hits = self.pool.search(self.index_path, query, limit)
+        except Exception as e:
+            logger.error(f"Keyword search in process pool failed, searching in-process: {e!r}")
+            return self.store.search(query, limit)
+        documents = self.store.index.documents
+        return [SearchResult(document=documents[ordinal], score=score, rank=i + 1) for i, (ordinal, score) in enumerate(hits)]
+
+    def search_batch(self, queries:list[str], limit:int) -> list[list[SearchResult]]:
+        if self.index_path is None or limit <= 0 or not queries:
+            return self.store.search_batch(queries, limit)
+        try:
+            batch_hits = self.pool.search_batch(self.index_path, queries, limit)
+        except Exception as e:
+            logger.error(f"Batch keyword search in process pool failed, searching in-process: {e!r}")
+            return self.store.search_batch(queries, limit)
+        documents = self.store.index.documents
+        return [
+            [SearchResult(document=documents[ordinal], score=score, rank=i + 1) for i, (ordinal, score) in enumerate(hits)]
+            for hits in batch_hits]
+
+    def retrieve_by_id(self, id) -> Document:
+        return self.store.retrieve_by_id(id)
+
+    def build_index(self, documents:list[Document]):
+        self.store.build_index(documents)
+        self._publish()
+
+    def update_index(self, upserts:list[Document], delete_ids:list[str]):
+        self.store.update_index(upserts, delete_ids)
+        self._publish()
+
+    def copy(self) -> "ProcessPoolKeywordStore":
+        return ProcessPoolKeywordStore(self.store.copy(), self.pool, self.index_path)
+
+    def save_index(self, fingerprint:str|None = None):
+        self.store.save_index(fingerprint)
+
+    def load_index(self, fingerprint:str|None = None) -> bool:
+        loaded = self.store.load_index(fingerprint)
+        if loaded:
+            self._publish()
+        return loaded
@@ -13,6 +13,10 @@ class KeywordStoreInterface(ABC):
     def search(self, query:str, limit:int) -> list[SearchResult]:
         raise NotImplementedError
 
+    def search_batch(self, queries:list[str], limit:int) -> list[list[SearchResult]]:
+        """Top `limit` for each query. Override to tokenize or score the queries together."""
+        return [self.search(query, limit) for query in queries]
+
     @abstractmethod
     def retrieve_by_id(self, id) -> Document:
         raise NotImplementedError
@@ -20,13 +24,25 @@ class KeywordStoreInterface(ABC):
     @abstractmethod
     def build_index(self, documents:list[Document]):
         raise NotImplementedError
+
+    @abstractmethod
+    def update_index(self, upserts:list[Document], delete_ids:list[str]):
+        """Add or replace `upserts` and remove `delete_ids` without rebuilding unchanged documents"""
+        raise NotImplementedError
     
+    @abstractmethod
+    def copy(self) -> "KeywordStoreInterface":
+        """Independent store with the same index; building or updating either one does not affect the other"""
+        raise NotImplementedError
+
     # persistent methods
     @abstractmethod
-    def save_index(self):
+    def save_index(self, fingerprint:str|None = None):
+        """Persist the index, tagged with the fingerprint of the documents it was built from"""
         raise NotImplementedError
     
     @abstractmethod
-    def load_index(self):
+    def load_index(self, fingerprint:str|None = None) -> bool:
+        """Load the persisted index if it exists (and matches fingerprint, if given); return whether it was loaded"""
         raise NotImplementedError
 
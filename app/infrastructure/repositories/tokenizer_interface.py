@@ -4,3 +4,11 @@ class TokenizerInterface(ABC):
     @abstractmethod
     def tokenize(self, text:str) -> list[str]:
         raise NotImplementedError
+
+    def tokenize_many(self, texts:list[str]) -> list[list[str]]:
+        """Tokens of each text, in order (document builds); override to batch or parallelize"""
+        return [self.tokenize(text) for text in texts]
+
+    def load(self):
+        """Load models / data now instead of on the first `tokenize` (optional)"""
+        pass
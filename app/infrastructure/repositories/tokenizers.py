@@ -1,22 +1,100 @@
+import os
 import string
-import jieba
+import hashlib
 import logging
+import threading
+import multiprocessing
 from pathlib import Path
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer 
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.infrastructure.lru_cache import LRUCache
+from app.core.config import QUERY_CACHE_SIZE, FILE_CACHE_DIR, TOKENIZE_WORKERS
 
 logger = logging.getLogger(__name__)
 
 curr_dir = Path(__file__).resolve().parent
-jieba.set_dictionary(str(curr_dir.joinpath('tokenizer_data','dict.txt.big'))) 
+JIEBA_DICTIONARY = curr_dir.joinpath('tokenizer_data','dict.txt.big')
+
+# jieba, NLTK and the default Preprocessor are loaded on first use (or `load()`), not at import
+_load_lock = threading.Lock()
+_jieba = None
+_default_preprocessor = None
+
+def _load_jieba(cache_dir:str|None = FILE_CACHE_DIR):
+    """jieba tokenizer with its prefix dictionary built once per process.
+
+    The prefix dictionary is cached under `<cache_dir>/jieba/`, keyed by the dictionary's sha256,
+    as data-only arrays read back without unpickling (jieba's own cache in the temp dir is read with
+    a slower streaming marshal.load, and is lost on every cold start of a container).
+    """
+    global _jieba
+    if _jieba is None:
+        with _load_lock:
+            if _jieba is None:
+                import jieba
+                tokenizer = jieba.Tokenizer(str(JIEBA_DICTIONARY))
+                if cache_dir is not None:
+                    tokenizer.FREQ, tokenizer.total = _load_prefix_dict(tokenizer, Path(cache_dir).joinpath('jieba'))
+                    tokenizer.initialized = True
+                else:
+                    tokenizer.initialize()
+                _jieba = tokenizer
+    return _jieba
+
+def _load_prefix_dict(tokenizer, cache_dir:Path) -> tuple[dict[str,int], int]:
+    """Prefix dictionary from `prefix_dict-<sha256>.npz`: the words newline-joined as UTF-8 bytes,
+    their frequencies and the total, loaded with allow_pickle=False; built and saved if missing."""
+    dictionary = JIEBA_DICTIONARY.read_bytes()
+    cache_path = cache_dir.joinpath(f'prefix_dict-{hashlib.sha256(dictionary).hexdigest()[:16]}.npz')
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            words = data['words'].tobytes().decode('utf-8').split('\n')
+            freqs = data['freqs'].tolist()
+            total = int(data['total'])
+        if len(words) != len(freqs):
+            raise ValueError(f"{len(words)} words, {len(freqs)} frequencies")
+        return dict(zip(words, freqs)), total
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable jieba prefix dictionary cache {cache_path}: {e!r}")
+    freq, total = tokenizer.gen_pfdict(tokenizer.get_dict_file())
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                words=np.frombuffer('\n'.join(freq).encode('utf-8'), dtype=np.uint8),
+                freqs=np.fromiter(freq.values(), dtype=np.int64, count=len(freq)),
+                total=np.int64(total))
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Saved jieba prefix dictionary cache {cache_path}")
+    except OSError as e:
+        logger.warning(f"Could not save jieba prefix dictionary cache {cache_path}: {e!r}")
+    return freq, total
+
+def default_preprocessor() -> "Preprocessor":
+    global _default_preprocessor
+    if _default_preprocessor is None:
+        with _load_lock:
+            if _default_preprocessor is None:
+                _default_preprocessor = Preprocessor()
+    return _default_preprocessor
 
 class Preprocessor:
+    STEM_CACHE_SIZE = 100000 # memoized stems; beyond this, new words are stemmed without caching
+
     def __init__(self):
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer
         chinese_punctuation = "！？｡＂＃＄％＆＇（）＊＋，－／：；＜＝＞＠［＼］＾＿｀｛｜｝～、。《》「」『』【】—…·"
         self.punctuations = set(string.punctuation) | set(chinese_punctuation)
+        self.punctuation_table = str.maketrans('', '', ''.join(self.punctuations))
         self.stemmer = PorterStemmer()
         self.stop_words = set(stopwords.words('english')) | self._load_custom_stopwords()
+        self.skip_tokens = frozenset(self.punctuations | self.stop_words)
+        self._stems:dict[str,str] = dict()
 
     def _load_custom_stopwords(self) -> set[str]:
         curr_dir = Path(__file__).resolve().parent
@@ -30,14 +108,21 @@ class Preprocessor:
             return set()
         
     def remove_punctuation(self, text:str) -> str:
-        map_table = str.maketrans('', '', ''.join(self.punctuations))
-        return str.translate(text, map_table)
+        return text.translate(self.punctuation_table)
 
     def remove_stopwords(self, words:list[str]) -> list[str]:
         return [word for word in words if word not in self.stop_words]
+
+    def stem(self, word:str) -> str:
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = self.stemmer.stem(word)
+            if len(self._stems) < self.STEM_CACHE_SIZE:
+                self._stems[word] = stem
+        return stem
     
     def stem_words(self, words:list[str]) -> list[str]:
-        return [self.stemmer.stem(w) for w in words]
+        return [self.stem(w) for w in words]
     
 
 # -- (Chinese) Jieba Tokenizer
@@ -48,31 +133,110 @@ class JiebaTokenizer(TokenizerInterface):
     1. https://tsroten.github.io/zhon/api.html#zhon.hanzi.punctuation
     2. https://github.com/fengdu78/machine_learning_beginner/blob/master/deep-learning-with-tensorflow-keras-pytorch/deep-learning-with-keras-notebooks-master/8.1-jieba-word-tokenizer.ipynb
     """
-    def __init__(self, preprocessor:Preprocessor = Preprocessor()):
-        self.preprocessor = preprocessor
+    def __init__(self, preprocessor:Preprocessor|None = None):
+        """preprocessor: None shares the default one, loaded on first use"""
+        self._preprocessor = preprocessor
+
+    @property
+    def preprocessor(self) -> Preprocessor:
+        if self._preprocessor is None:
+            self._preprocessor = default_preprocessor()
+        return self._preprocessor
+
+    def load(self):
+        """Load jieba's dictionary and NLTK data now rather than on the first tokenize"""
+        _load_jieba()
+        self.preprocessor
 
     def tokenize(self, text:str) -> list[str]:
-        text = self.preprocessor.remove_punctuation(text)
-        # tokens = [token for token in jieba.cut_for_search(text) if token.strip()] 
-        tokens = [token for token in jieba.cut(text, cut_all=False) if token.strip()] 
-        tokens = [token for token in tokens if token not in self.preprocessor.punctuations]
-        tokens = [token for token in tokens if token not in self.preprocessor.stop_words]
-        tokens = self.preprocessor.stem_words(tokens)
-        return tokens
+        return self.tokenize_many([text])[0]
+
+    def tokenize_many(self, texts:list[str]) -> list[list[str]]:
+        # punctuation removal, then one pass over jieba's tokens: drop blanks, punctuation and stop words, stem
+        preprocessor = self.preprocessor
+        cut = _load_jieba().cut
+        skip, stem, table = preprocessor.skip_tokens, preprocessor.stem, preprocessor.punctuation_table
+        return [
+            [stem(token) for token in cut(text.translate(table), cut_all=False) if token not in skip and token.strip()]
+            for text in texts]
 
 # -- (English) Word Tokenizer
 class WordTokenizer(TokenizerInterface):
-    def __init__(self, preprocessor:Preprocessor = Preprocessor()):
-        self.preprocessor = preprocessor
+    def __init__(self, preprocessor:Preprocessor|None = None):
+        self._preprocessor = preprocessor
+
+    @property
+    def preprocessor(self) -> Preprocessor:
+        if self._preprocessor is None:
+            self._preprocessor = default_preprocessor()
+        return self._preprocessor
+
+    def load(self):
+        self.preprocessor
+
+    def tokenize(self, text:str) -> list[str]:
+        preprocessor = self.preprocessor
+        stop_words, stem = preprocessor.stop_words, preprocessor.stem
+        return [stem(word) for word in preprocessor.remove_punctuation(text.lower()).split() if word not in stop_words]
+
+
+# -- tokenize_many across worker processes (document builds)
+_worker_tokenizer:TokenizerInterface|None = None
+
+def _init_worker(tokenizer:TokenizerInterface):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+    _worker_tokenizer.load()
+
+def _worker_tokenize_many(texts:list[str]) -> list[list[str]]:
+    return _worker_tokenizer.tokenize_many(texts)
+
+class ParallelTokenizer(TokenizerInterface):
+    """Split large `tokenize_many` calls (index builds) across `workers` processes; `tokenize` runs in-process.
+    The pool lives for one call: builds are rare, and idle workers would hold a copy of jieba's dictionary."""
+    MIN_PARALLEL_TEXTS = 1000 # smaller batches are not worth starting processes for
+    CHUNKS_PER_WORKER = 4
+
+    def __init__(self, tokenizer:TokenizerInterface, workers:int = TOKENIZE_WORKERS):
+        self.tokenizer = tokenizer
+        self.workers = workers
+
+    def load(self):
+        self.tokenizer.load()
 
     def tokenize(self, text:str) -> list[str]:
-        text = self.preprocessor.remove_punctuation(text.lower())
-        words = text.split()
-        words = self.preprocessor.remove_stopwords(words)
-        words = self.preprocessor.stem_words(words)
-        return words
+        return self.tokenizer.tokenize(text)
+
+    def tokenize_many(self, texts:list[str]) -> list[list[str]]:
+        if self.workers <= 1 or len(texts) < self.MIN_PARALLEL_TEXTS:
+            return self.tokenizer.tokenize_many(texts)
+        chunk_size = -(-len(texts) // (self.workers * self.CHUNKS_PER_WORKER))
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+        # spawn: forking a process that runs torch and thread pools is unsafe
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.tokenizer,)) as executor:
+            return [tokens for chunk in executor.map(_worker_tokenize_many, chunks) for tokens in chunk]
+
+
+# -- LRU cache in front of another tokenizer (for query text)
+class CachedTokenizer(TokenizerInterface):
+    def __init__(self, tokenizer:TokenizerInterface, max_size:int = QUERY_CACHE_SIZE):
+        self.tokenizer = tokenizer
+        self.cache = LRUCache(max_size)
 
-  
+    def load(self):
+        self.tokenizer.load()
+
+    def tokenize_many(self, texts:list[str]) -> list[list[str]]:
+        # documents, not queries: bypass the cache (query batches call tokenize per query)
+        return self.tokenizer.tokenize_many(texts)
+
+    def tokenize(self, text:str) -> list[str]:
+        # cached as a tuple, so callers can't modify the shared entry
+        return list(self.cache.get_or_compute(text, lambda: tuple(self.tokenizer.tokenize(text))))
 
 
 if __name__ == "__main__":
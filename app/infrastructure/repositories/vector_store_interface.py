@@ -8,31 +8,59 @@ class VectorStoreInterface(ABC):
     def search(self, query_vector:NDArray, limit:int) -> list[SearchResult]:
         raise NotImplementedError
 
+    def search_batch(self, query_vectors:NDArray, limit:int) -> list[list[SearchResult]]:
+        """Top `limit` for each row of query_vectors. Override to score all queries together."""
+        return [self.search(query_vector, limit) for query_vector in query_vectors]
+
     @abstractmethod
     def retrieve_by_id(self, id) -> Document:
         raise NotImplementedError
 
-    # CRUD operation (not used)
+    # CRUD operation
     @abstractmethod
     def add(self, id:str, vector:NDArray, doc:Document) -> str:
         """return id"""
         raise NotImplementedError
 
+    def add_batch(self, ids:list[str], vectors:NDArray, docs:list[Document]) -> list[str]:
+        """Add many vectors at once; return ids. Override for a bulk write path."""
+        return [self.add(id, vector, doc) for id, vector, doc in zip(ids, vectors, docs)]
+
+    def refresh(self) -> None:
+        """Bring search structures up to date after a batch of writes, so the next search does not pay for it (optional)"""
+        pass
+
     @abstractmethod
     def __len__(self) -> int:
         raise NotImplementedError
 
-    # def update(self, id:str, vector:str, metadata:dict):
-    #     raise NotImplementedError
+    @abstractmethod
+    def update(self, id:str, vector:NDArray, doc:Document) -> str:
+        """Replace vector and document of an existing id (KeyError if missing); return id"""
+        raise NotImplementedError
         
-    # def delete(self, id:str) -> None:
-    #     raise NotImplementedError
+    @abstractmethod
+    def delete(self, id:str) -> None:
+        """Remove an id (KeyError if missing)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy(self) -> "VectorStoreInterface":
+        """Independent store with the same entries; writes to either one are not visible in the other"""
+        raise NotImplementedError
 
     # File-based vector store methods
     @abstractmethod
-    def save_index(self):
+    def save_index(self, fingerprint:str|None = None):
+        """Persist the index, tagged with the fingerprint of the documents it was built from"""
         raise NotImplementedError
     
     @abstractmethod
-    def load_index(self):
+    def load_index(self, fingerprint:str|None = None) -> bool:
+        """Load the persisted index if it exists (and matches fingerprint, if given); return whether it was loaded"""
         raise NotImplementedError
@@ -1,21 +1,94 @@
+import time
 import logging
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from abc import ABC, abstractmethod
+import numpy as np
 from numpy.typing import NDArray
 from collections import defaultdict
 
 from app.infrastructure.repositories.vector_store_interface import VectorStoreInterface
 from app.infrastructure.repositories.keyword_store_interface import KeywordStoreInterface
 from app.infrastructure.embeddings.embedder import EmbedderInterface
+from app.infrastructure.embeddings.embedding_cache import EmbeddingCache
+from app.infrastructure.ingestion.chunker import parent_id
 from app.domain.models import SearchResult, Document
-from app.core.config import HYBRID_RRF_K
+from app.core.metrics import STAGE_SECONDS
+from app.core.config import (
+    HYBRID_RRF_K,
+    HYBRID_LEG_TIMEOUT_MS,
+    HYBRID_EXECUTOR_WORKERS,
+    EMBED_BATCH_SIZE,
+    PERSIST_INDEX,
+    CHUNKING_ENABLED,
+    CHUNK_FETCH_FACTOR)
 
 logger = logging.getLogger(__name__)
 
+def content_hash(text:str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def documents_fingerprint(documents:list[Document], model:str|None = None) -> str:
+    """Hash of document ids and contents, used to tell whether a persisted index is still current.
+    `model` names the encoder for vector indexes, so vectors of another model (or dim) are not reused."""
+    digest = hashlib.sha256()
+    if model is not None:
+        digest.update(model.encode('utf-8'))
+        digest.update(b'\0')
+    for doc in documents:
+        digest.update(doc.id.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(content_hash(doc.content).encode('ascii'))
+    return digest.hexdigest()
+
+def collapse_to_parents(results:list[SearchResult], top_k:int) -> list[SearchResult]:
+    """Keep the best-ranked chunk of each parent post and re-rank"""
+    seen = set()
+    collapsed = []
+    for res in results:
+        pid = parent_id(res.document)
+        if pid in seen:
+            continue
+        seen.add(pid)
+        collapsed.append(SearchResult(document=res.document, score=res.score, rank=len(collapsed) + 1))
+        if len(collapsed) == top_k:
+            break
+    return collapsed
+
+class _HybridLeg:
+    """One leg of a hybrid search running on the executor. Its timeout counts from when it starts
+    running, so time spent queued behind other requests' legs does not use it up."""
+    def __init__(self, name:str, executor:ThreadPoolExecutor, func, *args):
+        self.name = name
+        self.started = threading.Event()
+        self.start_time = 0.0
+        self.future = executor.submit(self._run, func, *args)
+
+    def _run(self, func, *args):
+        self.start_time = time.monotonic()
+        self.started.set()
+        return func(*args)
+
 class RetrieverInterface(ABC):
     @abstractmethod
     def build(self, documents:list[Document]) -> None:
         raise NotImplementedError
     
+    @abstractmethod
+    def copy(self) -> "RetrieverInterface":
+        """Snapshot that can be built or synced without affecting searches running on this one"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def sync(self, documents:list[Document]) -> dict[str,int]:
+        """Bring the indexes in line with documents, touching only what changed; return change counts"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def embed_query(self, query: str) -> NDArray:
+        raise NotImplementedError
+
     @abstractmethod
     def semantic_search(self, query: str, top_k: int) -> list[SearchResult]:
         raise NotImplementedError
@@ -27,6 +100,16 @@ class RetrieverInterface(ABC):
     @abstractmethod
     def hybrid_search(self, query: str, top_k: int) -> list[SearchResult]:
         raise NotImplementedError
+
+    # batch search: results of each query, in query order. Override to search the queries together.
+    def semantic_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        return [self.semantic_search(query, top_k) for query in queries]
+
+    def keyword_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        return [self.keyword_search(query, top_k) for query in queries]
+
+    def hybrid_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        return [self.hybrid_search(query, top_k) for query in queries]
     
 
 
@@ -35,37 +118,220 @@ class FileRetriever(RetrieverInterface):
             self, 
             embedder:EmbedderInterface, 
             vector_store: VectorStoreInterface,
-            keyword_store: KeywordStoreInterface):
+            keyword_store: KeywordStoreInterface,
+            embed_batch_size:int = EMBED_BATCH_SIZE,
+            embedding_cache: EmbeddingCache|None = None,
+            persist_index:bool = PERSIST_INDEX,
+            collapse_chunks:bool = CHUNKING_ENABLED,
+            leg_timeout_ms:float = HYBRID_LEG_TIMEOUT_MS,
+            executor:ThreadPoolExecutor|None = None):
+        """executor runs the two legs of hybrid_search; shared by copies of this retriever"""
         self.embedder = embedder
         self.vector_store = vector_store  
         self.keyword_store = keyword_store 
+        self.embed_batch_size = embed_batch_size
+        self.embedding_cache = embedding_cache
+        self.persist_index = persist_index
+        self.collapse_chunks = collapse_chunks
+        self.document_hashes:dict[str,str] = dict() # id -> content hash of indexed documents
+        self.leg_timeout = leg_timeout_ms / 1000
+        self.executor = executor or ThreadPoolExecutor(max_workers=HYBRID_EXECUTOR_WORKERS, thread_name_prefix="hybrid-leg")
+
+    def copy(self) -> "FileRetriever":
+        """Share embedder and embedding cache; copy both stores"""
+        clone = FileRetriever(
+            self.embedder,
+            self.vector_store.copy(),
+            self.keyword_store.copy(),
+            embed_batch_size = self.embed_batch_size,
+            embedding_cache = self.embedding_cache,
+            persist_index = self.persist_index,
+            collapse_chunks = self.collapse_chunks,
+            leg_timeout_ms = self.leg_timeout * 1000,
+            executor = self.executor)
+        clone.document_hashes = dict(self.document_hashes)
+        return clone
     
     def build(self, documents):
-        # build keyword index
-        self.keyword_store.build_index(documents)
-        # build vector index (not chunked)
-        for doc in documents:
-            embedding = self.embedder.embed(doc.content)
-            self.vector_store.add(id=doc.id, vector=embedding, doc=doc)
-        logger.info(f"FileRetriever build complete: {len(self.vector_store)} documents indexed.")
+        fingerprint = documents_fingerprint(documents)
+        # build keyword index, unless an up-to-date one is persisted
+        if self.persist_index and self._load_persisted(self.keyword_store, fingerprint):
+            logger.info("Keyword index loaded from persisted index.")
+        else:
+            self.keyword_store.build_index(documents)
+            if self.persist_index:
+                self.keyword_store.save_index(fingerprint)
+        # build vector index, unless an up-to-date one of the same encoder is persisted
+        self.document_hashes = {doc.id:content_hash(doc.content) for doc in documents}
+        self.vector_store.clear()
+        fingerprint = documents_fingerprint(documents, self.embedder.model_name)
+        if self.persist_index and self._load_persisted(self.vector_store, fingerprint):
+            self.vector_store.refresh()
+            logger.info(f"FileRetriever build complete: {len(self.vector_store)} documents loaded from persisted vector index.")
+            return
+        embedded = self._embed_into_vector_store(documents)
+        self.vector_store.refresh() # train / compress here, off the request path, not on the first search
+        if self.persist_index:
+            self.vector_store.save_index(fingerprint)
+        logger.info(f"FileRetriever build complete: {len(self.vector_store)} documents indexed, {embedded} embedded.")
+
+    def sync(self, documents:list[Document]) -> dict[str,int]:
+        """Diff documents against the indexed ones by id and content hash; upsert and delete only the changes"""
+        incoming = {doc.id:content_hash(doc.content) for doc in documents}
+        deleted = [id for id in self.document_hashes if id not in incoming]
+        upserts = [doc for doc in documents if self.document_hashes.get(doc.id) != incoming[doc.id]]
+        changes = {
+            "added": sum(doc.id not in self.document_hashes for doc in upserts),
+            "updated": sum(doc.id in self.document_hashes for doc in upserts),
+            "deleted": len(deleted)}
+        if upserts or deleted:
+            self.keyword_store.update_index(upserts, deleted)
+            for id in deleted:
+                self.vector_store.delete(id)
+            embedded = self._embed_into_vector_store(upserts)
+            self.vector_store.refresh()
+            self.document_hashes = incoming
+            if self.persist_index:
+                self.keyword_store.save_index(documents_fingerprint(documents))
+                self.vector_store.save_index(documents_fingerprint(documents, self.embedder.model_name))
+            logger.info(f"FileRetriever sync complete: {changes}, {embedded} embedded, {len(self.vector_store)} documents indexed.")
+        return changes
+
+    def _embed_into_vector_store(self, documents:list[Document]) -> int:
+        """Embed documents (cached embeddings first) and add or overwrite them in the vector store; return number embedded"""
+        to_embed = self._add_cached_embeddings(documents)
+        for batch in self._length_sorted_batches(to_embed):
+            embeddings = self.embedder.embed_batch([doc.content for doc in batch])
+            self.vector_store.add_batch([doc.id for doc in batch], embeddings, batch)
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many([doc.content for doc in batch], embeddings)
+        if self.embedding_cache is not None:
+            self.embedding_cache.save()
+        return len(to_embed)
+
+    def _load_persisted(self, store:VectorStoreInterface|KeywordStoreInterface, fingerprint:str) -> bool:
+        try:
+            return store.load_index(fingerprint)
+        except Exception as e:
+            logger.warning(f"Failed to load persisted index of {type(store).__name__}, rebuilding: {e}")
+            return False
+
+    def _add_cached_embeddings(self, documents:list[Document]) -> list[Document]:
+        """Add documents whose embedding is cached to the vector store; return the ones still to embed"""
+        if self.embedding_cache is None:
+            return documents
+        to_embed = []
+        for start in range(0, len(documents), self.embed_batch_size):
+            batch = documents[start:start + self.embed_batch_size]
+            cached = self.embedding_cache.get_many([doc.content for doc in batch])
+            hits = [(doc, vector) for doc, vector in zip(batch, cached) if vector is not None]
+            to_embed.extend(doc for doc, vector in zip(batch, cached) if vector is None)
+            if hits:
+                self.vector_store.add_batch(
+                    [doc.id for doc, _ in hits], np.stack([vector for _, vector in hits]), [doc for doc, _ in hits])
+        return to_embed
+
+    def _length_sorted_batches(self, documents:list[Document]):
+        """Yield document batches ordered by content length, so each batch pads to similar lengths"""
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i].content), reverse=True)
+        for start in range(0, len(order), self.embed_batch_size):
+            yield [documents[i] for i in order[start:start + self.embed_batch_size]]
             
 
+    def _collapse(self, results:list[SearchResult], top_k:int) -> list[SearchResult]:
+        return collapse_to_parents(results, top_k) if self.collapse_chunks else results[:top_k]
+
+    def _fetch_size(self, top_k:int) -> int:
+        """Number of chunk results to fetch so that collapsing still leaves top_k posts"""
+        return top_k * CHUNK_FETCH_FACTOR if self.collapse_chunks else top_k
+
+    def embed_query(self, query: str) -> NDArray:
+        with STAGE_SECONDS.time(stage="query_embed"):
+            return self.embedder.embed(query)
+
     def semantic_search(self, query: str, top_k: int)  -> list[SearchResult]:
         logger.debug(f'Semantic search for query: "{query}" with top_k={top_k}')
-        query_vector = self.embedder.embed(query)
+        query_vector = self.embed_query(query)
         logger.debug(f'Semantic search for query embedding dim: {query_vector.shape}')
-        return self.vector_store.search(query_vector, top_k)
+        with STAGE_SECONDS.time(stage="vector_search"):
+            results = self.vector_store.search(query_vector, self._fetch_size(top_k))
+        return self._collapse(results, top_k)
     
     def keyword_search(self, query: str, top_k: int)  -> list[SearchResult]:
-        return self.keyword_store.search(query, top_k)
+        with STAGE_SECONDS.time(stage="keyword_search"):
+            results = self.keyword_store.search(query, self._fetch_size(top_k))
+        return self._collapse(results, top_k)
     
     def hybrid_search(self, query: str, top_k: int) -> list[SearchResult]:
+        """Run both legs concurrently on the executor; a leg that fails or runs longer than leg_timeout
+        is left out of the merge. If both legs time out, the first one to finish is used alone."""
         extended_top_k = top_k * 5
-        semantic_res = self.semantic_search(query, extended_top_k)
-        keyword_res = self.keyword_search(query, extended_top_k)
-        merged_results = self._rrf_merge_results(keyword_res, semantic_res)
+        semantic_leg = _HybridLeg("semantic", self.executor, self.semantic_search, query, extended_top_k)
+        keyword_leg = _HybridLeg("keyword", self.executor, self.keyword_search, query, extended_top_k)
+        semantic_res = self._leg_result(semantic_leg, self.leg_timeout)
+        keyword_res = self._leg_result(keyword_leg, self.leg_timeout)
+        if semantic_res is None and keyword_res is None:
+            semantic_res, keyword_res = self._first_finished_leg(semantic_leg, keyword_leg)
+        with STAGE_SECONDS.time(stage="rrf_merge"):
+            merged_results = self._rrf_merge_results(keyword_res or [], semantic_res or [])
         return merged_results[:top_k]
 
+    def semantic_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        """All queries embedded with one embed_batch call and scored with one matrix-matrix product"""
+        if not queries:
+            return []
+        with STAGE_SECONDS.time(stage="batch_query_embed"):
+            query_vectors = self.embedder.embed_batch(queries)
+        with STAGE_SECONDS.time(stage="batch_vector_search"):
+            results = self.vector_store.search_batch(query_vectors, self._fetch_size(top_k))
+        return [self._collapse(res, top_k) for res in results]
+
+    def keyword_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        with STAGE_SECONDS.time(stage="batch_keyword_search"):
+            results = self.keyword_store.search_batch(queries, self._fetch_size(top_k))
+        return [self._collapse(res, top_k) for res in results]
+
+    def hybrid_search_batch(self, queries:list[str], top_k:int) -> list[list[SearchResult]]:
+        """Both legs run as batches, concurrently. A leg that fails is left out of every query's merge;
+        legs are not timed out, since a batch legitimately takes longer than a single query."""
+        extended_top_k = top_k * 5
+        semantic_res = self._leg_result(_HybridLeg("semantic", self.executor, self.semantic_search_batch, queries, extended_top_k), None)
+        keyword_res = self._leg_result(_HybridLeg("keyword", self.executor, self.keyword_search_batch, queries, extended_top_k), None)
+        if semantic_res is None and keyword_res is None:
+            raise RuntimeError("Hybrid batch search failed: no retrieval leg completed")
+        no_results = [[] for _ in queries]
+        with STAGE_SECONDS.time(stage="batch_rrf_merge"):
+            return [
+                self._rrf_merge_results(keyword, semantic)[:top_k]
+                for keyword, semantic in zip(keyword_res or no_results, semantic_res or no_results)]
+
+    def _leg_result(self, leg:_HybridLeg, timeout:float|None) -> list|None:
+        """Result of a hybrid leg, or None if it raised or ran longer than `timeout` once started
+        (it then finishes in the background). timeout None waits for the leg."""
+        try:
+            if timeout is None:
+                return leg.future.result()
+            leg.started.wait() # queued legs are not timed: the executor has two threads per admitted search
+            return leg.future.result(timeout=max(leg.start_time + timeout - time.monotonic(), 0))
+        except FutureTimeoutError:
+            logger.warning(f"Hybrid search: {leg.name} leg timed out after {self.leg_timeout * 1000:.0f} ms, using the other leg only")
+        except Exception as e:
+            logger.error(f"Hybrid search: {leg.name} leg failed, using the other leg only: {e}", exc_info=True)
+        return None
+
+    def _first_finished_leg(self, semantic_leg:_HybridLeg, keyword_leg:_HybridLeg) -> tuple[list|None, list|None]:
+        """(semantic, keyword) results with only the first leg to complete successfully;
+        raises only if both legs failed, so a slow search is answered late rather than failed"""
+        legs = {semantic_leg.future: semantic_leg, keyword_leg.future: keyword_leg}
+        for future in as_completed(legs):
+            try:
+                result = future.result()
+            except Exception:
+                continue # logged by _leg_result
+            logger.warning(f"Hybrid search: both legs timed out, using the {legs[future].name} leg that finished first")
+            return (result, None) if legs[future] is semantic_leg else (None, result)
+        raise RuntimeError("Hybrid search failed: both retrieval legs failed")
+
     def _rrf_merge_results(self, keyword_res:list[SearchResult], semantic_res:list[SearchResult]) -> list[SearchResult]:
         # Use reciprocal rank fusion (RRF)
         def rrf_score(rank:int, k:float = HYBRID_RRF_K):
@@ -73,16 +339,17 @@ class FileRetriever(RetrieverInterface):
         
         doc_score_dic = defaultdict(float)
         doc_map = dict()  # doc_id -> Document
+        # chunks are merged by their parent post, so both legs vote for the same post
 
         for res in keyword_res:
-            doc_id = res.document.id
+            doc_id = parent_id(res.document)
             rank = res.rank
             doc_score_dic[doc_id] += rrf_score(rank)
             doc_map[doc_id] = res.document
 
         for res in semantic_res:
             rank = res.rank
-            doc_id = res.document.id   
+            doc_id = parent_id(res.document)
             doc_score_dic[doc_id] += rrf_score(rank)
             doc_map[doc_id] = res.document
 
@@ -1,65 +1,219 @@
+import time
+import asyncio
 import datetime
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from anyio import to_thread
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from app.api.query import query_router
 from app.api.health import health_router
+from app.api.metrics import metrics_router
 from app.services.rag_service import RagService
+from app.services.answer_cache import AnswerCache
+from app.services.startup import StartupProgress
+from app.services.admission import AdmissionLimiter
 from app.infrastructure.retriever import FileRetriever
 from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.ivf_vector_store import IVFFlatVectorStore
 from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
-from app.infrastructure.repositories.tokenizers import JiebaTokenizer
-from app.infrastructure.clients.gemini_client import AsyncGeminiClient
+from app.infrastructure.repositories.keyword_process_pool import KeywordProcessPool, ProcessPoolKeywordStore
+from app.infrastructure.repositories.tokenizers import JiebaTokenizer, CachedTokenizer, ParallelTokenizer
+from app.infrastructure.clients.fake_client import FakeLLMClient
 from app.infrastructure.embeddings.embedder import SentenceTransformerEmbedder
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.embeddings.cached_embedder import CachedEmbedder
+from app.infrastructure.embeddings.batching_embedder import MicroBatchingEmbedder
+from app.infrastructure.embeddings.embedding_cache import EmbeddingCache
 from app.core.config import CORS_DOMAIN_NAME
+from app.core.metrics import REGISTRY, HTTP_REQUEST_SECONDS, Sample, monitor_event_loop
 
 from app.core.config import (
+    LLM_CLIENT,
     GEMINI_MODEL,
     GEMINI_API_KEY,
+    EMBEDDER,
     SENTENCE_ENCODER_MODEL,
-    INDEX_JSON_URL
+    INDEX_JSON_URL,
+    EMBEDDING_CACHE_ENABLED,
+    EMBED_MICRO_BATCHING,
+    VECTOR_STORE,
+    KEYWORD_PROCESS_POOL_SIZE,
+    TOKENIZE_WORKERS,
+    KEYWORD_PROCESS_POOL_HEALTH_CHECK_S,
+    ANSWER_CACHE_ENABLED,
+    CHUNKING_ENABLED,
+    FAST_START,
+    THREAD_POOL_SIZE,
+    RETRIEVAL_CONCURRENCY,
+    LLM_CONCURRENCY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_MAX_WAIT_S,
+    OVERLOAD_RETRY_AFTER_S,
+    EVENT_LOOP_MONITOR_INTERVAL_S
     )
 from app.infrastructure.ingestion.parser import load_documents
+from app.infrastructure.ingestion.chunker import Chunker
 
 # Initialize service 
 logger = logging.getLogger(__name__)
 logger.info("Initializing service")
 
+# models (torch, jieba dictionary, NLTK data) are loaded by start_rag_service, not at import
+match EMBEDDER:
+    case "sentence_transformer":
+        encoder = SentenceTransformerEmbedder(SENTENCE_ENCODER_MODEL, lazy = True)
+    case "hashing":
+        logger.warning("Using hashing embedder: semantic search only matches shared words")
+        encoder = HashingEmbedder()
+    case _:
+        raise ValueError(f"Unsupported EMBEDDER: {EMBEDDER}")
+embedder = MicroBatchingEmbedder(encoder) if EMBED_MICRO_BATCHING else encoder
+match VECTOR_STORE:
+    case "brute_force":
+        vector_store = FileVectorStore()
+    case "ivf":
+        vector_store = IVFFlatVectorStore()
+    case _:
+        raise ValueError(f"Unsupported VECTOR_STORE: {VECTOR_STORE}")
+tokenizer = JiebaTokenizer()
+query_tokenizer = CachedTokenizer(tokenizer)
+keyword_store = BM25KeywordStore(
+    ParallelTokenizer(tokenizer) if TOKENIZE_WORKERS > 1 else tokenizer,
+    query_tokenizer = query_tokenizer)
+keyword_pool = None
+if KEYWORD_PROCESS_POOL_SIZE > 0:
+    keyword_pool = KeywordProcessPool(keyword_store, KEYWORD_PROCESS_POOL_SIZE)
+    keyword_store = ProcessPoolKeywordStore(keyword_store, keyword_pool)
+query_embedder = CachedEmbedder(embedder)
+embedding_cache = EmbeddingCache(encoder.model_name) if EMBEDDING_CACHE_ENABLED else None
 retriever = FileRetriever(
-    SentenceTransformerEmbedder(SENTENCE_ENCODER_MODEL),
-    FileVectorStore(),
-    BM25KeywordStore(JiebaTokenizer())
+    query_embedder,
+    vector_store,
+    keyword_store,
+    embedding_cache = embedding_cache
     )
-llm_client = AsyncGeminiClient(GEMINI_MODEL, GEMINI_API_KEY)
-rag_service = RagService(retriever, llm_client)
+match LLM_CLIENT:
+    case "gemini":
+        from app.infrastructure.clients.gemini_client import AsyncGeminiClient # google-genai is slow to import
+        llm_client = AsyncGeminiClient(GEMINI_MODEL, GEMINI_API_KEY)
+    case "fake":
+        logger.warning("Using fake LLM client: answers are placeholders")
+        llm_client = FakeLLMClient()
+    case _:
+        raise ValueError(f"Unsupported LLM_CLIENT: {LLM_CLIENT}")
+retrieval_limiter = AdmissionLimiter("retrieval", RETRIEVAL_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_S, OVERLOAD_RETRY_AFTER_S)
+llm_limiter = AdmissionLimiter("llm", LLM_CONCURRENCY, ADMISSION_QUEUE_SIZE, ADMISSION_MAX_WAIT_S, OVERLOAD_RETRY_AFTER_S)
+rag_service = RagService(
+    retriever,
+    llm_client,
+    answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None,
+    retrieval_limiter = retrieval_limiter,
+    llm_limiter = llm_limiter
+    )
+startup_progress = StartupProgress(["load_models", "build_index"])
 
 logger.info(f"Loading index.json from {INDEX_JSON_URL}")
 
 def build_rag_service():
-    docs = load_documents(INDEX_JSON_URL)
+    docs = load_documents(INDEX_JSON_URL, chunker = Chunker() if CHUNKING_ENABLED else None)
     rag_service.build(docs)
     logger.info(f"RAG Service built {datetime.datetime.now()}, total {len(docs)} documents")
 
+def start_rag_service():
+    with startup_progress.stage("load_models"):
+        encoder.load()
+        tokenizer.load()
+        if embedding_cache is not None:
+            embedding_cache.load()
+    with startup_progress.stage("build_index"):
+        build_rag_service()
+
+def start_rag_service_in_background():
+    try:
+        start_rag_service()
+    except Exception as e:
+        # readiness keeps failing with the error; the daily sync retries the build
+        logger.exception(f"Failed to start RAG Service: {e}", exc_info=True)
+
+def sync_rag_service():
+    docs = load_documents(INDEX_JSON_URL, chunker = Chunker() if CHUNKING_ENABLED else None)
+    changes = rag_service.sync(docs)
+    logger.info(f"RAG Service synced {datetime.datetime.now()}, total {len(docs)} documents, changes: {changes}")
+
+def collect_metrics() -> list[Sample]:
+    """Index size and cache counters, read from their owners on every /metrics scrape"""
+    current = rag_service.retriever
+    samples = [
+        Sample("rag_index_version", "gauge", "Published retriever snapshot version", {}, rag_service.index_version),
+        Sample("rag_index_documents", "gauge", "Documents (chunks) in the published vector index", {}, len(current.vector_store)),
+        Sample("rag_index_vector_bytes", "gauge", "Bytes of vectors held in memory for search", {"precision": current.vector_store.precision}, current.vector_store.resident_bytes)]
+    for name, cache in (("query_embedding", query_embedder.cache), ("query_tokens", query_tokenizer.cache)):
+        stats = cache.stats()
+        samples += [
+            Sample("rag_query_cache_hits_total", "counter", "Query LRU cache hits", {"cache": name}, stats["hits"]),
+            Sample("rag_query_cache_misses_total", "counter", "Query LRU cache misses", {"cache": name}, stats["misses"]),
+            Sample("rag_query_cache_entries", "gauge", "Query LRU cache entries", {"cache": name}, stats["size"])]
+    if rag_service.answer_cache is not None:
+        stats = rag_service.answer_cache.stats()
+        samples += [
+            Sample("rag_answer_cache_lookups_total", "counter", "Answer cache lookups", {}, stats["lookups"]),
+            Sample("rag_answer_cache_hits_total", "counter", "Answer cache hits by tier", {"tier": "exact"}, stats["exact_hits"]),
+            Sample("rag_answer_cache_hits_total", "counter", "Answer cache hits by tier", {"tier": "semantic"}, stats["semantic_hits"]),
+            Sample("rag_answer_cache_evictions_total", "counter", "Answer cache LRU evictions", {}, stats["evictions"]),
+            Sample("rag_answer_cache_entries", "gauge", "Answer cache entries", {}, stats["entries"])]
+    if embedding_cache is not None:
+        samples += [
+            Sample("rag_embedding_cache_hits_total", "counter", "Document embedding cache hits during builds", {}, embedding_cache.hits),
+            Sample("rag_embedding_cache_misses_total", "counter", "Document embedding cache misses during builds", {}, embedding_cache.misses)]
+    if isinstance(embedder, MicroBatchingEmbedder):
+        samples += [
+            Sample("rag_embed_micro_batches_total", "counter", "Query embedding micro-batches encoded", {}, embedder.batches),
+            Sample("rag_embed_micro_batch_mean_size", "gauge", "Mean queries per micro-batch", {}, embedder.mean_batch_size)]
+    for limiter in (retrieval_limiter, llm_limiter):
+        stats = limiter.stats()
+        samples += [
+            Sample("rag_admission_in_flight", "gauge", "Requests holding a retrieval / LLM slot", {"limiter": limiter.name}, stats["in_flight"]),
+            Sample("rag_admission_waiting", "gauge", "Requests waiting for a retrieval / LLM slot", {"limiter": limiter.name}, stats["waiting"]),
+            Sample("rag_admission_capacity", "gauge", "Retrieval / LLM slots", {"limiter": limiter.name}, stats["capacity"])]
+    if keyword_pool is not None:
+        samples.append(Sample("rag_keyword_pool_restarts_total", "counter", "Keyword process pool restarts", {}, keyword_pool.restarts))
+    return samples
+
+REGISTRY.add_collector(collect_metrics)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting RAG Service")
-    try:
-        build_rag_service()
-    except Exception as e:
-        logger.exception(f"Failed to build RAG Service: {e}", exc_info=True)
-        raise
+    to_thread.current_default_thread_limiter().total_tokens = THREAD_POOL_SIZE
+    if FAST_START:
+        # liveness answers immediately, readiness (GET /) reports progress until the build is done
+        threading.Thread(target=start_rag_service_in_background, name="rag-startup", daemon=True).start()
+    else:
+        try:
+            start_rag_service()
+        except Exception as e:
+            logger.exception(f"Failed to build RAG Service: {e}", exc_info=True)
+            raise
     scheduler = BackgroundScheduler()
-    scheduler.add_job(build_rag_service, "interval", days = 1)
+    scheduler.add_job(sync_rag_service, "interval", days = 1)
+    if keyword_pool is not None:
+        scheduler.add_job(keyword_pool.health_check, "interval", seconds = KEYWORD_PROCESS_POOL_HEALTH_CHECK_S)
     scheduler.start()
+    loop_monitor = asyncio.create_task(monitor_event_loop(EVENT_LOOP_MONITOR_INTERVAL_S))
     yield
        
     logger.info("RAG Service shutdown")
+    loop_monitor.cancel()
+    if keyword_pool is not None:
+        keyword_pool.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 app.state.rag_service = rag_service
 app.state.llm_client = llm_client
+app.state.startup_progress = startup_progress
 
 cors_domain_name_list = CORS_DOMAIN_NAME.split(',')
 logger.info(f'allow_origins: {cors_domain_name_list}')
@@ -71,8 +225,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request:Request, call_next):
+    # streaming responses are timed to their first byte
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start, method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
 app.include_router(query_router)
 app.include_router(health_router)
+app.include_router(metrics_router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+import time
+import logging
+import anyio
+from typing import AsyncIterator
+from contextlib import asynccontextmanager
+from app.core.metrics import ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+class Overloaded(Exception):
+    """A request was shed by admission control; the API answers 503 with Retry-After"""
+    def __init__(self, resource:str, retry_after:int):
+        super().__init__(f"Too many concurrent {resource} requests")
+        self.resource = resource
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """At most `capacity` holders; up to `max_queue` more wait, each for at most `max_wait` seconds.
+    Requests beyond that are rejected at once with Overloaded, so under a burst the admitted ones
+    keep their latency and the rest fail fast instead of every request slowing down together.
+
+    Slots are borrowed on behalf of a per-call token, not the current task, so a slot can be
+    held across tasks (a streamed answer is consumed by the response's task)."""
+    def __init__(self, name:str, capacity:int, max_queue:int, max_wait:float, retry_after:int):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._limiter = anyio.CapacityLimiter(capacity)
+
+    def stats(self) -> dict[str,int]:
+        stats = self._limiter.statistics()
+        return {"in_flight": stats.borrowed_tokens, "waiting": stats.tasks_waiting, "capacity": self.capacity}
+
+    async def acquire(self) -> object:
+        """Borrow a slot; return the token to `release` it with"""
+        token = object()
+        if self._limiter.available_tokens < 1 and self._limiter.statistics().tasks_waiting >= self.max_queue:
+            self._reject("queue_full")
+        start = time.perf_counter()
+        try:
+            with anyio.fail_after(self.max_wait):
+                await self._limiter.acquire_on_behalf_of(token)
+        except TimeoutError:
+            self._reject("timeout")
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, limiter=self.name)
+        return token
+
+    def release(self, token:object):
+        self._limiter.release_on_behalf_of(token)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        token = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def _reject(self, reason:str):
+        ADMISSION_REJECTED.inc(limiter=self.name, reason=reason)
+        logger.warning(f"Rejected {self.name} request ({reason}): {self.stats()}")
+        raise Overloaded(self.name, self.retry_after)
@@ -0,0 +1,133 @@
+import time
+import threading
+import unicodedata
+from dataclasses import dataclass
+from collections import OrderedDict
+import numpy as np
+from numpy.typing import NDArray
+
+from app.core.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIMILARITY_THRESHOLD
+
+# Two-tier cache of RAG answers, in memory:
+#   exact tier:    (normalized query, method, top_k, index version) -> answer
+#   semantic tier: the answer of a cached query whose embedding has cosine similarity
+#                  >= similarity_threshold with the new query (same method, top_k, index version)
+# Entries expire after ttl_seconds; beyond max_entries the least recently used is evicted.
+
+@dataclass
+class _Entry:
+    value: dict
+    embedding: NDArray|None # normalized query embedding, None if not computed
+    expires_at: float
+
+
+class AnswerCache:
+    def __init__(
+            self,
+            max_entries:int = ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds:float = ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold:float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            clock = time.monotonic):
+        """similarity_threshold above 1 disables the semantic tier"""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.clock = clock
+        self._entries:OrderedDict[tuple, _Entry] = OrderedDict() # least recently used first
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold <= 1
+
+    @staticmethod
+    def normalize_query(query:str) -> str:
+        """NFKC (full-width -> half-width), case-folded, whitespace collapsed"""
+        return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+    def _key(self, query:str, method:str, top_k:int, index_version:int) -> tuple:
+        return (self.normalize_query(query), method, top_k, index_version)
+
+    def get(self, query:str, method:str, top_k:int, index_version:int) -> dict|None:
+        """Exact tier lookup; counts as one lookup"""
+        key = self._key(query, method, top_k, index_version)
+        with self._lock:
+            self.lookups += 1
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.value
+
+    def get_similar(self, embedding:NDArray, method:str, top_k:int, index_version:int) -> dict|None:
+        """Semantic tier lookup, after a `get` miss for the same query"""
+        if not self.semantic_enabled:
+            return None
+        query_vector = self._normalize(embedding)
+        with self._lock:
+            keys, vectors = [], []
+            for key, entry in list(self._entries.items()):
+                if key[1:] != (method, top_k, index_version) or entry.embedding is None:
+                    continue
+                if self._live_entry(key) is not None:
+                    keys.append(key)
+                    vectors.append(entry.embedding)
+            if not keys:
+                return None
+            similarities = np.stack(vectors) @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return self._entries[keys[best]].value
+
+    def put(self, query:str, method:str, top_k:int, index_version:int, value:dict, embedding:NDArray|None = None):
+        key = self._key(query, method, top_k, index_version)
+        entry = _Entry(value, None if embedding is None else self._normalize(embedding), self.clock() + self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str,int]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.lookups - hits,
+                "evictions": self.evictions,
+                "expirations": self.expirations}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live_entry(self, key:tuple) -> _Entry|None:
+        """Entry for key, dropping it if expired; caller holds the lock"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= self.clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    @staticmethod
+    def _normalize(vector:NDArray) -> NDArray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
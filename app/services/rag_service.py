@@ -1,53 +1,123 @@
+import time
+import logging
+import threading
+from typing import AsyncIterator, Callable
+from contextlib import nullcontext, aclosing
 from anyio import to_thread
 from textwrap import dedent
+from numpy.typing import NDArray
 from app.infrastructure.clients.llm_client_interface import LLMClientInterface, AsyncLLMClientInterface
 from app.infrastructure.retriever import RetrieverInterface
+from app.services.answer_cache import AnswerCache
+from app.services.admission import AdmissionLimiter
 from app.domain.models import Document, SearchResult
+from app.core.metrics import STAGE_SECONDS, BUILD_SECONDS, LLM_REQUESTS, record_llm_usage
 
+logger = logging.getLogger(__name__)
 
 class RagService:
-    def __init__(self, retriever:RetrieverInterface, llm_client:AsyncLLMClientInterface):
+    """Queries run against the retriever snapshot that is current when they start.
+    Builds and syncs work on a copy off the request path and publish it with a single
+    reference assignment, so in-flight queries finish on the old snapshot."""
+    def __init__(self, retriever:RetrieverInterface, llm_client:AsyncLLMClientInterface, answer_cache:AnswerCache|None = None,
+                 retrieval_limiter:AdmissionLimiter|None = None, llm_limiter:AdmissionLimiter|None = None):
+        """retrieval_limiter / llm_limiter: admission control of searches and LLM calls (None: unlimited)"""
         self.retriever = retriever
         self.llm_client = llm_client
+        self.answer_cache = answer_cache # keyed by index_version, cleared on every publish
+        self.retrieval_limiter = retrieval_limiter
+        self.llm_limiter = llm_limiter
+        self.index_version = 0 # incremented on every published snapshot
         self._is_built = False
+        self._rebuild_lock = threading.Lock() # one build / sync at a time
     
     @property
     def is_ready(self) -> bool:
         return self._is_built
 
     def build(self, documents:list[Document]):
-        self.retriever.build(documents)
+        with self._rebuild_lock, BUILD_SECONDS.time(operation="build"):
+            self._build_snapshot(documents)
+
+    def sync(self, documents:list[Document]) -> dict[str,int]:
+        """Incrementally update a built service; build it if not built yet"""
+        with self._rebuild_lock, BUILD_SECONDS.time(operation="sync"):
+            if not self._is_built:
+                self._build_snapshot(documents)
+                return {"added": len(documents), "updated": 0, "deleted": 0}
+            retriever = self.retriever.copy()
+            changes = retriever.sync(documents)
+            if any(changes.values()):
+                self._publish(retriever)
+            return changes
+
+    def _build_snapshot(self, documents:list[Document]):
+        retriever = self.retriever.copy()
+        retriever.build(documents)
+        self._publish(retriever)
+
+    def _publish(self, retriever:RetrieverInterface):
+        self.retriever = retriever # atomic swap; the old snapshot is freed once its last query returns
+        self.index_version += 1
         self._is_built = True
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
+        logger.info(f"Published retriever snapshot, index version {self.index_version}")
 
     def _search(self, query: str, top_k:int, method:str) -> list[SearchResult]:
         # TODO: search with conversation history
         if not self._is_built:
             raise RuntimeError("Service not built yet.")
+        retriever = self.retriever # read the reference once: the whole query runs on one snapshot
         match method:
             case "semantic": 
-                return self.retriever.semantic_search(query, top_k=top_k)
+                return retriever.semantic_search(query, top_k=top_k)
             case "keyword": 
-                return self.retriever.keyword_search(query, top_k=top_k)
+                return retriever.keyword_search(query, top_k=top_k)
             case "hybrid": 
-                return self.retriever.hybrid_search(query, top_k=top_k)
+                return retriever.hybrid_search(query, top_k=top_k)
             case _:
                 raise ValueError(f"Unsupported search method: {method}")
 
+    def _search_batch(self, queries:list[str], top_k:int, method:str) -> list[list[SearchResult]]:
+        if not self._is_built:
+            raise RuntimeError("Service not built yet.")
+        retriever = self.retriever
+        match method:
+            case "semantic":
+                return retriever.semantic_search_batch(queries, top_k=top_k)
+            case "keyword":
+                return retriever.keyword_search_batch(queries, top_k=top_k)
+            case "hybrid":
+                return retriever.hybrid_search_batch(queries, top_k=top_k)
+            case _:
+                raise ValueError(f"Unsupported search method: {method}")
+
+    @staticmethod
+    def _slot(limiter:AdmissionLimiter|None):
+        return limiter.slot() if limiter is not None else nullcontext()
+
+    async def _retrieve(self, func:Callable, *args):
+        """Run CPU-bound retrieval work in a worker thread, once admitted by the retrieval limiter"""
+        async with self._slot(self.retrieval_limiter):
+            return await to_thread.run_sync(func, *args)
+
     async def search(self, query: str, top_k:int, method:str) -> dict[str,list[SearchResult]]:
         """ Pure search without LLM answer """
-        search_result = await to_thread.run_sync(self._search, query, top_k, method)
+        search_result = await self._retrieve(self._search, query, top_k, method)
         return {"search_result":search_result}
 
+    async def search_batch(self, queries:list[str], top_k:int, method:str) -> dict[str,list[list[SearchResult]]]:
+        """Search many queries together (one embed_batch call, one matrix product); results in query order"""
+        search_results = await self._retrieve(self._search_batch, queries, top_k, method)
+        return {"search_results": search_results}
+
     async def hello_llm(self) -> dict:
         """Send "hello" to llm """
         response: dict[str,str] = await self.llm_client.hello()       
         return response
 
-    async def answer(self, query: str, top_k:int = 5, method='semantic') -> dict: 
-        """ Get LLM's answer for input query with rag result
-        """
-        search_result = await to_thread.run_sync(self._search, query, top_k, method)
-
+    def _build_prompt(self, query:str, search_result:list[SearchResult]) -> str:
         context = []
         for i, res in enumerate(search_result):
             context.append(f"{i+1}. | link = {res.document.metadata.get('permalink','')} | content:{res.document.content}"""
@@ -76,9 +146,90 @@ class RagService:
 
         Answer:
         """).strip()
+        return prompt
+
+    async def _cached_answer(self, query:str, top_k:int, method:str, index_version:int) -> tuple[dict|None, NDArray|None]:
+        """Look up the exact tier, then the semantic tier; return (cached answer, query embedding for a later put)"""
+        if self.answer_cache is None:
+            return None, None
+        cached = self.answer_cache.get(query, method, top_k, index_version)
+        if cached is not None:
+            return self._mark_cached(cached, "exact"), None
+        if not self.answer_cache.semantic_enabled:
+            return None, None
+        embedding = await self._retrieve(self.retriever.embed_query, query)
+        cached = self.answer_cache.get_similar(embedding, method, top_k, index_version)
+        if cached is not None:
+            return self._mark_cached(cached, "semantic"), embedding
+        return None, embedding
+
+    def _mark_cached(self, cached:dict, tier:str) -> dict:
+        return {**cached, "metadata": {**cached.get("metadata", {}), "cache": tier}}
+
+    def _cache_answer(self, query:str, top_k:int, method:str, index_version:int, answer:dict, embedding:NDArray|None):
+        if self.answer_cache is not None:
+            self.answer_cache.put(query, method, top_k, index_version, answer, embedding)
 
-        response: dict[str,str] = await self.llm_client.generate(prompt)
-        return {
+    async def answer(self, query: str, top_k:int = 5, method='semantic') -> dict: 
+        """ Get LLM's answer for input query with rag result
+        """
+        index_version = self.index_version
+        cached, embedding = await self._cached_answer(query, top_k, method, index_version)
+        if cached is not None:
+            return cached
+        # the LLM slot is taken before retrieval, so a request shed for LLM capacity costs no search
+        async with self._slot(self.llm_limiter):
+            search_result = await self._retrieve(self._search, query, top_k, method)
+            with STAGE_SECONDS.time(stage="prompt_build"):
+                prompt = self._build_prompt(query, search_result)
+
+            with STAGE_SECONDS.time(stage="llm"):
+                response: dict[str,str] = await self.llm_client.generate(prompt)
+        LLM_REQUESTS.inc(status=response.get("status", "error"))
+        record_llm_usage(response.get("metadata", {}))
+        result = {
             "search_result": search_result, 
             "answer":response.get("answer",""), 
-            "metadata": response.get("metadata",{})}
\ No newline at end of file
+            "metadata": response.get("metadata",{})}
+        if response.get("status") == "ok":
+            self._cache_answer(query, top_k, method, index_version, result, embedding)
+        return result
+
+    async def answer_stream(self, query: str, top_k:int = 5, method='semantic') -> AsyncIterator[dict]:
+        """ Streaming answer: yield {"type": "search_result", ...} as soon as retrieval is done,
+        then the LLM client's delta / metadata (or error) events. A cached answer is sent as a single delta.
+        """
+        index_version = self.index_version
+        cached, embedding = await self._cached_answer(query, top_k, method, index_version)
+        if cached is not None:
+            yield {"type": "search_result", "search_result": cached["search_result"]}
+            yield {"type": "delta", "text": cached["answer"]}
+            yield {"type": "metadata", "metadata": cached["metadata"]}
+            return
+        # held until the stream ends; released by whichever task closes the generator
+        llm_token = await self.llm_limiter.acquire() if self.llm_limiter is not None else None
+        try:
+            search_result = await self._retrieve(self._search, query, top_k, method)
+            yield {"type": "search_result", "search_result": search_result}
+            with STAGE_SECONDS.time(stage="prompt_build"):
+                prompt = self._build_prompt(query, search_result)
+            deltas = []
+            start = time.perf_counter()
+            async with aclosing(self.llm_client.generate_stream(prompt)) as llm_events: # stop the upstream stream on close
+                async for event in llm_events:
+                    if event["type"] == "delta":
+                        if not deltas:
+                            STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_first_token")
+                        deltas.append(event["text"])
+                    elif event["type"] == "metadata":
+                        STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm")
+                        LLM_REQUESTS.inc(status="ok")
+                        record_llm_usage(event["metadata"])
+                        answer = {"search_result": search_result, "answer": "".join(deltas), "metadata": event["metadata"]}
+                        self._cache_answer(query, top_k, method, index_version, answer, embedding)
+                    elif event["type"] == "error":
+                        LLM_REQUESTS.inc(status="error")
+                    yield event
+        finally:
+            if llm_token is not None:
+                self.llm_limiter.release(llm_token)
@@ -0,0 +1,49 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class StartupProgress:
+    """Stages of the service start-up (model loading, index build), reported by the readiness check"""
+    def __init__(self, stages:list[str], clock = time.monotonic):
+        self.stages = stages
+        self.clock = clock
+        self.started_at = clock()
+        self.current:str|None = None
+        self.completed:dict[str,float] = {} # stage -> seconds
+        self.error:str|None = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return len(self.completed) == len(self.stages)
+
+    @contextmanager
+    def stage(self, name:str):
+        start = self.clock()
+        with self._lock:
+            self.current, self.error = name, None
+        logger.info(f"Startup: {name}")
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.error = f"{name} failed: {e!r}"
+            raise
+        elapsed = self.clock() - start
+        with self._lock:
+            self.completed[name] = elapsed
+            self.current = None
+        logger.info(f"Startup: {name} done in {elapsed:.2f}s")
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stage": self.current,
+                "completed": len(self.completed),
+                "total": len(self.stages),
+                "elapsed_seconds": round(self.clock() - self.started_at, 2),
+                "stage_seconds": {name:round(seconds, 2) for name, seconds in self.completed.items()},
+                "error": self.error}
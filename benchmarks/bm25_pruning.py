@@ -0,0 +1,79 @@
+"""
+Compare MaxScore dynamic pruning against exhaustive BM25 scoring.
+
+Builds a synthetic corpus with a Zipfian vocabulary (so common terms have long posting lists),
+runs the same multi-term queries through both evaluators of BM25KeywordStore, checks that
+they return identical top-k results and reports mean / p95 latency.
+
+Usage:
+    python -m benchmarks.bm25_pruning --docs 100000 --queries 300 --top-k 10 50
+"""
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.domain.models import Document
+
+
+class WhitespaceTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.split()
+
+
+def zipf_corpus(num_docs:int, vocab_size:int, seed:int) -> tuple[list[Document], np.random.Generator, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    p = 1 / np.arange(1, vocab_size + 1)
+    p /= p.sum()
+    documents = []
+    for i in range(num_docs):
+        words = rng.choice(vocab_size, size=rng.integers(20, 150), p=p)
+        documents.append(Document(id=f"doc-{i}", content=" ".join(f"w{w}" for w in words), metadata={}))
+    return documents, rng, p
+
+
+def time_queries(store:BM25KeywordStore, queries:list[str], top_k:int) -> tuple[list, list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        res = store.search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append([(r.document.id, r.score) for r in res])
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    documents, rng, p = zipf_corpus(args.docs, args.vocab, args.seed)
+    queries = [" ".join(f"w{w}" for w in rng.choice(args.vocab, size=rng.integers(2, 8), p=p)) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    pruned = BM25KeywordStore(WhitespaceTokenizer(), base_path=tempfile.mkdtemp(), dynamic_pruning=True, pruning_min_documents=0)
+    pruned.build_index(documents)
+    print(f"built index: {args.docs} docs, {len(pruned.index.vocabulary)} terms in {time.perf_counter() - start:.1f}s")
+    exhaustive = BM25KeywordStore(WhitespaceTokenizer(), base_path=tempfile.mkdtemp(), dynamic_pruning=False)
+    exhaustive._set_index(pruned.index)
+
+    print(f"{'top_k':>6} {'exhaustive mean/p95 (ms)':>26} {'maxscore mean/p95 (ms)':>24} {'speedup':>8}")
+    for top_k in args.top_k:
+        expected, exhaustive_lat = time_queries(exhaustive, queries, top_k)
+        actual, pruned_lat = time_queries(pruned, queries, top_k)
+        mismatches = sum(a != e for a, e in zip(actual, expected))
+        if mismatches:
+            raise SystemExit(f"top_k={top_k}: {mismatches} queries differ between evaluators")
+        e_ms, p_ms = np.array(exhaustive_lat) * 1e3, np.array(pruned_lat) * 1e3
+        print(f"{top_k:>6} {e_ms.mean():>13.3f} / {np.percentile(e_ms, 95):>8.3f} "
+              f"{p_ms.mean():>11.3f} / {np.percentile(p_ms, 95):>8.3f} {e_ms.mean() / p_ms.mean():>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Recall and latency of IVFFlatVectorStore against exact search (FileVectorStore).
+
+Vectors are drawn from a Gaussian mixture on the unit sphere (embeddings of real text are
+clustered, uniform random vectors are a worst case for any ANN index). For each nprobe the
+script reports recall@k (overlap with the exact top-k) and mean / p95 query latency.
+
+Usage:
+    python -m benchmarks.ivf_recall --vectors 200000 --dim 384 --nprobe 4 8 16 32
+"""
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.ivf_vector_store import IVFFlatVectorStore
+from app.domain.models import Document
+
+
+def clustered_vectors(n:int, dim:int, clusters:int, rng:np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(args.vectors, args.dim, args.clusters, rng)
+    ids = [f"doc-{i}" for i in range(args.vectors)]
+    docs = [Document(id=id, content="", metadata={}) for id in ids]
+    queries = vectors[rng.integers(args.vectors, size=args.queries)] + rng.normal(scale=0.3, size=(args.queries, args.dim)).astype(np.float32)
+
+    exact = FileVectorStore(tempfile.mkdtemp())
+    exact.add_batch(ids, vectors, docs)
+    ivf = IVFFlatVectorStore(tempfile.mkdtemp(), nlist=args.nlist)
+    ivf.add_batch(ids, vectors, docs)
+    start = time.perf_counter()
+    ivf._ensure_index()
+    print(f"{args.vectors} vectors, dim {args.dim}: trained {len(ivf.centroids)} lists in {time.perf_counter() - start:.1f}s")
+
+    def run(store) -> tuple[list[set[str]], np.ndarray]:
+        results, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            res = store.search(query, args.top_k)
+            latencies.append(time.perf_counter() - start)
+            results.append({r.document.id for r in res})
+        return results, np.array(latencies) * 1e3
+
+    expected, exact_ms = run(exact)
+    print(f"{'store':>14} {'recall@' + str(args.top_k):>10} {'mean/p95 (ms)':>18}")
+    print(f"{'exact':>14} {1.0:>10.3f} {exact_ms.mean():>8.3f} / {np.percentile(exact_ms, 95):>7.3f}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        actual, ivf_ms = run(ivf)
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(actual, expected)])
+        print(f"{'ivf nprobe=' + str(nprobe):>14} {recall:>10.3f} {ivf_ms.mean():>8.3f} / {np.percentile(ivf_ms, 95):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Open-loop load test of the query API, served with the fake LLM client.
+
+Starts `uvicorn app.main:app` on a synthetic corpus (benchmarks/synthetic_corpus.py) with
+LLM_CLIENT=fake and EMBEDDER=hashing, so no API key, model download or GPU is needed; the fake
+LLM's first-token latency and token rate are set with --llm-latency / --llm-tokens-per-second.
+--url targets a server that is already running instead.
+
+Each target rate runs for --duration seconds. Requests arrive as a Poisson process and are
+sent whether or not earlier ones have finished (open loop), and latency is measured from the
+scheduled send time, so an overloaded server shows up as growing latency instead of a lower
+send rate. The mix of endpoints and search methods is weighted, e.g. `search:hybrid=4 rag:hybrid=1`
+(endpoints: search, rag, stream).
+
+Reports per rate: throughput, status codes and p50 / p95 / p99 latency per endpoint and method
+(time to first byte as well, for streams), plus event-loop lag and to_thread pool use read
+from the server's /metrics (one worker's view when uvicorn runs several).
+
+Usage:
+    python -m benchmarks.load_test --rps 5 10 20 40 --duration 30
+    python -m benchmarks.load_test --mix search:hybrid=3 stream:hybrid=1 --llm-latency 1.5 --output load.json
+    python -m benchmarks.load_test --url http://localhost:8000 --rps 10 --query-log queries.jsonl
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+from typing import NamedTuple
+from urllib.parse import urlsplit
+from collections import defaultdict
+from benchmarks.retrieval import read_query_log, percentiles, git_revision
+
+ENDPOINTS = {"search": "/query/search", "rag": "/query/rag", "stream": "/query/rag/stream"}
+METRICS_POLL_S = 1.0
+
+
+class Target(NamedTuple):
+    endpoint: str
+    method: str
+    weight: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.endpoint}:{self.method}"
+
+
+class Result(NamedTuple):
+    target: str
+    status: int|None # None: connection error or timeout
+    latency: float # scheduled send -> last byte
+    first_byte: float|None # scheduled send -> status line
+    send_lag: float # how late the request was sent
+
+
+def parse_mix(items:list[str]) -> list[Target]:
+    """["search:hybrid=4", "rag:keyword"] -> targets (weight defaults to 1)"""
+    targets = []
+    for item in items:
+        name, _, weight = item.partition("=")
+        endpoint, _, method = name.partition(":")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {endpoint!r} in --mix, expected one of {list(ENDPOINTS)}")
+        targets.append(Target(endpoint, method or "hybrid", float(weight or 1)))
+    return targets
+
+
+class HttpClient:
+    """Minimal HTTP/1.1 client, one connection per request (Connection: close).
+    Keeps the load generator free of connection-pool limits and dependencies."""
+    def __init__(self, base_url:str, timeout:float):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = url.scheme == "https"
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+
+    async def request(self, method:str, path:str, body:dict|None = None) -> tuple[int, float, bytes]:
+        """(status, time of the status line, response body); raises OSError / TimeoutError"""
+        async with asyncio.timeout(self.timeout):
+            reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+            try:
+                payload = json.dumps(body).encode() if body is not None else b""
+                writer.write(
+                    f"{method} {self.prefix}{path} HTTP/1.1\r\nHost: {self.host}\r\nConnection: close\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                status_line = await reader.readline()
+                first_byte = time.perf_counter()
+                if not status_line:
+                    raise ConnectionError("connection closed before a response")
+                response = await reader.read() # until the server closes the connection
+            finally:
+                writer.close()
+        _, _, body = response.partition(b"\r\n\r\n")
+        return int(status_line.split()[1]), first_byte, body
+
+
+def parse_metrics(text:str) -> dict[str,float]:
+    """Prometheus text format -> {'name{labels}': value}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            samples[key] = float(value)
+    return samples
+
+
+def loop_lag(before:dict[str,float], after:dict[str,float]) -> dict[str,float]:
+    """Mean and p99 (bucket upper bound) event-loop lag between two /metrics scrapes, in ms"""
+    name = "event_loop_lag_seconds"
+    count = after.get(f"{name}_count", 0) - before.get(f"{name}_count", 0)
+    if count <= 0:
+        return {}
+    total = after.get(f"{name}_sum", 0) - before.get(f"{name}_sum", 0)
+    buckets = sorted(
+        (float(key.split('le="')[1].rstrip('"}')), after[key] - before.get(key, 0))
+        for key in after if key.startswith(f"{name}_bucket") and "+Inf" not in key)
+    p99 = next((bound for bound, cumulative in buckets if cumulative >= 0.99 * count), float("inf"))
+    return {"mean": round(total / count * 1e3, 3), "p99": p99 * 1e3}
+
+
+async def poll_server(client:HttpClient, stop:asyncio.Event) -> dict:
+    """Peak to_thread pool use seen on /metrics while the step runs"""
+    peak = {"thread_pool_busy_max": 0.0, "thread_pool_waiting_max": 0.0, "thread_pool_limit": None}
+    while not stop.is_set():
+        try:
+            _, _, body = await client.request("GET", "/metrics")
+            metrics = parse_metrics(body.decode())
+            peak["thread_pool_busy_max"] = max(peak["thread_pool_busy_max"], metrics.get('thread_pool_threads{state="busy"}', 0))
+            peak["thread_pool_waiting_max"] = max(peak["thread_pool_waiting_max"], metrics.get("thread_pool_waiting_tasks", 0))
+            peak["thread_pool_limit"] = metrics.get('thread_pool_threads{state="limit"}')
+        except (OSError, TimeoutError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), METRICS_POLL_S)
+        except TimeoutError:
+            pass
+    return peak
+
+
+async def send(client:HttpClient, target:Target, query:str, top_k:int, scheduled:float) -> Result:
+    send_lag = time.perf_counter() - scheduled
+    try:
+        status, first_byte, _ = await client.request(
+            "POST", ENDPOINTS[target.endpoint], {"query": query, "top_k": top_k, "method": target.method})
+        return Result(target.name, status, time.perf_counter() - scheduled, first_byte - scheduled, send_lag)
+    except (OSError, TimeoutError, ValueError, IndexError):
+        return Result(target.name, None, time.perf_counter() - scheduled, None, send_lag)
+
+
+async def run_step(client:HttpClient, rps:float, args:argparse.Namespace, targets:list[Target], queries:list[str], rng:random.Random) -> dict:
+    metrics_before = parse_metrics((await client.request("GET", "/metrics"))[2].decode())
+    stop = asyncio.Event()
+    poller = asyncio.create_task(poll_server(client, stop))
+    weights = [target.weight for target in targets]
+    tasks = []
+    start = time.perf_counter()
+    offset = rng.expovariate(rps)
+    while offset < args.duration:
+        scheduled = start + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        target = rng.choices(targets, weights)[0]
+        tasks.append(asyncio.create_task(send(client, target, rng.choice(queries), args.top_k, scheduled)))
+        offset += rng.expovariate(rps)
+    results:list[Result] = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    server = await poller
+    metrics_after = parse_metrics((await client.request("GET", "/metrics"))[2].decode())
+    server["event_loop_lag_ms"] = loop_lag(metrics_before, metrics_after)
+
+    by_target = {target.name: [] for target in targets}
+    for result in results:
+        by_target[result.target].append(result)
+    report = {}
+    for name, target_results in by_target.items():
+        if not target_results:
+            continue
+        ok = [r for r in target_results if r.status is not None and r.status < 400]
+        status = defaultdict(int)
+        for r in target_results:
+            status[str(r.status) if r.status is not None else "error"] += 1
+        report[name] = {"requests": len(target_results), "status": dict(status)}
+        if ok:
+            report[name]["latency_ms"] = percentiles([r.latency for r in ok])
+            report[name]["first_byte_ms"] = percentiles([r.first_byte for r in ok])
+    ok_count = sum(1 for r in results if r.status is not None and r.status < 400)
+    return {
+        "target_rps": rps,
+        "sent": len(results),
+        "offered_rps": round(len(results) / args.duration, 2),
+        "achieved_rps": round(ok_count / elapsed, 2) if elapsed else 0.0,
+        "send_lag_ms": percentiles([r.send_lag for r in results]) if results else {},
+        "server": server,
+        "endpoints": report}
+
+
+async def wait_ready(client:HttpClient, server:subprocess.Popen|None, timeout:float):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            status, _, _ = await client.request("GET", "/")
+            if status == 200:
+                return
+        except (OSError, TimeoutError, ValueError, IndexError):
+            pass
+        await asyncio.sleep(1)
+    raise TimeoutError(f"server not ready after {timeout}s")
+
+
+def start_server(args:argparse.Namespace, work_dir:str) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {
+        **os.environ,
+        "INDEX_JSON_URL": args.index,
+        "LLM_CLIENT": "fake",
+        "EMBEDDER": args.embedder,
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "ANSWER_CACHE_ENABLED": "1" if args.answer_cache else "0",
+        "PERSIST_INDEX": "0",
+        "EMBEDDING_CACHE_ENABLED": "0"}
+    log = open(os.path.join(work_dir, "server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=log, stderr=subprocess.STDOUT)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def run(args:argparse.Namespace, url:str, server:subprocess.Popen|None, queries:list[str]) -> list[dict]:
+    client = HttpClient(url, args.timeout)
+    await wait_ready(client, server, args.startup_timeout)
+    targets = parse_mix(args.mix)
+    for target in targets: # warm up every route and search method
+        for query in queries[:args.warmup]:
+            await send(client, target, query, args.top_k, time.perf_counter())
+    rng = random.Random(args.seed)
+    steps = []
+    for rps in args.rps:
+        step = await run_step(client, rps, args, targets, queries, rng)
+        steps.append(step)
+        server_stats = step["server"]
+        lag = server_stats["event_loop_lag_ms"]
+        print(f"\n{rps:g} rps target: {step['offered_rps']:g} rps sent, {step['achieved_rps']:g} rps ok, "
+              f"send lag p99 {step['send_lag_ms'].get('p99', 0):.1f} ms, loop lag mean {lag.get('mean', 0):.1f} / p99 <={lag.get('p99', 0):g} ms, "
+              f"threads busy max {server_stats['thread_pool_busy_max']:g}/{server_stats['thread_pool_limit'] or 0:g}, waiting max {server_stats['thread_pool_waiting_max']:g}")
+        for name, stats in step["endpoints"].items():
+            latency = stats.get("latency_ms", {})
+            print(f"  {name:<18}{stats['requests']:>6} req  {json.dumps(stats['status']):<28}"
+                  f"p50 {latency.get('p50', float('nan')):>9.1f}  p95 {latency.get('p95', float('nan')):>9.1f}  p99 {latency.get('p99', float('nan')):>9.1f} ms")
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, nargs="+", default=[5, 10, 20], help="target request rates, one step each")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per rate step")
+    parser.add_argument("--mix", nargs="+", default=["search:hybrid=4", "search:keyword=1", "search:semantic=1", "rag:hybrid=1"])
+    parser.add_argument("--url", help="load test a running server instead of starting one")
+    parser.add_argument("--index", help="index.json (path or URL) of the started server; default: a synthetic corpus")
+    parser.add_argument("--docs", type=int, default=2000, help="synthetic corpus size")
+    parser.add_argument("--query-log", help="send the queries of a JSONL / text log instead of synthetic ones")
+    parser.add_argument("--queries", type=int, default=500, help="synthetic queries")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--embedder", default="hashing", help="EMBEDDER of the started server")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--warmup", type=int, default=5, help="sequential requests per mix entry before the first step")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per request")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic_corpus import SyntheticCorpus
+    corpus = SyntheticCorpus(seed=args.seed)
+    queries = read_query_log(args.query_log) if args.query_log else corpus.queries(args.queries)
+    server = None
+    url = args.url
+    if url is None:
+        work_dir = tempfile.mkdtemp(prefix="rag-load-")
+        if args.index is None:
+            args.index = os.path.join(work_dir, "index.json")
+            with open(args.index, "w", encoding="utf-8") as f:
+                json.dump(corpus.posts(args.docs), f, ensure_ascii=False)
+        server, url = start_server(args, work_dir)
+        print(f"started server at {url} (log: {work_dir}/server.log)", file=sys.stderr)
+    try:
+        steps = asyncio.run(run(args, url, server, queries))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.output:
+        report = {
+            "benchmark": "load_test",
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {
+                "url": args.url,
+                "index": args.index,
+                "docs": None if args.url else args.docs,
+                "mix": args.mix,
+                "duration": args.duration,
+                "top_k": args.top_k,
+                "embedder": args.embedder,
+                "llm_latency": args.llm_latency,
+                "llm_tokens_per_second": args.llm_tokens_per_second,
+                "answer_cache": args.answer_cache,
+                "workers": args.workers,
+                "query_log": args.query_log,
+                "seed": args.seed},
+            "steps": steps}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
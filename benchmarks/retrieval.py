@@ -0,0 +1,247 @@
+"""
+Retrieval benchmark suite: index build time, peak RSS and search latency (p50 / p95 / p99)
+of FileRetriever's semantic, keyword and hybrid search on synthetic bilingual corpora, and
+the throughput of the same queries sent through the batch search methods.
+
+Every corpus size runs in a fresh interpreter, so its peak RSS is its own. Corpora and
+queries are seeded (see benchmarks/synthetic_corpus.py), and documents go through the same
+parser and chunker as the service. Queries are timed one at a time after a warm-up,
+without the query caches, so repeated queries in a log are not served from memory.
+
+Runs offline with the deterministic HashingEmbedder (default); pass a sentence-transformers
+model name to --encoder to include real encoder cost. VECTOR_STORE, VECTOR_PRECISION and
+CHUNKING_ENABLED are read from the environment as by the service.
+
+Results are written as JSON (with the git commit) to compare across commits:
+
+Usage:
+    python -m benchmarks.retrieval --docs 1000 10000 100000 --output base.json
+    python -m benchmarks.retrieval --docs 10000 --query-log requests.jsonl --output head.json
+    python -m benchmarks.retrieval --compare base.json head.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import datetime
+import subprocess
+import numpy as np
+
+RESULT_VERSION = 1
+METHODS = ("semantic", "keyword", "hybrid")
+
+
+def read_query_log(path:str) -> list[str]:
+    """Queries of a JSONL log (field "query", else "title") or of a plain text file (one per line)"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                queries.append(line)
+                continue
+            query = record.get("query") or record.get("title") if isinstance(record, dict) else None
+            if query:
+                queries.append(str(query))
+    return queries
+
+
+def percentiles(latencies:list[float]) -> dict[str,float]:
+    ms = np.asarray(latencies) * 1e3
+    return {
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3)}
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # bytes on macOS, KiB on Linux
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def run_size(args:argparse.Namespace, num_docs:int) -> dict:
+    """Benchmark one corpus size in this process"""
+    from app.core.config import CHUNKING_ENABLED, VECTOR_STORE, MAX_USER_INPUT
+    from app.infrastructure.ingestion.parser import load_documents
+    from app.infrastructure.ingestion.chunker import Chunker
+    from app.infrastructure.retriever import FileRetriever
+    from app.infrastructure.repositories.file_vector_store import FileVectorStore
+    from app.infrastructure.repositories.ivf_vector_store import IVFFlatVectorStore
+    from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+    from app.infrastructure.repositories.tokenizers import JiebaTokenizer
+    from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+    from app.infrastructure.embeddings.embedder import SentenceTransformerEmbedder
+    from benchmarks.synthetic_corpus import SyntheticCorpus
+
+    work_dir = tempfile.mkdtemp(prefix="rag-bench-")
+    corpus = SyntheticCorpus(chinese_ratio=args.chinese_ratio, seed=args.seed)
+    index_path = os.path.join(work_dir, "index.json")
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(corpus.posts(num_docs), f, ensure_ascii=False)
+    query_sets = {"synthetic": corpus.queries(args.queries)}
+    if args.query_log:
+        query_sets["log"] = [query[:MAX_USER_INPUT] for query in read_query_log(args.query_log)]
+
+    start = time.perf_counter()
+    tokenizer = JiebaTokenizer()
+    tokenizer.load()
+    embedder = HashingEmbedder() if args.encoder == "fake" else SentenceTransformerEmbedder(args.encoder)
+    load_seconds = time.perf_counter() - start
+
+    documents = load_documents(index_path, chunker = Chunker() if CHUNKING_ENABLED else None)
+    vector_store = IVFFlatVectorStore(work_dir) if VECTOR_STORE == "ivf" else FileVectorStore(work_dir)
+    retriever = FileRetriever(
+        embedder, vector_store, BM25KeywordStore(tokenizer, base_path=work_dir), embedding_cache=None, persist_index=False)
+    start = time.perf_counter()
+    retriever.build(documents)
+    build_seconds = time.perf_counter() - start
+
+    latency, throughput = {}, {}
+    for name, queries in query_sets.items():
+        latency[name], throughput[name] = {}, {}
+        for method in METHODS:
+            search = getattr(retriever, f"{method}_search")
+            for query in queries[:args.warmup]:
+                search(query, args.top_k)
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                search(query, args.top_k)
+                latencies.append(time.perf_counter() - start)
+            latency[name][method] = percentiles(latencies)
+            # bulk path (/query/search/batch): the same queries in batches of --batch-size
+            search_batch = getattr(retriever, f"{method}_search_batch")
+            start = time.perf_counter()
+            for offset in range(0, len(queries), args.batch_size):
+                search_batch(queries[offset:offset + args.batch_size], args.top_k)
+            throughput[name][method] = {
+                "single_qps": round(len(queries) / sum(latencies), 1),
+                "batch_qps": round(len(queries) / (time.perf_counter() - start), 1)}
+    retriever.executor.shutdown(wait=False)
+    return {
+        "docs": num_docs,
+        "chunks": len(documents),
+        "queries": {name: len(queries) for name, queries in query_sets.items()},
+        "model_load_seconds": round(load_seconds, 3),
+        "build_seconds": round(build_seconds, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "latency_ms": latency,
+        "throughput_qps": throughput}
+
+
+def compare(base_path:str, head_path:str):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    print(f"base {base['git']['commit']} ({base['created_at']})  vs  head {head['git']['commit']} ({head['created_at']})")
+    base_by_docs = {result["docs"]: result for result in base["results"]}
+
+    def row(label:str, old:float, new:float):
+        change = (new - old) / old * 100 if old else float("nan")
+        print(f"  {label:<28}{old:>12.3f}{new:>12.3f}{change:>+9.1f}%")
+
+    for result in head["results"]:
+        old = base_by_docs.get(result["docs"])
+        if old is None:
+            continue
+        print(f"\n{result['docs']} docs{'':<22}{'base':>12}{'head':>12}{'change':>10}")
+        row("build_seconds", old["build_seconds"], result["build_seconds"])
+        row("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"])
+        for query_set, methods in result["latency_ms"].items():
+            for method, stats in methods.items():
+                old_stats = old["latency_ms"].get(query_set, {}).get(method)
+                if old_stats is None:
+                    continue
+                for p in ("p50", "p95", "p99"):
+                    row(f"{query_set}/{method} {p} ms", old_stats[p], stats[p])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=300, help="synthetic queries per size")
+    parser.add_argument("--query-log", help="replay the queries of a JSONL / text log as well")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64, help="queries per batch search call")
+    parser.add_argument("--encoder", default="fake", help='"fake" (HashingEmbedder) or a sentence-transformers model name')
+    parser.add_argument("--chinese-ratio", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="compare two result files and exit")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS) # run one size, print its JSON result
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.child is not None:
+        print(json.dumps(run_size(args, args.child)))
+        return
+
+    child_args = sys.argv[1:]
+    results = []
+    for num_docs in args.docs:
+        print(f"benchmarking {num_docs} docs ...", file=sys.stderr)
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.retrieval", *child_args, "--child", str(num_docs)],
+            capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.exit(f"{num_docs} docs failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{num_docs:>8} docs ({result['chunks']} chunks): build {result['build_seconds']:.1f}s, peak RSS {result['peak_rss_mb']:.0f} MB")
+        for query_set, methods in result["latency_ms"].items():
+            for method, stats in methods.items():
+                qps = result["throughput_qps"][query_set][method]
+                print(f"{'':>10}{query_set:<10}{method:<9} p50 {stats['p50']:>8.2f}  p95 {stats['p95']:>8.2f}  p99 {stats['p99']:>8.2f} ms"
+                      f"  {qps['single_qps']:>8.0f} q/s single {qps['batch_qps']:>8.0f} q/s batch")
+
+    from app.core.config import VECTOR_STORE, VECTOR_PRECISION, CHUNKING_ENABLED
+    report = {
+        "benchmark": "retrieval",
+        "version": RESULT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "encoder": args.encoder,
+            "top_k": args.top_k,
+            "batch_size": args.batch_size,
+            "queries": args.queries,
+            "query_log": args.query_log,
+            "seed": args.seed,
+            "chinese_ratio": args.chinese_ratio,
+            "vector_store": VECTOR_STORE,
+            "vector_precision": VECTOR_PRECISION,
+            "chunking": CHUNKING_ENABLED},
+        "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start profile of the service: import time of `app.main` and the start-up stages.
+
+Imports `app.main` in a fresh interpreter with `python -X importtime` and reports the total,
+the slowest top-level packages (self time summed over their modules) and the slowest
+modules by cumulative time. With --startup the fresh interpreter then runs the start-up
+sequence (load_models, build_index) and reports each stage, as FAST_START does in the
+background; this needs INDEX_JSON_URL like the service itself.
+
+Usage:
+    python -m benchmarks.startup_profile --top 15
+    python -m benchmarks.startup_profile --startup
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter() - start
+main.start_rag_service()
+print(json.dumps({"import_seconds": imported, "stage_seconds": main.startup_progress.as_dict()["stage_seconds"]}))
+"""
+
+def import_times(module:str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every module imported by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, env=os.environ)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--startup", action="store_true", help="also run and time the start-up stages")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total_us = next(cumulative for name, _, cumulative in rows if name == args.module)
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import {args.module}: {total_us / 1e6:.3f}s, {len(rows)} modules")
+    print(f"\n{'package':<32}{'self total (s)':>16}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<32}{self_us / 1e6:>16.3f}")
+    print(f"\n{'module':<48}{'cumulative (s)':>16}")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"{name:<48}{cumulative_us / 1e6:>16.3f}")
+
+    if args.startup:
+        result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True, env=os.environ)
+        if result.returncode != 0:
+            sys.exit(f"start-up failed:\n{result.stderr}")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"\n{'start-up stage':<32}{'seconds':>16}")
+        print(f"{'import':<32}{report['import_seconds']:>16.3f}")
+        for stage, seconds in report["stage_seconds"].items():
+            print(f"{stage:<32}{seconds:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
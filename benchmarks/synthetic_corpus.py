@@ -0,0 +1,125 @@
+"""
+Synthetic bilingual (Chinese / English) corpora in the index.json format read by the parser.
+
+Chinese words are the most frequent entries of jieba's dict.txt.big; English words are made-up
+but pronounceable, so stemming and stop-word removal behave as on real text. Each post has a
+topic: its sentences mix topic words with words drawn from a Zipf distribution over the whole
+vocabulary, so queries built from a topic's words have relevant posts to find.
+Output is a pure function of the arguments (seeded), so runs on different commits compare.
+
+Usage:
+    python -m benchmarks.synthetic_corpus --docs 10000 --output /tmp/index-10k.json
+"""
+import re
+import json
+import argparse
+import numpy as np
+
+from app.infrastructure.repositories.tokenizers import JIEBA_DICTIONARY
+
+_CONSONANTS = "bcdfghjklmnprstvwz"
+_VOWELS = "aeiou"
+_ENDINGS = ["", "", "s", "ing", "ed", "er", "tion", "ly"]
+
+
+def chinese_vocabulary(size:int) -> list[str]:
+    """Most frequent 2-4 character words of jieba's dictionary"""
+    han_word = re.compile(r"[\u4e00-\u9fff]{2,4}")
+    entries = []
+    with open(JIEBA_DICTIONARY, encoding="utf-8") as f:
+        for line in f:
+            word, freq = line.split(" ")[:2]
+            if han_word.fullmatch(word):
+                entries.append((-int(freq), word))
+    entries.sort()
+    return [word for _, word in entries[:size]]
+
+
+def english_vocabulary(size:int, rng:np.random.Generator) -> list[str]:
+    words = set()
+    while len(words) < size:
+        consonants = rng.integers(len(_CONSONANTS), size=(size, 3))
+        vowels = rng.integers(len(_VOWELS), size=(size, 3))
+        lengths = rng.integers(1, 4, size=size)
+        endings = rng.integers(len(_ENDINGS), size=size)
+        for c, v, n, e in zip(consonants.tolist(), vowels.tolist(), lengths.tolist(), endings.tolist()):
+            words.add("".join(_CONSONANTS[c[j]] + _VOWELS[v[j]] for j in range(n)) + _ENDINGS[e])
+    return [str(word) for word in rng.permutation(sorted(words))[:size]] # frequency rank unrelated to spelling
+
+
+class SyntheticCorpus:
+    def __init__(self, num_topics:int = 200, zh_vocab:int = 20000, en_vocab:int = 20000,
+                 words_per_topic:int = 40, chinese_ratio:float = 0.6, seed:int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.chinese_ratio = chinese_ratio
+        self.vocab = {"zh": chinese_vocabulary(zh_vocab), "en": english_vocabulary(en_vocab, self.rng)}
+        self.zipf_cdf = {lang: np.cumsum(self._zipf(len(words))) for lang, words in self.vocab.items()}
+        # topic words come from the mid-frequency range, like the subject words of real posts
+        self.topics = [
+            {lang: self.rng.choice(np.arange(len(words) // 20, len(words)), size=words_per_topic, replace=False)
+             for lang, words in self.vocab.items()}
+            for _ in range(num_topics)]
+
+    @staticmethod
+    def _zipf(size:int) -> np.ndarray:
+        p = 1 / np.arange(1, size + 1)
+        return p / p.sum()
+
+    def _words(self, lang:str, topic:int, count:int, topic_share:float) -> list[str]:
+        words = self.vocab[lang]
+        from_topic = self.rng.random(count) < topic_share
+        topic_words = self.rng.choice(self.topics[topic][lang], size=count)
+        background = np.minimum(np.searchsorted(self.zipf_cdf[lang], self.rng.random(count)), len(words) - 1)
+        return [words[i] for i in np.where(from_topic, topic_words, background)]
+
+    def _sentence(self, topic:int) -> str:
+        if self.rng.random() < self.chinese_ratio:
+            return "".join(self._words("zh", topic, int(self.rng.integers(4, 16)), 0.3)) + "。"
+        words = self._words("en", topic, int(self.rng.integers(6, 20)), 0.3)
+        return " ".join(words).capitalize() + "."
+
+    def post(self, i:int) -> dict:
+        topic = int(self.rng.integers(len(self.topics)))
+        paragraphs = []
+        for _ in range(self.rng.integers(1, 6)):
+            paragraphs.append(" ".join(self._sentence(topic) for _ in range(self.rng.integers(2, 8))))
+        lang = "zh" if self.rng.random() < self.chinese_ratio else "en"
+        title = ("" if lang == "zh" else " ").join(self._words(lang, topic, 3, 0.8))
+        return {
+            "title": title,
+            "permalink": f"https://example.com/posts/{i}/",
+            "date": f"20{10 + i % 15:02d}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            "tags": [f"topic-{topic}"],
+            "content": "\n\n".join(paragraphs)}
+
+    def posts(self, num_docs:int) -> list[dict]:
+        return [self.post(i) for i in range(num_docs)]
+
+    def queries(self, count:int) -> list[str]:
+        """Queries of 1-4 topic words, in one language or mixed"""
+        queries = []
+        for _ in range(count):
+            topic = int(self.rng.integers(len(self.topics)))
+            zh = self._words("zh", topic, int(self.rng.integers(0, 3)), 1.0)
+            en = self._words("en", topic, int(self.rng.integers(0 if zh else 1, 3)), 1.0)
+            queries.append(" ".join(zh + en))
+        return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--chinese-ratio", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(num_topics=args.topics, chinese_ratio=args.chinese_ratio, seed=args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(corpus.posts(args.docs), f, ensure_ascii=False)
+    print(f"wrote {args.docs} posts to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Latency of compressed vector search (float16 / int8 + float32 rescoring) against exact
+float32 search in FileVectorStore. Recall is checked by tests/test_vector_quantization.py.
+
+Reports, per precision and rescore factor: bytes of the matrix scanned per query and mean / p95
+latency. The compressed stores are saved and reloaded first, as in production, so rescoring
+reads float32 rows from the memory-mapped file.
+
+Usage:
+    python -m benchmarks.vector_quantization --vectors 100000 --dim 384 --top-k 10
+"""
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.domain.models import Document
+from benchmarks.ivf_recall import clustered_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(args.vectors, args.dim, args.clusters, rng)
+    ids = [f"doc-{i}" for i in range(args.vectors)]
+    docs = [Document(id=id, content="", metadata={}) for id in ids]
+    queries = vectors[rng.integers(args.vectors, size=args.queries)] + rng.normal(scale=0.3, size=(args.queries, args.dim)).astype(np.float32)
+
+    def run(store:FileVectorStore) -> np.ndarray:
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, args.top_k)
+            latencies.append(time.perf_counter() - start)
+        return np.array(latencies) * 1e3
+
+    exact = FileVectorStore(tempfile.mkdtemp())
+    exact.add_batch(ids, vectors, docs)
+    exact_ms = run(exact)
+    print(f"{'precision':>10} {'rescore':>8} {'scan MB':>8} {'mean/p95 (ms)':>18}")
+    print(f"{'float32':>10} {'-':>8} {exact.matrix.nbytes / 2**20:>8.1f} {exact_ms.mean():>8.3f} / {np.percentile(exact_ms, 95):>7.3f}")
+    for precision in ("float16", "int8"):
+        base_path = tempfile.mkdtemp()
+        store = FileVectorStore(base_path, precision=precision)
+        store.add_batch(ids, vectors, docs)
+        store.save_index("bench")
+        store = FileVectorStore(base_path, precision=precision)
+        store.load_index("bench")
+        compressed, scales = store._ensure_quantized()
+        scan_mb = (compressed.nbytes + (0 if scales is None else scales.nbytes)) / 2**20
+        for rescore_factor in args.rescore_factor:
+            store.rescore_factor = rescore_factor
+            ms = run(store)
+            print(f"{precision:>10} {rescore_factor:>8} {scan_mb:>8.1f} {ms.mean():>8.3f} / {np.percentile(ms, 95):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
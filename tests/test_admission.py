@@ -0,0 +1,96 @@
+"""AdmissionLimiter: queue-full and wait-timeout rejections, slot release, and the 503 with Retry-After they map to"""
+import anyio
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.query import query_router
+from app.api.utils import overloaded_error
+from app.services.admission import AdmissionLimiter, Overloaded
+from app.services.rag_service import RagService
+from app.infrastructure.retriever import FileRetriever
+from app.infrastructure.clients.fake_client import FakeLLMClient
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.domain.models import Document
+
+MAX_WAIT = 0.2
+RETRY_AFTER = 7
+
+
+def test_limiter_rejects_when_queue_full_then_on_timeout():
+    limiter = AdmissionLimiter("test", capacity=1, max_queue=1, max_wait=MAX_WAIT, retry_after=RETRY_AFTER)
+
+    async def run():
+        held = await limiter.acquire()
+        assert limiter.stats() == {"in_flight": 1, "waiting": 0, "capacity": 1}
+        waiter_error:list[Overloaded] = []
+
+        async def wait_for_slot():
+            try:
+                await limiter.acquire()
+            except Overloaded as e:
+                waiter_error.append(e)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(wait_for_slot)
+            with anyio.fail_after(1):
+                while limiter.stats()["waiting"] < 1:
+                    await anyio.sleep(0.001)
+            # the queue is full: rejected at once, without waiting
+            start = anyio.current_time()
+            with pytest.raises(Overloaded) as rejected:
+                await limiter.acquire()
+            assert anyio.current_time() - start < MAX_WAIT / 2
+            assert rejected.value.retry_after == RETRY_AFTER and rejected.value.resource == "test"
+        # the queued request gave up after max_wait
+        assert len(waiter_error) == 1 and waiter_error[0].retry_after == RETRY_AFTER
+        assert limiter.stats() == {"in_flight": 1, "waiting": 0, "capacity": 1}
+
+        limiter.release(held)
+        assert limiter.stats()["in_flight"] == 0
+        with anyio.fail_after(MAX_WAIT / 2): # free again: no wait
+            async with limiter.slot():
+                assert limiter.stats()["in_flight"] == 1
+        assert limiter.stats()["in_flight"] == 0
+
+    anyio.run(run)
+
+
+def test_overloaded_error_is_503_with_retry_after():
+    error = overloaded_error(Overloaded("retrieval", RETRY_AFTER))
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == str(RETRY_AFTER)
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+def test_search_endpoint_sheds_with_503(tmp_path):
+    retriever = FileRetriever(
+        HashingEmbedder(dim=64), FileVectorStore(base_path=str(tmp_path)), BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+        persist_index=False, collapse_chunks=False)
+    limiter = AdmissionLimiter("retrieval", capacity=1, max_queue=0, max_wait=MAX_WAIT, retry_after=RETRY_AFTER)
+    rag_service = RagService(retriever, FakeLLMClient(latency=0), retrieval_limiter=limiter)
+    rag_service.build([Document(id="doc-0", content="admission control sheds load", metadata={})])
+    app = FastAPI()
+    app.include_router(query_router)
+    app.state.rag_service = rag_service
+    request = {"query": "admission control", "top_k": 1, "method": "keyword"}
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            held = await limiter.acquire()
+            response = await client.post("/query/search", json=request)
+            assert response.status_code == 503
+            assert response.headers["retry-after"] == str(RETRY_AFTER)
+            limiter.release(held)
+            response = await client.post("/query/search", json=request)
+            assert response.status_code == 201
+            assert [res["document"]["id"] for res in response.json()["search_result"]] == ["doc-0"]
+
+    anyio.run(run)
@@ -0,0 +1,119 @@
+"""AnswerCache: TTL, LRU eviction and the similarity threshold, and RagService answers served from it
+until a new index version is published"""
+import anyio
+import numpy as np
+import pytest
+
+from app.services.answer_cache import AnswerCache
+from app.services.rag_service import RagService
+from app.infrastructure.retriever import FileRetriever
+from app.infrastructure.clients.fake_client import FakeLLMClient
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.domain.models import Document
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def answer(text:str) -> dict:
+    return {"answer": text, "metadata": {}}
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.9, clock=clock)
+    cache.put("What is RAG?", "semantic", 5, 1, answer("rag"), np.ones(4))
+    assert cache.get("  what is  rag? ", "semantic", 5, 1) == answer("rag") # normalized query
+    clock.now = 59.9
+    assert cache.get_similar(np.ones(4), "semantic", 5, 1) == answer("rag")
+    clock.now = 60
+    assert cache.get("What is RAG?", "semantic", 5, 1) is None
+    assert cache.get_similar(np.ones(4), "semantic", 5, 1) is None
+    assert cache.stats()["expirations"] == 1 and len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=2)
+    cache.put("a", "semantic", 5, 1, answer("a"))
+    cache.put("b", "semantic", 5, 1, answer("b"))
+    assert cache.get("a", "semantic", 5, 1) == answer("a") # "b" is now least recently used
+    cache.put("c", "semantic", 5, 1, answer("c"))
+    assert cache.get("b", "semantic", 5, 1) is None
+    assert cache.get("a", "semantic", 5, 1) == answer("a") and cache.get("c", "semantic", 5, 1) == answer("c")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_similarity_threshold():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.9)
+    cache.put("a", "semantic", 5, 1, answer("a"), np.array([1.0, 0.0]))
+    assert cache.get_similar(np.array([0.95, np.sqrt(1 - 0.95**2)]), "semantic", 5, 1) == answer("a") # cosine 0.95
+    assert cache.get_similar(np.array([0.85, np.sqrt(1 - 0.85**2)]), "semantic", 5, 1) is None # cosine 0.85
+    assert cache.get_similar(np.array([1.0, 0.0]), "keyword", 5, 1) is None # other method
+    assert cache.get_similar(np.array([1.0, 0.0]), "semantic", 3, 1) is None # other top_k
+    assert cache.get_similar(np.array([1.0, 0.0]), "semantic", 5, 2) is None # other index version
+    assert AnswerCache(similarity_threshold=1.01).get_similar(np.array([1.0, 0.0]), "semantic", 5, 1) is None
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+class CountingLLM(FakeLLMClient):
+    def __init__(self):
+        super().__init__(latency=0, tokens_per_second=1e6, answer="cached answer")
+        self.calls = 0
+
+    async def generate(self, prompt, history=None):
+        self.calls += 1
+        return await super().generate(prompt, history)
+
+
+DOCUMENTS = [
+    Document(id="doc-0", content="hybrid search merges keyword and vector results", metadata={}),
+    Document(id="doc-1", content="the answer cache stores llm answers per index version", metadata={}),
+    Document(id="doc-2", content="streaming sends tokens as server sent events", metadata={}),
+]
+
+
+@pytest.fixture
+def service(tmp_path) -> RagService:
+    retriever = FileRetriever(
+        HashingEmbedder(dim=64), FileVectorStore(base_path=str(tmp_path)), BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+        persist_index=False, collapse_chunks=False)
+    service = RagService(retriever, CountingLLM(), answer_cache=AnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95))
+    service.build(DOCUMENTS)
+    return service
+
+
+def test_rag_answers_are_cached_per_index_version(service):
+    async def ask(query:str) -> dict:
+        return await service.answer(query, top_k=2, method="semantic")
+
+    async def run():
+        first = await ask("what is hybrid search")
+        assert "cache" not in first["metadata"] and service.llm_client.calls == 1
+        assert (await ask("What is  HYBRID search"))["metadata"]["cache"] == "exact"
+        assert (await ask("what is hybrid search?"))["metadata"]["cache"] == "semantic" # same words, so the same embedding
+        assert "cache" not in (await ask("how are tokens streamed"))["metadata"]
+        assert service.llm_client.calls == 2
+
+        version = service.index_version
+        service.sync(DOCUMENTS + [Document(id="doc-3", content="a new post about hybrid search", metadata={})])
+        assert service.index_version == version + 1 and len(service.answer_cache) == 0 # cleared on publish
+        assert "cache" not in (await ask("what is hybrid search"))["metadata"]
+        assert service.llm_client.calls == 3
+
+        service.sync(DOCUMENTS + [Document(id="doc-3", content="a new post about hybrid search", metadata={})])
+        assert service.index_version == version + 1 # nothing changed: not republished, cache kept
+        assert (await ask("what is hybrid search"))["metadata"]["cache"] == "exact"
+
+    anyio.run(run)
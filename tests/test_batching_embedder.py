@@ -0,0 +1,65 @@
+"""MicroBatchingEmbedder: concurrent queries share a batch, and a stuck or dead batching thread
+does not leave callers waiting"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.infrastructure.embeddings.batching_embedder import MicroBatchingEmbedder
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+
+TEXTS = [f"query number {i} about hybrid search" for i in range(16)]
+
+
+def test_concurrent_queries_are_batched():
+    encoder = HashingEmbedder(dim=32)
+    batcher = MicroBatchingEmbedder(encoder, max_wait_ms=50, max_batch=8)
+    with ThreadPoolExecutor(max_workers=len(TEXTS)) as executor:
+        vectors = list(executor.map(batcher.embed, TEXTS))
+    assert np.allclose(np.stack(vectors), encoder.embed_batch(TEXTS))
+    assert batcher.queries == len(TEXTS) and batcher.batches < len(TEXTS)
+
+
+class BlockingEmbedder(HashingEmbedder):
+    """embed_batch (the batching thread's call) blocks until released; embed does not"""
+    def __init__(self):
+        super().__init__(dim=32)
+        self.release = threading.Event()
+
+    def embed_batch(self, texts):
+        self.release.wait()
+        return super().embed_batch(texts)
+
+    def embed(self, text):
+        return super().embed_batch([text])[0]
+
+
+def test_stuck_batch_falls_back_to_direct_embed():
+    encoder = BlockingEmbedder()
+    batcher = MicroBatchingEmbedder(encoder, max_wait_ms=1, timeout=0.1)
+    try:
+        start = time.monotonic()
+        vector = batcher.embed("stuck query")
+        assert time.monotonic() - start < 1
+        assert np.allclose(vector, encoder.embed("stuck query"))
+        queued = batcher.embed("queued behind the stuck batch") # cancelled while still queued
+    finally:
+        encoder.release.set()
+    assert np.allclose(queued, encoder.embed("queued behind the stuck batch"))
+    deadline = time.monotonic() + 1
+    while batcher.batches < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    batcher.embed("next query") # handled after the cancelled one
+    assert batcher.queries == 2 # the stuck batch and this one; the cancelled query was skipped
+
+
+def test_dead_batching_thread_is_restarted():
+    batcher = MicroBatchingEmbedder(HashingEmbedder(dim=32), max_wait_ms=1, timeout=1)
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    batcher._worker = dead
+    batcher.embed("query")
+    assert batcher._worker is not dead and batcher._worker.is_alive()
+    assert batcher.batches == 1
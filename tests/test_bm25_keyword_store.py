@@ -0,0 +1,151 @@
+"""BM25KeywordStore: columnar scoring against the scalar BM25 formula, MaxScore pruning against exhaustive scoring,
+and rebuilding a corrupted persisted index"""
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from app.infrastructure.retriever import FileRetriever
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_index import BM25Index, BM25IndexFormatError
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.infrastructure.repositories.tokenizers import CachedTokenizer
+from app.domain.models import Document
+from app.core.config import BM25_K1, BM25_B
+
+CORPUS = [
+    "vector search with quantized vectors",
+    "keyword search ranks documents with bm25",
+    "bm25 keyword scoring uses term frequency and document length",
+    "hybrid search merges keyword search and vector search",
+    "a long post about caching caching caching and more caching of embeddings",
+    "short note",
+    "retrieval augmented generation answers questions from retrieved documents",
+    "term frequency saturates with k1 while b normalizes document length",
+]
+QUERIES = ["search", "keyword search", "bm25 document length", "caching embeddings", "vector keyword bm25 term", "missing"]
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+def make_documents() -> list[Document]:
+    return [Document(id=f"doc-{i}", content=content, metadata={}) for i, content in enumerate(CORPUS)]
+
+
+def scalar_bm25_scores(documents:list[Document], query:str) -> dict[str,float]:
+    """The per-(token, doc) BM25 loop the columnar scorer replaced"""
+    tokenizer = SplitTokenizer()
+    term_frequency = {doc.id:Counter(tokenizer.tokenize(doc.content)) for doc in documents}
+    doc_lengths = {doc_id:sum(tf.values()) for doc_id, tf in term_frequency.items()}
+    avg_doc_length = sum(doc_lengths.values()) / len(documents)
+    scores:dict[str,float] = Counter()
+    for token in set(tokenizer.tokenize(query)):
+        doc_ids = [doc_id for doc_id, tf in term_frequency.items() if token in tf]
+        idf = math.log((len(documents) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5) + 1)
+        for doc_id in doc_ids:
+            tf = term_frequency[doc_id][token]
+            length_norm = 1 - BM25_B + BM25_B * (doc_lengths[doc_id] / avg_doc_length)
+            scores[doc_id] += (tf * (BM25_K1 + 1)) / (tf + BM25_K1 * length_norm) * idf
+    return dict(scores)
+
+
+@pytest.mark.parametrize("dynamic_pruning", [False, True])
+def test_columnar_scores_match_scalar_formula(tmp_path, dynamic_pruning):
+    documents = make_documents()
+    store = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path), dynamic_pruning=dynamic_pruning, pruning_min_documents=0)
+    store.build_index(documents)
+    for query in QUERIES:
+        expected = scalar_bm25_scores(documents, query)
+        results = store.search(query, len(documents))
+        assert {res.document.id: res.score for res in results} == pytest.approx(expected, rel=1e-12)
+        assert [res.score for res in results] == sorted((res.score for res in results), reverse=True)
+        assert [res.rank for res in results] == list(range(1, len(results) + 1))
+
+
+def test_helpers_match_posting_scores(tmp_path):
+    """bm25 / tf / idf helpers read the same statistics the search path precomputes"""
+    documents = make_documents()
+    store = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path))
+    store.build_index(documents)
+    for query in QUERIES:
+        results = store.search(query, len(documents))
+        for res in results:
+            terms = set(query.split()) & set(res.document.content.split())
+            assert res.score == pytest.approx(sum(store.bm25(res.document.id, term) for term in terms), rel=1e-12)
+    assert store.get_tf("doc-4", "caching") == 4
+    assert store.get_idf("search") == pytest.approx(math.log((len(documents) + 1) / (3 + 1)))
+    assert store.get_documents("bm25") == ["doc-1", "doc-2"]
+
+
+def test_pruning_matches_exhaustive_including_ties(tmp_path):
+    """Small vocabulary and duplicated documents give many equal scores, also at the k-th place"""
+    rng = np.random.default_rng(0)
+    contents = [" ".join(f"w{w}" for w in rng.zipf(1.3, size=rng.integers(3, 30)) % 40) for _ in range(300)]
+    contents += contents[:100] # exact duplicates score identically
+    documents = [Document(id=f"doc-{i}", content=content, metadata={}) for i, content in enumerate(contents)]
+    pruned = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path), dynamic_pruning=True, pruning_min_documents=0)
+    pruned.build_index(documents)
+    exhaustive = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path), dynamic_pruning=False)
+    exhaustive.build_index(documents)
+    queries = [" ".join(f"w{w}" for w in rng.integers(0, 40, size=rng.integers(2, 6))) for _ in range(200)]
+    for limit in [1, 3, 10, 50]:
+        for query in queries:
+            expected = [(res.document.id, res.score) for res in exhaustive.search(query, limit)]
+            assert [(res.document.id, res.score) for res in pruned.search(query, limit)] == expected
+        assert pruned.search_batch(queries, limit) == exhaustive.search_batch(queries, limit)
+
+
+def test_pruning_skipped_on_small_corpus(tmp_path, monkeypatch):
+    store = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path), dynamic_pruning=True, pruning_min_documents=len(CORPUS) + 1)
+    store.build_index(make_documents())
+    def fail(*args):
+        raise AssertionError("MaxScore used below pruning_min_documents")
+    monkeypatch.setattr(store, "_score_maxscore", fail)
+    assert store.search("keyword search", 3)
+
+
+def test_query_batches_use_the_query_cache(tmp_path):
+    query_tokenizer = CachedTokenizer(SplitTokenizer())
+    store = BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path), query_tokenizer=query_tokenizer)
+    store.build_index(make_documents())
+    assert query_tokenizer.cache.stats()["size"] == 0 # documents are not cached
+    store.search_batch(QUERIES, 3)
+    assert query_tokenizer.cache.stats()["misses"] == len(QUERIES)
+    assert store.search_batch(QUERIES, 3) == [store.search(query, 3) for query in QUERIES]
+    assert query_tokenizer.cache.stats()["hits"] == 2 * len(QUERIES)
+
+
+def test_corrupted_index_fails_checksum_and_is_rebuilt(tmp_path):
+    documents = make_documents()
+
+    def make_retriever() -> FileRetriever:
+        return FileRetriever(
+            HashingEmbedder(dim=64),
+            FileVectorStore(base_path=str(tmp_path), precision="float32"),
+            BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+            persist_index=True, collapse_chunks=False)
+
+    retriever = make_retriever()
+    retriever.build(documents)
+    expected = [(res.document.id, res.score) for res in retriever.keyword_search("keyword search", 5)]
+    index_path = retriever.keyword_store.index_path
+
+    with open(index_path, "r+b") as f: # flip the last payload byte, leaving the header intact
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(BM25IndexFormatError, match="Checksum"):
+        BM25Index.load(index_path)
+
+    rebuilt = make_retriever()
+    rebuilt.build(documents)
+    assert [(res.document.id, res.score) for res in rebuilt.keyword_search("keyword search", 5)] == expected
+    index, _ = BM25Index.load(index_path) # rewritten with a valid checksum
+    assert index.num_documents == len(documents)
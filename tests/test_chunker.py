@@ -0,0 +1,123 @@
+"""Chunker on a mixed CJK / latin Markdown post: break priorities, overlap, title prefix, offsets,
+coverage of the text, and collapsing chunk hits to one per post"""
+import pytest
+
+from app.infrastructure.ingestion.chunker import Chunker, parent_id
+from app.infrastructure.retriever import FileRetriever, collapse_to_parents
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.domain.models import Document, SearchResult
+
+CHUNK_SIZE, OVERLAP = 40, 8
+
+POST = """# 混合搜索 Hybrid search
+
+混合搜索结合了关键词搜索和向量搜索。Keyword search uses BM25 scores, vector search uses embeddings. 两者的结果用 RRF 合并。
+
+## 分块 Chunking
+
+长文章会被切成多个块。Each chunk fits the sentence encoder. 块之间有重叠，以保留上下文。
+
+```python
+def search(query):
+    return merge(keyword(query), vector(query))
+```
+
+## 缓存 Caching
+
+查询的向量会被缓存。Answers are cached per index version. 索引更新后缓存失效。最后一句没有换行"""
+
+
+def make_post(content:str = POST, title:str = "混合搜索入门") -> Document:
+    return Document(id="post-1", content=content, metadata={"title": title, "permalink": "/posts/hybrid"})
+
+
+def token_count(chunker:Chunker, text:str) -> int:
+    return len(chunker._tokens(text)[0])
+
+
+@pytest.fixture
+def chunker() -> Chunker:
+    return Chunker(chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+
+
+def test_chunks_fit_and_end_at_boundaries(chunker):
+    spans = chunker.split(POST)
+    assert len(spans) > 3
+    for start, end in spans:
+        assert token_count(chunker, POST[start:end]) <= CHUNK_SIZE
+    for start, end in spans[:-1]:
+        # a chunk ends at a line break or a sentence end, never mid-sentence
+        assert POST[end:end + 1] == "\n" or POST[end - 1] in "。！？；.!?;"
+    # code fences are kept whole: no chunk ends inside the fenced block
+    fence_start, fence_end = POST.index("```python"), POST.rindex("```") + 3
+    assert not any(fence_start < end < fence_end for _, end in spans[:-1])
+
+
+def test_heading_preferred_over_later_sentence_end():
+    # window of 20 tokens: a heading after token 12, a sentence end after token 15
+    text = "一二三四五六七八九十甲乙\n## 丙丁戊。己庚辛壬癸子丑寅卯辰巳午未申酉戌亥"
+    chunker = Chunker(chunk_size=20, overlap=0)
+    first_start, first_end = chunker.split(text)[0]
+    assert text[first_start:first_end] == "一二三四五六七八九十甲乙"
+
+
+def test_overlap_between_consecutive_chunks(chunker):
+    spans = chunker.split(POST)
+    for (_, prev_end), (next_start, _) in zip(spans, spans[1:]):
+        assert next_start < prev_end
+        assert token_count(chunker, POST[next_start:prev_end]) == OVERLAP
+
+
+def test_spans_cover_the_text(chunker):
+    spans = chunker.split(POST)
+    assert spans[0][0] == 0 and spans[-1][1] == len(POST)
+    covered = set()
+    for start, end in spans:
+        covered.update(range(start, end))
+    assert all(i in covered for i, char in enumerate(POST) if not char.isspace())
+
+
+def test_chunk_documents_offsets_and_title_prefix(chunker):
+    post = make_post()
+    chunks = chunker.chunk_document(post)
+    assert len(chunks) == len(chunker.split(POST))
+    for i, chunk in enumerate(chunks):
+        start, end = chunk.metadata["start"], chunk.metadata["end"]
+        body = POST[start:end]
+        assert chunk.content == (body if i == 0 else f"混合搜索入门 - {body}")
+        assert chunk.id == f"post-1#chunk-{i}" and chunk.metadata["chunk_index"] == i
+        assert parent_id(chunk) == "post-1" and chunk.metadata["permalink"] == "/posts/hybrid"
+
+    short = chunker.chunk_document(make_post("短文 short post"))
+    assert [(doc.id, doc.content, doc.metadata["start"], doc.metadata["end"]) for doc in short] == [("post-1", "短文 short post", 0, 13)]
+    untitled = chunker.chunk_document(make_post(title=""))
+    assert all(doc.content == POST[doc.metadata["start"]:doc.metadata["end"]] for doc in untitled)
+
+
+def test_collapse_to_parents_keeps_best_chunk_per_post():
+    def hit(doc_id:str, parent:str, score:float) -> SearchResult:
+        return SearchResult(document=Document(id=doc_id, content="", metadata={"parent_id": parent}), score=score, rank=0)
+    results = [hit("a#chunk-1", "a", 0.9), hit("a#chunk-0", "a", 0.8), hit("b#chunk-2", "b", 0.7), hit("c", "c", 0.6), hit("b#chunk-0", "b", 0.5)]
+    collapsed = collapse_to_parents(results, 5)
+    assert [(res.document.id, res.rank) for res in collapsed] == [("a#chunk-1", 1), ("b#chunk-2", 2), ("c", 3)]
+    assert [res.document.id for res in collapse_to_parents(results, 2)] == ["a#chunk-1", "b#chunk-2"]
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+def test_retriever_returns_one_hit_per_post(tmp_path, chunker):
+    other = Document(id="post-2", content="另一篇文章 about search caching and chunking", metadata={"title": "其他"})
+    retriever = FileRetriever(
+        HashingEmbedder(dim=64), FileVectorStore(base_path=str(tmp_path)), BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+        persist_index=False, collapse_chunks=True)
+    retriever.build(chunker.chunk_documents([make_post(), other]))
+    for search in (retriever.semantic_search, retriever.keyword_search, retriever.hybrid_search):
+        results = search("search chunking caching", 5)
+        assert sorted(parent_id(res.document) for res in results) == ["post-1", "post-2"]
+        assert [res.rank for res in results] == [1, 2]
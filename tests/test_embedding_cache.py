@@ -0,0 +1,66 @@
+"""EmbeddingCache: round trip through disk, and saves that only write what changed"""
+import json
+import numpy as np
+
+from app.infrastructure.embeddings.embedding_cache import EmbeddingCache
+
+
+def read_meta(cache:EmbeddingCache) -> dict:
+    with open(cache.path.joinpath("meta.json")) as f:
+        return json.load(f)
+
+
+def data_files(cache:EmbeddingCache) -> set[str]:
+    return {path.name for path in cache.path.glob("*.npy")}
+
+
+def test_round_trip(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((3, 8)).astype(np.float32)
+    cache = EmbeddingCache("model-a", base_path=str(tmp_path))
+    cache.put_many(["a", "b", "c"], vectors)
+    cache.save()
+
+    reloaded = EmbeddingCache("model-a", base_path=str(tmp_path))
+    found = reloaded.get_many(["a", "c", "missing"])
+    assert np.array_equal(found[0], vectors[0]) and np.array_equal(found[1], vectors[2]) and found[2] is None
+    assert (reloaded.hits, reloaded.misses) == (2, 1)
+    assert EmbeddingCache("model-b", base_path=str(tmp_path)).get_many(["a"]) == [None] # other model: discarded
+
+
+def test_loads_on_first_use_not_in_constructor(tmp_path):
+    lazy = EmbeddingCache("model-a", base_path=str(tmp_path)) # before the cache exists on disk
+    writer = EmbeddingCache("model-a", base_path=str(tmp_path))
+    writer.put_many(["a"], np.ones((1, 8), dtype=np.float32))
+    writer.save()
+    assert lazy.get_many(["a"])[0] is not None
+
+
+def test_save_without_changes_writes_nothing(tmp_path):
+    cache = EmbeddingCache("model-a", base_path=str(tmp_path))
+    cache.put_many(["a", "b"], np.ones((2, 8), dtype=np.float32))
+    cache.save()
+    meta, files = read_meta(cache), data_files(cache)
+
+    reloaded = EmbeddingCache("model-a", base_path=str(tmp_path))
+    reloaded.get_many(["missing"])
+    reloaded.save()
+    assert read_meta(cache) == meta and data_files(cache) == files
+
+
+def test_hits_rewrite_only_last_used(tmp_path):
+    cache = EmbeddingCache("model-a", base_path=str(tmp_path))
+    cache.put_many(["a", "b"], np.ones((2, 8), dtype=np.float32))
+    cache.save()
+    meta = read_meta(cache)
+
+    reloaded = EmbeddingCache("model-a", base_path=str(tmp_path))
+    reloaded.load()
+    reloaded._last_used[:] = 0 # as if last used long ago
+    reloaded.get_many(["b"])
+    reloaded.save()
+    new_meta = read_meta(cache)
+    assert new_meta["keys_file"] == meta["keys_file"] and new_meta["vectors_file"] == meta["vectors_file"]
+    assert new_meta["last_used_file"] != meta["last_used_file"]
+    assert data_files(cache) == {new_meta["keys_file"], new_meta["vectors_file"], new_meta["last_used_file"]}
+    last_used = np.load(cache.path.joinpath(new_meta["last_used_file"]))
+    assert last_used[0] == 0 and last_used[1] > 0
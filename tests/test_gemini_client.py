@@ -0,0 +1,35 @@
+"""AsyncGeminiClient.generate_stream: closing the stream early closes the upstream response"""
+import anyio
+from types import SimpleNamespace
+
+from app.infrastructure.clients.gemini_client import AsyncGeminiClient
+
+
+class FakeModels:
+    """Stands in for client.aio.models: an endless stream of text chunks that records when it is closed"""
+    def __init__(self):
+        self.closed = False
+
+    async def generate_content_stream(self, model, contents):
+        async def stream():
+            try:
+                while True:
+                    yield SimpleNamespace(text="chunk", usage_metadata=None)
+                    await anyio.sleep(0)
+            finally:
+                self.closed = True
+        return stream()
+
+
+def test_closing_stream_closes_upstream():
+    client = AsyncGeminiClient("gemini-test", "test-key")
+    models = FakeModels()
+    client.client = SimpleNamespace(models=models)
+
+    async def run():
+        events = client.generate_stream("prompt")
+        assert await events.__anext__() == {"type": "delta", "text": "chunk"}
+        await events.aclose() # what the SSE response does when the client disconnects
+        assert models.closed
+
+    anyio.run(run)
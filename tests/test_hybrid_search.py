@@ -0,0 +1,53 @@
+"""FileRetriever.hybrid_search: per-leg timeouts counted from when a leg starts, and the fallback when both legs time out"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.infrastructure.retriever import FileRetriever
+from app.domain.models import Document, SearchResult
+
+
+class SlowLegsRetriever(FileRetriever):
+    """Legs sleep for a fixed time, then return one result named after the leg"""
+    def __init__(self, semantic_s:float, keyword_s:float, leg_timeout_ms:float, workers:int):
+        super().__init__(None, None, None, persist_index=False, collapse_chunks=False,
+                         leg_timeout_ms=leg_timeout_ms, executor=ThreadPoolExecutor(max_workers=workers))
+        self.delays = {"semantic": semantic_s, "keyword": keyword_s}
+
+    def _leg(self, name:str) -> list[SearchResult]:
+        time.sleep(self.delays[name])
+        return [SearchResult(document=Document(id=name, content=name, metadata={}), score=1.0, rank=1)]
+
+    def semantic_search(self, query, top_k):
+        return self._leg("semantic")
+
+    def keyword_search(self, query, top_k):
+        return self._leg("keyword")
+
+
+def result_ids(results:list[SearchResult]) -> set[str]:
+    return {res.document.id for res in results}
+
+
+def test_queued_leg_is_not_timed_out():
+    """With one thread the keyword leg waits for the semantic leg; its timeout starts only when it runs"""
+    retriever = SlowLegsRetriever(0.3, 0.05, leg_timeout_ms=200, workers=1)
+    try:
+        assert result_ids(retriever.hybrid_search("q", 3)) == {"keyword"}
+    finally:
+        retriever.executor.shutdown(wait=True)
+
+
+def test_both_legs_timed_out_uses_first_finished():
+    retriever = SlowLegsRetriever(0.5, 0.2, leg_timeout_ms=50, workers=2)
+    try:
+        assert result_ids(retriever.hybrid_search("q", 3)) == {"keyword"}
+    finally:
+        retriever.executor.shutdown(wait=True)
+
+
+def test_both_legs_in_time_are_merged():
+    retriever = SlowLegsRetriever(0.01, 0.01, leg_timeout_ms=1000, workers=2)
+    try:
+        assert result_ids(retriever.hybrid_search("q", 3)) == {"semantic", "keyword"}
+    finally:
+        retriever.executor.shutdown(wait=True)
@@ -0,0 +1,52 @@
+"""KeywordProcessPool: results match in-process search, every worker is warmed up on publish,
+and repeated query timeouts restart the pool"""
+import pytest
+
+from app.infrastructure.repositories import keyword_process_pool
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.keyword_process_pool import KeywordProcessPool, ProcessPoolKeywordStore
+from app.infrastructure.repositories.tokenizers import WordTokenizer
+from app.domain.models import Document
+from app.core.config import KEYWORD_PROCESS_POOL_MAX_TIMEOUTS
+
+POOL_SIZE = 3
+QUERIES = ["keyword search", "post 7", "vector", "missing"]
+
+
+@pytest.fixture
+def pooled(tmp_path):
+    store = BM25KeywordStore(WordTokenizer(), base_path=str(tmp_path))
+    pool = KeywordProcessPool(store, POOL_SIZE)
+    pooled = ProcessPoolKeywordStore(store, pool)
+    pooled.build_index([
+        Document(id=f"doc-{i}", content=f"post {i} about {'keyword' if i % 2 else 'vector'} search", metadata={})
+        for i in range(50)])
+    yield pooled
+    pool.shutdown()
+
+
+def result_pairs(results) -> list[tuple[str, float]]:
+    return [(res.document.id, res.score) for res in results]
+
+
+def test_pool_matches_in_process_search(pooled):
+    for query in QUERIES:
+        assert result_pairs(pooled.search(query, 5)) == result_pairs(pooled.store.search(query, 5))
+    assert [result_pairs(results) for results in pooled.search_batch(QUERIES, 5)] == [
+        result_pairs(pooled.store.search(query, 5)) for query in QUERIES]
+
+
+def test_every_worker_warmed_up(pooled):
+    assert pooled.pool.warm_up(pooled.index_path, "keyword") == POOL_SIZE
+
+
+def test_repeated_timeouts_restart_pool(pooled, monkeypatch):
+    monkeypatch.setattr(keyword_process_pool, "KEYWORD_PROCESS_POOL_TIMEOUT_S", 0) # every query times out
+    expected = result_pairs(pooled.store.search("keyword search", 5))
+    for _ in range(KEYWORD_PROCESS_POOL_MAX_TIMEOUTS - 1):
+        assert result_pairs(pooled.search("keyword search", 5)) == expected # answered in-process
+    assert pooled.pool.restarts == 0
+    assert result_pairs(pooled.search("keyword search", 5)) == expected
+    assert pooled.pool.restarts == 1
+    monkeypatch.undo()
+    assert result_pairs(pooled.search("keyword search", 5)) == expected # the new workers serve queries
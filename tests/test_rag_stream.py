@@ -0,0 +1,164 @@
+"""POST /query/rag/stream: SSE event order, mid-stream LLM errors, and release of the LLM admission slot"""
+import json
+import asyncio
+import anyio
+import pytest
+from typing import AsyncIterator
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from app.api.query import query_router
+from app.services.rag_service import RagService
+from app.services.admission import AdmissionLimiter
+from app.infrastructure.retriever import RetrieverInterface
+from app.infrastructure.clients.llm_client_interface import AsyncLLMClientInterface
+from app.domain.models import Document, SearchResult
+
+REQUEST = {"query": "what is rag", "top_k": 2, "method": "semantic"}
+
+
+class FakeRetriever(RetrieverInterface):
+    """Returns the same documents for every query"""
+    def __init__(self):
+        self.documents = [Document(id=f"doc-{i}", content=f"content {i}", metadata={"permalink": f"/posts/{i}"}) for i in range(3)]
+
+    def build(self, documents):
+        pass
+
+    def copy(self):
+        return self
+
+    def sync(self, documents):
+        return {"added": 0, "updated": 0, "deleted": 0}
+
+    def embed_query(self, query):
+        raise NotImplementedError
+
+    def semantic_search(self, query, top_k):
+        return [SearchResult(document=doc, score=1.0, rank=i + 1) for i, doc in enumerate(self.documents[:top_k])]
+
+    keyword_search = hybrid_search = semantic_search
+
+
+class StreamingLLM(AsyncLLMClientInterface):
+    """Yields `chunks` as deltas, then raises `error` if given, else yields metadata.
+    With `endless`, keeps yielding deltas until the stream is closed."""
+    def __init__(self, chunks:list[str], error:Exception|None = None, endless:bool = False):
+        self.chunks = chunks
+        self.error = error
+        self.endless = endless
+        self.closed = False
+
+    async def hello(self):
+        return {"answer": "hello"}
+
+    async def generate(self, prompt, history=None):
+        return {"answer": "".join(self.chunks), "metadata": {}}
+
+    async def generate_stream(self, prompt, history=None) -> AsyncIterator[dict]:
+        try:
+            for chunk in self.chunks:
+                yield {"type": "delta", "text": chunk}
+            while self.endless:
+                await asyncio.sleep(0.01)
+                yield {"type": "delta", "text": "."}
+            if self.error is not None:
+                raise self.error
+            yield {"type": "metadata", "metadata": {"model": "fake"}}
+        finally:
+            self.closed = True
+
+
+def make_app(llm_client:AsyncLLMClientInterface) -> FastAPI:
+    rag_service = RagService(
+        FakeRetriever(), llm_client,
+        retrieval_limiter = AdmissionLimiter("retrieval", 2, 2, 1, 1),
+        llm_limiter = AdmissionLimiter("llm", 1, 0, 1, 1))
+    rag_service.build([])
+    app = FastAPI()
+    app.include_router(query_router)
+    app.state.rag_service = rag_service
+    app.state.llm_client = llm_client
+    return app
+
+
+def parse_sse(body:str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_event_order():
+    app = make_app(StreamingLLM(["Hello", " world"]))
+    with TestClient(app) as client:
+        response = client.post("/query/rag/stream", json=REQUEST)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["search_result", "delta", "delta", "metadata"]
+    assert [res["document"]["id"] for res in events[0][1]["search_result"]] == ["doc-0", "doc-1"]
+    assert "".join(data["text"] for name, data in events if name == "delta") == "Hello world"
+    assert events[-1][1] == {"metadata": {"model": "fake"}}
+    assert app.state.rag_service.llm_limiter.stats()["in_flight"] == 0
+
+
+def test_stream_error_mid_stream():
+    llm_client = StreamingLLM(["partial"], error=RuntimeError("LLM backend failed"))
+    app = make_app(llm_client)
+    with TestClient(app) as client:
+        response = client.post("/query/rag/stream", json=REQUEST)
+    assert response.status_code == 200 # headers were sent before the failure
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["search_result", "delta", "error"]
+    assert events[-1][1] == {"detail": "LLM backend failed"}
+    assert llm_client.closed
+    assert app.state.rag_service.llm_limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"]) # disconnect seen by a receive() listener / by a failing send()
+def test_client_disconnect_releases_llm_slot(spec_version):
+    """The client goes away after the first delta of an endless answer; the stream must end and free its slot.
+    Driven at the ASGI level: TestClient reads a streaming response to the end before returning."""
+    llm_client = StreamingLLM(["first"], endless=True)
+    app = make_app(llm_client)
+    limiter = app.state.rag_service.llm_limiter
+    sent:list[dict] = []
+
+    async def run():
+        got_delta = anyio.Event()
+        request_sent = False
+
+        async def receive() -> dict:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": json.dumps(REQUEST).encode(), "more_body": False}
+            await got_delta.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message:dict):
+            if got_delta.is_set():
+                raise OSError("client disconnected")
+            sent.append(message)
+            if b"event: delta" in message.get("body", b""):
+                got_delta.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/query/rag/stream", "raw_path": b"/query/rag/stream",
+            "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+            "client": ("testclient", 50000), "server": ("testserver", 80)}
+        with anyio.fail_after(5):
+            try:
+                await app(scope, receive, send)
+            except ClientDisconnect:
+                pass # reported to the server (spec 2.4), which drops it
+        # checked before the event loop ends, which would finalize a leaked stream by itself
+        assert sent[0]["status"] == 200
+        assert limiter.stats()["in_flight"] == 0
+        assert llm_client.closed
+
+    anyio.run(run)
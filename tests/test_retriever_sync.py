@@ -0,0 +1,95 @@
+"""FileRetriever.sync: an incrementally synced index matches a fresh build, and the pre-sync snapshot is left intact"""
+import pytest
+
+from app.infrastructure.retriever import FileRetriever
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.ivf_vector_store import IVFFlatVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.domain.models import Document
+
+TOPICS = ["vector", "keyword", "hybrid", "cache", "stream", "index", "token", "embedding"]
+QUERIES = ["vector index", "keyword token cache", "hybrid stream", "embedding post 7", "updated post"]
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+def make_corpus(n:int) -> list[Document]:
+    return [
+        Document(id=f"doc-{i}", content=f"post {i} about {TOPICS[i % len(TOPICS)]} and {TOPICS[(i * 3) % len(TOPICS)]} search", metadata={})
+        for i in range(n)]
+
+
+def modify(documents:list[Document]) -> list[Document]:
+    """Delete every fifth document, update every seventh, add a few; deleted rows sit in the middle
+    and at the end, so deletes swap the last row into the freed one"""
+    kept = [doc for i, doc in enumerate(documents) if i % 5 != 4 and doc.id != documents[-1].id]
+    updated = [
+        Document(id=doc.id, content=f"updated post {doc.id} about {TOPICS[i % len(TOPICS)]}", metadata={}) if i % 7 == 0 else doc
+        for i, doc in enumerate(kept)]
+    added = [Document(id=f"new-{i}", content=f"new post {i} about {TOPICS[i]} vector", metadata={}) for i in range(5)]
+    return updated + added
+
+
+def make_retriever(tmp_path, vector_store:str) -> FileRetriever:
+    if vector_store == "ivf": # probe every list, so search is exact and comparable across trainings
+        store = IVFFlatVectorStore(base_path=str(tmp_path), nlist=4, nprobe=4, min_train_size=8, precision="float32")
+    else:
+        store = FileVectorStore(base_path=str(tmp_path), precision="float32")
+    return FileRetriever(
+        HashingEmbedder(dim=64), store, BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+        persist_index=False, collapse_chunks=False)
+
+
+def scores(results) -> dict[str,float]:
+    return {res.document.id: res.score for res in results}
+
+
+@pytest.mark.parametrize("vector_store", ["flat", "ivf"])
+def test_sync_matches_fresh_build(tmp_path, vector_store):
+    old_documents = make_corpus(60)
+    new_documents = modify(old_documents)
+    synced = make_retriever(tmp_path / "synced", vector_store)
+    synced.build(old_documents)
+    changes = synced.sync(new_documents)
+
+    old_ids = {doc.id for doc in old_documents}
+    new_ids = {doc.id for doc in new_documents}
+    assert changes == {
+        "added": len(new_ids - old_ids),
+        "updated": sum(doc.content.startswith("updated") for doc in new_documents),
+        "deleted": len(old_ids - new_ids)}
+    assert synced.sync(new_documents) == {"added": 0, "updated": 0, "deleted": 0}
+
+    fresh = make_retriever(tmp_path / "fresh", vector_store)
+    fresh.build(new_documents)
+    assert len(synced.vector_store) == len(fresh.vector_store) == len(new_documents)
+    for doc in new_documents:
+        assert synced.vector_store.retrieve_by_id(doc.id).content == doc.content
+    limit = len(new_documents)
+    for query in QUERIES:
+        assert scores(synced.semantic_search(query, limit)) == pytest.approx(scores(fresh.semantic_search(query, limit)), rel=1e-5)
+        assert scores(synced.keyword_search(query, limit)) == pytest.approx(scores(fresh.keyword_search(query, limit)), rel=1e-12)
+
+
+@pytest.mark.parametrize("vector_store", ["flat", "ivf"])
+def test_presync_snapshot_keeps_old_documents(tmp_path, vector_store):
+    old_documents = make_corpus(60)
+    snapshot = make_retriever(tmp_path, vector_store)
+    snapshot.build(old_documents)
+    limit = len(old_documents)
+    before = {query: (scores(snapshot.semantic_search(query, limit)), scores(snapshot.keyword_search(query, limit))) for query in QUERIES}
+
+    synced = snapshot.copy() # RagService.sync syncs a copy and publishes it; searches in flight keep the old one
+    synced.sync(modify(old_documents))
+
+    assert len(snapshot.vector_store) == len(old_documents)
+    for doc in old_documents:
+        assert snapshot.vector_store.retrieve_by_id(doc.id).content == doc.content
+        assert snapshot.keyword_store.retrieve_by_id(doc.id).content == doc.content
+    for query in QUERIES:
+        assert (scores(snapshot.semantic_search(query, limit)), scores(snapshot.keyword_search(query, limit))) == before[query]
@@ -0,0 +1,59 @@
+"""POST /query/search/batch: results equal those of /query/search for each query, and defaults match the API spec"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.query import query_router
+from app.services.rag_service import RagService
+from app.infrastructure.retriever import FileRetriever
+from app.infrastructure.clients.fake_client import FakeLLMClient
+from app.infrastructure.embeddings.fake_embedder import HashingEmbedder
+from app.infrastructure.repositories.bm25_keyword_store import BM25KeywordStore
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.infrastructure.repositories.tokenizer_interface import TokenizerInterface
+from app.domain.models import Document
+from app.domain.schemas import SearchRequest, BatchSearchRequest
+from app.core.config import SEARCH_LIMIT
+
+QUERIES = ["hybrid search", "keyword bm25 scores", "向量 vector search", "cache", "no match at all"]
+TOPICS = ["hybrid search", "keyword search with bm25", "vector search 向量", "answer cache", "streaming answers"]
+
+
+class SplitTokenizer(TokenizerInterface):
+    def tokenize(self, text:str) -> list[str]:
+        return text.lower().split()
+
+
+@pytest.fixture
+def client(tmp_path):
+    retriever = FileRetriever(
+        HashingEmbedder(dim=64), FileVectorStore(base_path=str(tmp_path)), BM25KeywordStore(SplitTokenizer(), base_path=str(tmp_path)),
+        persist_index=False, collapse_chunks=False)
+    rag_service = RagService(retriever, FakeLLMClient(latency=0))
+    rag_service.build([
+        Document(id=f"doc-{i}", content=f"post {i} about {TOPICS[i % len(TOPICS)]} and {TOPICS[(i * 2) % len(TOPICS)]}", metadata={})
+        for i in range(30)])
+    app = FastAPI()
+    app.include_router(query_router)
+    app.state.rag_service = rag_service
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("method", ["keyword", "semantic", "hybrid"])
+def test_batch_equals_single_searches(client, method):
+    response = client.post("/query/search/batch", json={"queries": QUERIES, "top_k": 4, "method": method})
+    assert response.status_code == 201
+    batch = response.json()["search_results"]
+    assert len(batch) == len(QUERIES)
+    for query, results in zip(QUERIES, batch):
+        single = client.post("/query/search", json={"query": query, "top_k": 4, "method": method})
+        assert single.status_code == 201
+        assert results == pytest.approx(single.json()["search_result"])
+
+
+def test_default_top_k_is_search_limit(client):
+    """openapi-run.yaml documents the same default"""
+    assert SearchRequest(query="q").top_k == BatchSearchRequest(queries=["q"]).top_k == SEARCH_LIMIT
+    response = client.post("/query/search/batch", json={"queries": ["post"], "method": "keyword"})
+    assert len(response.json()["search_results"][0]) == SEARCH_LIMIT
@@ -0,0 +1,67 @@
+"""recall@k of compressed vector search (float16 / int8 + float32 rescoring) against exact float32 search"""
+import numpy as np
+import pytest
+
+from app.infrastructure.repositories.file_vector_store import FileVectorStore
+from app.domain.models import Document
+
+NUM_VECTORS = 5000
+DIM = 128
+NUM_QUERIES = 100
+TOP_K = 10
+MIN_RECALL = 0.99 # documented in the README for the default VECTOR_RESCORE_FACTOR
+MIN_SCAN_RECALL = 0.97 # compressed scan alone (rescore_factor=1), so rescoring cannot hide a quantization regression
+
+
+@pytest.fixture(scope="module")
+def corpus() -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Seeded clustered unit vectors and queries near them: ids, vectors, queries"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(50, DIM)).astype(np.float32)
+    vectors = centers[rng.integers(len(centers), size=NUM_VECTORS)] + rng.normal(scale=0.6, size=(NUM_VECTORS, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(NUM_VECTORS, size=NUM_QUERIES)] + rng.normal(scale=0.3, size=(NUM_QUERIES, DIM)).astype(np.float32)
+    return [f"doc-{i}" for i in range(NUM_VECTORS)], vectors, queries
+
+
+def build_store(base_path, precision:str, ids:list[str], vectors:np.ndarray) -> FileVectorStore:
+    store = FileVectorStore(str(base_path), precision=precision)
+    store.add_batch(ids, vectors, [Document(id=id, content="", metadata={}) for id in ids])
+    return store
+
+
+def top_ids(store:FileVectorStore, queries:np.ndarray) -> list[set[str]]:
+    return [{res.document.id for res in store.search(query, TOP_K)} for query in queries]
+
+
+def recall(actual:list[set[str]], expected:list[set[str]]) -> float:
+    return float(np.mean([len(a & e) / len(e) for a, e in zip(actual, expected)]))
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_recall_in_memory(tmp_path, corpus, precision):
+    ids, vectors, queries = corpus
+    expected = top_ids(build_store(tmp_path / "exact", "float32", ids, vectors), queries)
+    store = build_store(tmp_path / precision, precision, ids, vectors)
+    assert recall(top_ids(store, queries), expected) >= MIN_RECALL
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_recall_after_reload(tmp_path, corpus, precision):
+    """As in production: compressed matrix loaded from disk, float32 rows rescored from the memory-mapped file"""
+    ids, vectors, queries = corpus
+    expected = top_ids(build_store(tmp_path / "exact", "float32", ids, vectors), queries)
+    build_store(tmp_path / precision, precision, ids, vectors).save_index("test")
+    store = FileVectorStore(str(tmp_path / precision), precision=precision)
+    assert store.load_index("test")
+    assert recall(top_ids(store, queries), expected) >= MIN_RECALL
+
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_recall_of_compressed_scan(tmp_path, corpus, precision):
+    ids, vectors, queries = corpus
+    expected = top_ids(build_store(tmp_path / "exact", "float32", ids, vectors), queries)
+    store = build_store(tmp_path / precision, precision, ids, vectors)
+    store.rescore_factor = 1 # shortlist of exactly top_k: rescoring only reorders it
+    assert recall(top_ids(store, queries), expected) >= MIN_SCAN_RECALL